@@ -1,20 +1,36 @@
 from __future__ import annotations
 
+import fnmatch
+import glob
 import os
 import re
-from typing import Dict, List
+import threading
+from typing import Any, Dict, List
 
 import yaml
 
+from agent.budget import AuditBudget, BudgetExceeded
+from agent.findings_store import FindingsStore
+from agent.near_duplicates import NearDuplicateFinder, candidate_files
+from agent.reachability import ReachabilityIndex, build_index
+from agent.zone_validator import ZoneValidator
+from utils.cache import CacheView, JsonFileCache
 from utils.logger import get_logger
 
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
 
 class AuditAgent:
     """Audit Ansible roles and generate a validation report."""
 
     VARIABLE_PATTERN = re.compile(r"{{\s*([^\s{}|]+)\s*}}")
 
-    def __init__(self, root_dir: str, config: Dict[str, any]):
+    def __init__(
+        self,
+        root_dir: str,
+        config: Dict[str, any],
+        budget: AuditBudget | None = None,
+    ):
         self.root_dir = os.path.abspath(root_dir)
         if not os.path.isdir(self.root_dir):
             raise ValueError(f"Root path not found: {self.root_dir}")
@@ -22,7 +38,33 @@ class AuditAgent:
         self.logger = get_logger(self.__class__.__name__)
         self.required_dirs = config["audit"]["required_role_dirs"]
         self.placeholders = config["audit"].get("placeholder_keywords", [])
+        self.zone_vars_files = config["audit"].get("zone_vars_files", [])
+        self.near_dup_conf = config["audit"].get("near_duplicates", {})
+        self.script_conf = config["audit"].get("script_syntax", {})
+        self.reach_conf = config["audit"].get("reachability", {})
+        self.skip_dead = bool(self.reach_conf.get("skip_dead", False))
+        self.index: ReachabilityIndex | None = None
         self.report_lines: List[str] = []
+        self.findings: List[Dict[str, Any]] = []
+        self.findings_path = config.get("findings", {}).get("path")
+        self.run_id: int | None = None
+        self.budget = budget or AuditBudget()
+        self.truncated: str | None = None
+
+    def _finding(self, rule: str, severity: str, path: str, message: str) -> None:
+        """Record a structured finding alongside the Markdown report line."""
+
+        rel = os.path.relpath(path, self.root_dir) if os.path.isabs(path) else path
+        role = rel.split(os.sep)[1] if rel.startswith("roles" + os.sep) else ""
+        self.findings.append(
+            {
+                "role": role,
+                "rule": rule,
+                "severity": severity,
+                "file": rel,
+                "message": message,
+            }
+        )
 
     def _find_playbooks(self) -> List[str]:
         """Return a deduplicated list of playbook files relative to ``root_dir``."""
@@ -40,6 +82,56 @@ class AuditAgent:
                     playbooks.add(os.path.relpath(full, self.root_dir))
         return sorted(playbooks)
 
+    def _cache(self, path: str | None) -> JsonFileCache | None:
+        if not path:
+            return None
+        return JsonFileCache(path, **self.config.get("cache", {}))
+
+    def _live(self, path: str) -> bool:
+        """Whether checks should look at ``path`` (always, unless skipping dead code)."""
+
+        return not self.skip_dead or self.index is None or self.index.is_live(path)
+
+    def _build_index(self) -> ReachabilityIndex | None:
+        conf = self.reach_conf
+        if not conf.get("enabled", False):
+            return None
+        playbooks = [
+            p
+            for p in conf.get("playbooks") or self._find_playbooks()
+            if os.path.isfile(os.path.join(self.root_dir, p))
+        ]
+        if not playbooks:
+            # Without entry points every role would look dead.
+            return None
+        cache = self._cache(conf.get("cache"))
+        # One cache file serves several roots; entries are keyed by root.
+        entry = dict(cache.get(self.root_dir) or {}) if cache else {}
+        before = entry.get("signature")
+        index = build_index(self.root_dir, playbooks, entry, self.budget)
+        if cache and entry.get("signature") != before:
+            cache.set(self.root_dir, entry)
+        return index
+
+    def _check_reachability(self, suggestions: List[str]) -> List[str]:
+        if self.index is None:
+            return []
+        items = []
+        for role in self.index.dead_roles():
+            path = os.path.join("roles", role)
+            items.append(f"{path} — not used by any playbook")
+            self._finding("dead_role", "warning", path, "not used by any playbook")
+        for path in self.index.dead_task_files():
+            items.append(f"{path} — never included")
+            self._finding("dead_task_file", "warning", path, "never included")
+        for ref in self.index.unresolved:
+            self.logger.warning("Unresolved include", extra={"reference": ref})
+        if items:
+            suggestions.append(
+                "Remove unreachable roles and task files or include them from a playbook"
+            )
+        return items
+
     def run(self, report_path: str | None = None) -> str:
         self.logger.info("Starting audit", extra={"root": self.root_dir})
         if report_path is None:
@@ -54,36 +146,86 @@ class AuditAgent:
             self.logger.error("Roles directory missing", extra={"path": roles_dir})
             self.report_lines.append("## ❌ Missing or Broken")
             self.report_lines.append(f"- {roles_dir} — Missing directory")
-            report = "\n".join(self.report_lines)
-            with open(report_path, "w", encoding="utf-8") as f:
-                f.write(report)
+            self._finding("missing_dir", "error", roles_dir, "Missing directory")
+            self._write_report(report_path)
+            self._store_findings()
             return report_path
 
-        for role in sorted(os.listdir(roles_dir)):
-            role_path = os.path.join(roles_dir, role)
-            if not os.path.isdir(role_path):
-                continue
-            missing = self._check_role_structure(role_path)
-            if missing:
-                missing_items.extend(missing)
-            self._check_placeholders(role_path, placeholders)
-            self._check_variables(role_path, missing_items, suggestions)
-            valid_items.append(f"roles/{role}")
+        duplicates: List[str] = []
+        unreachable: List[str] = []
+        try:
+            self.index = self._build_index()
+            for role in sorted(os.listdir(roles_dir)):
+                self.budget.checkpoint()
+                role_path = os.path.join(roles_dir, role)
+                if not os.path.isdir(role_path) or not self._live(role_path):
+                    continue
+                missing = self._check_role_structure(role_path)
+                if missing:
+                    missing_items.extend(missing)
+                self._check_placeholders(role_path, placeholders)
+                self._check_variables(role_path, missing_items, suggestions)
+                valid_items.append(f"roles/{role}")
 
-        for playbook in self._find_playbooks():
-            valid_items.append(playbook)
+            playbooks = set(self._find_playbooks())
+            if self.index is not None:
+                playbooks.update(self.index.playbooks)
+            for playbook in sorted(playbooks):
+                valid_items.append(playbook)
 
+            self._check_zones(missing_items, suggestions)
+            self._check_script_syntax(missing_items, suggestions)
+            duplicates = self._check_near_duplicates(suggestions)
+            unreachable = self._check_reachability(suggestions)
+            # A limit hit after the last charge still marks the run partial.
+            self.budget.checkpoint()
+        except BudgetExceeded as exc:
+            self.truncated = exc.reason
+            self.logger.warning(
+                "Audit truncated",
+                extra={"reason": exc.reason, **self.budget.usage()},
+            )
+
+        if self.truncated:
+            usage = self.budget.usage()
+            self._write_section(
+                "## ⏱ Truncated",
+                [
+                    f"Stopped early: {self.truncated} after {usage['files']} files, "
+                    f"{usage['bytes']} bytes, {usage['elapsed']}s; "
+                    "results below are partial"
+                ],
+            )
         self._write_section("## ✅ Valid Items", valid_items)
         self._write_section("## ❌ Missing or Broken", missing_items)
         self._write_section("## ⚠️ Placeholders Detected", placeholders)
+        self._write_section("## ♻️ Near-Duplicate Files", duplicates)
+        if self.index is not None:
+            self._write_section("## 💤 Unreachable Roles and Tasks", unreachable)
         self._write_section("## 🛠 Fix Recommendations", suggestions)
 
-        report = "\n".join(self.report_lines)
-        with open(report_path, "w", encoding="utf-8") as f:
-            f.write(report)
+        self._write_report(report_path)
         self.logger.info("Report written", extra={"path": report_path})
+        self._store_findings()
         return report_path
 
+    def _write_report(self, report_path: str) -> None:
+        # Replace atomically: concurrent audits of one root share the path.
+        tmp = f"{report_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("\n".join(self.report_lines))
+        os.replace(tmp, report_path)
+
+    def _store_findings(self) -> None:
+        # A partial run would show every unchecked finding as fixed.
+        if not self.findings_path or self.truncated:
+            return
+        store = FindingsStore(self.findings_path)
+        try:
+            self.run_id = store.record_run(self.root_dir, self.findings)
+        finally:
+            store.close()
+
     def _write_section(self, header: str, items: List[str]) -> None:
         self.report_lines.append(header)
         if items:
@@ -99,30 +241,45 @@ class AuditAgent:
             dir_path = os.path.join(role_path, directory)
             if not os.path.isdir(dir_path):
                 missing.append(f"{role_path}/{directory} — Missing directory")
+                self._finding("missing_dir", "error", dir_path, "Missing directory")
         meta_main = os.path.join(role_path, "meta", "main.yml")
         if not os.path.isfile(meta_main):
             missing.append(f"{meta_main} — Missing file")
+            self._finding("missing_file", "error", meta_main, "Missing file")
         else:
+            self.budget.charge(meta_main)
             try:
                 with open(meta_main, "r", encoding="utf-8") as f:
                     yaml.safe_load(f)
             except yaml.YAMLError as exc:
+                # Recorded as a finding by _validate_yaml_files below.
                 missing.append(f"{meta_main} — Invalid YAML: {exc}")
         self._validate_yaml_files(role_path, missing)
         return missing
 
     def _check_placeholders(self, role_path: str, results: List[str]) -> None:
         for root, _, files in os.walk(role_path):
+            self.budget.checkpoint()
             for fname in files:
+                self.budget.checkpoint()
                 if not fname.endswith((".yml", ".yaml", ".j2", ".txt", ".md")):
                     continue
                 fpath = os.path.join(root, fname)
+                if not self._live(fpath):
+                    continue
+                self.budget.charge(fpath)
                 try:
                     with open(fpath, "r", encoding="utf-8") as f:
                         content = f.read()
                     for keyword in self.placeholders:
                         if keyword in content:
                             results.append(f"{fpath} contains '{keyword}'")
+                            self._finding(
+                                "placeholder",
+                                "warning",
+                                fpath,
+                                f"contains '{keyword}'",
+                            )
                 except (OSError, UnicodeDecodeError) as exc:
                     self.logger.warning(
                         "Failed to read file", extra={"file": fpath, "error": str(exc)}
@@ -134,16 +291,193 @@ class AuditAgent:
         variables = self._load_defined_variables(role_path)
         used_vars = set()
         for root, _, files in os.walk(os.path.join(role_path, "tasks")):
+            self.budget.checkpoint()
             for fname in files:
-                if fname.endswith((".yml", ".yaml")):
-                    fpath = os.path.join(root, fname)
+                self.budget.checkpoint()
+                fpath = os.path.join(root, fname)
+                if fname.endswith((".yml", ".yaml")) and self._live(fpath):
                     used_vars.update(self._extract_vars(fpath))
         undefined = used_vars - set(variables.keys())
         for var in sorted(undefined):
             missing.append(f"{role_path}: undefined variable '{var}'")
+            self._finding(
+                "undefined_variable",
+                "error",
+                os.path.join(role_path, "tasks"),
+                f"undefined variable '{var}'",
+            )
             suggestions.append(f"Define '{var}' in defaults/main.yml or vars/main.yml")
 
+    def _check_zones(self, missing: List[str], suggestions: List[str]) -> None:
+        validator = ZoneValidator(budget=self.budget)
+        for pattern in self.zone_vars_files:
+            for path in sorted(glob.glob(os.path.join(self.root_dir, pattern))):
+                self.budget.charge(path)
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        data = yaml.load(f, Loader=YamlLoader)
+                except (OSError, yaml.YAMLError) as exc:
+                    self.logger.warning(
+                        "Invalid YAML", extra={"file": path, "error": str(exc)}
+                    )
+                    continue
+                validator.load_vars(data or {}, os.path.relpath(path, self.root_dir))
+        issues = validator.validate()
+        for issue in issues:
+            missing.append(f"Zone data: {issue}")
+            self._finding("zone_data", "error", "vars", issue)
+        if issues:
+            suggestions.append(
+                "Fix zone data conflicts before running create_zones.yml"
+            )
+
+    def _script_templates(self) -> List[str]:
+        patterns = self.script_conf.get("patterns") or {
+            "shell": ["*.sh.j2"],
+            "lua": ["*.lua.j2", "dnsdist.conf.j2"],
+        }
+        globs = [g for group in patterns.values() for g in group]
+        templates = []
+        for path in sorted(glob.glob(os.path.join(self.root_dir, "roles/*/templates"))):
+            for dirpath, _, names in os.walk(path):
+                self.budget.checkpoint()
+                for name in sorted(names):
+                    self.budget.checkpoint()
+                    full = os.path.join(dirpath, name)
+                    if any(fnmatch.fnmatch(name, g) for g in globs) and self._live(
+                        full
+                    ):
+                        templates.append(full)
+        return templates
+
+    def _check_script_syntax(self, missing: List[str], suggestions: List[str]) -> None:
+        conf = self.script_conf
+        if not conf.get("enabled", False):
+            return
+        templates = self._script_templates()
+        if not templates:
+            return
+        try:
+            # Imported here so audits without script templates skip jinja2.
+            from agent.script_syntax import ScriptSyntaxChecker
+        except ImportError as exc:
+            self.logger.warning(
+                "Script syntax check skipped", extra={"error": str(exc)}
+            )
+            return
+
+        shared: Dict[str, Any] = {}
+        for pattern in conf.get("vars_files", []):
+            for path in sorted(glob.glob(os.path.join(self.root_dir, pattern))):
+                self.budget.charge(path)
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        shared.update(yaml.load(f, Loader=YamlLoader) or {})
+                except (OSError, yaml.YAMLError) as exc:
+                    self.logger.warning(
+                        "Invalid YAML", extra={"file": path, "error": str(exc)}
+                    )
+        role_vars: Dict[str, Dict[str, Any]] = {}
+
+        def load() -> Any:
+            for path in templates:
+                rel = os.path.relpath(path, self.root_dir)
+                role = rel.split(os.sep)[1]
+                if role not in role_vars:
+                    role_path = os.path.join(self.root_dir, "roles", role)
+                    role_vars[role] = {
+                        **shared,
+                        **self._load_defined_variables(role_path),
+                    }
+                self.budget.charge(path)
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        yield rel, f.read(), role_vars[role]
+                except (OSError, UnicodeDecodeError) as exc:
+                    self.logger.warning(
+                        "Failed to read", extra={"file": rel, "error": str(exc)}
+                    )
+
+        cache = self._cache(conf.get("cache"))
+        # Look entries up per key: the cache may hold many other roots.
+        results = CacheView(cache) if cache else {}
+        checker = ScriptSyntaxChecker(
+            patterns=conf.get("patterns"),
+            workers=conf.get("workers"),
+            cache=results,
+            timeout=conf.get("timeout", 10),
+            budget=self.budget,
+        )
+        try:
+            errors, skipped = checker.check(load())
+        finally:
+            # Keep finished checks even when the budget stops the run.
+            if cache:
+                results.flush()
+        for reason in skipped:
+            self.logger.info("Script not checked", extra={"reason": reason})
+        self.logger.info(
+            "Script syntax checked",
+            extra={"templates": len(templates), "executed": checker.checked},
+        )
+
+        for error in errors:
+            where = (
+                f"{error['file']}:{error['line']}" if error["line"] else error["file"]
+            )
+            missing.append(f"{where} — Syntax error: {error['message']}")
+            message = error["message"]
+            if error["line"]:
+                message = f"line {error['line']}: {message}"
+            self._finding("script_syntax", "error", error["file"], message)
+        if errors:
+            suggestions.append(
+                "Fix script template syntax errors before the timers run them"
+            )
+
+    def _check_near_duplicates(self, suggestions: List[str]) -> List[str]:
+        conf = self.near_dup_conf
+        if not conf.get("enabled", False):
+            return []
+        cache = self._cache(conf.get("cache"))
+        signatures = CacheView(cache) if cache else {}
+        finder = NearDuplicateFinder(
+            threshold=conf.get("threshold", 0.8),
+            shingle_size=conf.get("shingle_size", 5),
+            bands=conf.get("bands", 16),
+            min_shingles=conf.get("min_shingles", 20),
+            cache=signatures,
+        )
+        for rel in filter(self._live, candidate_files(self.root_dir, self.budget)):
+            self.budget.charge(os.path.join(self.root_dir, rel))
+            try:
+                with open(os.path.join(self.root_dir, rel), "rb") as f:
+                    finder.add(rel, f.read())
+            except OSError as exc:
+                self.logger.warning(
+                    "Failed to read", extra={"file": rel, "error": str(exc)}
+                )
+        if cache:
+            signatures.flush()
+
+        items = []
+        for paths, low, high in finder.groups():
+            score = f"{low:.2f}" if low == high else f"{low:.2f}–{high:.2f}"
+            items.append(f"{', '.join(paths)} (similarity {score})")
+            self._finding(
+                "near_duplicate",
+                "info",
+                paths[0],
+                f"near-duplicate of {', '.join(paths[1:])} (similarity {score})",
+            )
+        if items:
+            suggestions.append(
+                "Merge near-duplicate roles or templates to avoid deploying both copies"
+            )
+        return items
+
     def _extract_vars(self, path: str) -> List[str]:
+        self.budget.charge(path)
         try:
             with open(path, "r", encoding="utf-8") as f:
                 content = f.read()
@@ -162,6 +496,7 @@ class AuditAgent:
         variables: Dict[str, any] = {}
         for vf in vars_files:
             if os.path.isfile(vf):
+                self.budget.charge(vf)
                 try:
                     with open(vf, "r", encoding="utf-8") as f:
                         variables.update(yaml.safe_load(f) or {})
@@ -173,11 +508,15 @@ class AuditAgent:
 
     def _validate_yaml_files(self, role_path: str, errors: List[str]) -> None:
         for root, _, files in os.walk(role_path):
+            self.budget.checkpoint()
             for fname in files:
-                if fname.endswith((".yml", ".yaml")):
-                    path = os.path.join(root, fname)
+                self.budget.checkpoint()
+                path = os.path.join(root, fname)
+                if fname.endswith((".yml", ".yaml")) and self._live(path):
+                    self.budget.charge(path)
                     try:
                         with open(path, "r", encoding="utf-8") as f:
                             yaml.safe_load(f)
                     except (OSError, yaml.YAMLError) as exc:
                         errors.append(f"{path} — Invalid YAML: {exc}")
+                        self._finding("invalid_yaml", "error", path, str(exc))
@@ -0,0 +1,97 @@
+"""Per-run resource limits with cooperative cancellation.
+
+The audit calls :meth:`AuditBudget.charge` for every file it opens and
+:meth:`AuditBudget.checkpoint` between units of work.  Either raises
+:class:`BudgetExceeded` once the deadline passes, a file or byte quota is
+used up, or :meth:`AuditBudget.cancel` was called from another thread; the
+agent then writes whatever it has collected as a truncated report.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class BudgetExceeded(Exception):
+    """Raised at a checkpoint once a limit is hit or the run is cancelled."""
+
+    def __init__(self, reason: str) -> None:
+        super().__init__(reason)
+        self.reason = reason
+
+
+class AuditBudget:
+    """Deadline, file-count and byte quotas for one audit run.
+
+    ``None`` disables a limit.  Each file is charged once however many
+    checks read it.
+    """
+
+    def __init__(
+        self,
+        deadline: Optional[float] = None,
+        max_files: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+    ) -> None:
+        self.deadline = deadline
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.started = time.monotonic()
+        self.files = 0
+        self.bytes = 0
+        self.reason: Optional[str] = None
+        self._seen: set[str] = set()
+        self._cancelled = threading.Event()
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        self.reason = self.reason or reason
+        self._cancelled.set()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline, or ``None`` without one."""
+
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - self.elapsed)
+
+    def _fail(self, reason: str) -> None:
+        self.reason = self.reason or reason
+        raise BudgetExceeded(self.reason)
+
+    def checkpoint(self) -> None:
+        if self._cancelled.is_set():
+            self._fail(self.reason or "cancelled")
+        if self.deadline is not None and self.elapsed > self.deadline:
+            self._fail(f"deadline of {self.deadline:g}s exceeded")
+
+    def charge(self, path: str) -> None:
+        """Account for reading ``path`` and check every limit."""
+
+        self.checkpoint()
+        if path in self._seen:
+            return
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        if self.max_files is not None and self.files + 1 > self.max_files:
+            self._fail(f"file limit of {self.max_files} reached")
+        if self.max_bytes is not None and self.bytes + size > self.max_bytes:
+            self._fail(f"byte limit of {self.max_bytes} reached")
+        self._seen.add(path)
+        self.files += 1
+        self.bytes += size
+
+    def usage(self) -> Dict[str, Any]:
+        return {
+            "files": self.files,
+            "bytes": self.bytes,
+            "elapsed": round(self.elapsed, 3),
+        }
@@ -0,0 +1,176 @@
+"""Persist audit findings per run in an indexed SQLite database.
+
+Every :meth:`AuditAgent.run` appends one row to ``runs`` and one row per
+finding.  A fingerprint of ``(rule, file, message)`` identifies the same
+finding across runs, so run-to-run diffs are index lookups rather than a
+re-audit.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    root TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS findings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    role TEXT NOT NULL,
+    rule TEXT NOT NULL,
+    severity TEXT NOT NULL,
+    file TEXT NOT NULL,
+    message TEXT NOT NULL,
+    fingerprint TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_runs_root ON runs (root, id);
+CREATE INDEX IF NOT EXISTS idx_findings_role ON findings (run_id, role, id);
+CREATE INDEX IF NOT EXISTS idx_findings_rule ON findings (run_id, rule, id);
+CREATE INDEX IF NOT EXISTS idx_findings_severity ON findings (run_id, severity, id);
+CREATE INDEX IF NOT EXISTS idx_findings_file ON findings (run_id, file, id);
+CREATE INDEX IF NOT EXISTS idx_findings_fingerprint ON findings (run_id, fingerprint);
+"""
+
+FILTERS = ("role", "rule", "severity")
+STATUSES = ("new", "fixed", "unchanged")
+COLUMNS = ("id", "run_id", "role", "rule", "severity", "file", "message")
+
+
+def fingerprint(finding: Dict[str, Any]) -> str:
+    key = "\0".join((finding["rule"], finding["file"], finding["message"]))
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+class FindingsStore:
+    """Indexed findings database with filtered, cursor-paginated queries."""
+
+    def __init__(self, path: str) -> None:
+        self.path = os.path.abspath(path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.conn = sqlite3.connect(
+            self.path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def record_run(self, root: str, findings: Iterable[Dict[str, Any]]) -> int:
+        """Store one audit run and return its id."""
+
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            run_id = conn.execute(
+                "INSERT INTO runs (root, created) VALUES (?, ?)", (root, time.time())
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO findings "
+                "(run_id, role, rule, severity, file, message, fingerprint) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        run_id,
+                        f["role"],
+                        f["rule"],
+                        f["severity"],
+                        f["file"],
+                        f["message"],
+                        fingerprint(f),
+                    )
+                    for f in findings
+                ),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return run_id
+
+    def latest_run(self) -> Optional[int]:
+        row = self.conn.execute("SELECT MAX(id) FROM runs").fetchone()
+        return row[0]
+
+    def previous_run(self, run_id: int) -> Optional[int]:
+        row = self.conn.execute(
+            "SELECT MAX(id) FROM runs WHERE id < ? "
+            "AND root = (SELECT root FROM runs WHERE id = ?)",
+            (run_id, run_id),
+        ).fetchone()
+        return row[0]
+
+    def query(
+        self,
+        run_id: Optional[int] = None,
+        role: Optional[str] = None,
+        rule: Optional[str] = None,
+        severity: Optional[str] = None,
+        file: Optional[str] = None,
+        status: Optional[str] = None,
+        base_run_id: Optional[int] = None,
+        cursor: int = 0,
+        limit: int = 100,
+    ) -> Dict[str, Any]:
+        """Return one page of findings.
+
+        ``status`` compares ``run_id`` against ``base_run_id`` (default: the
+        previous run of the same root): ``new`` and ``unchanged`` rows come
+        from ``run_id`` and ``fixed`` rows from the base run.  ``file`` is a
+        path prefix.  Pass ``next_cursor`` from a page to get the next one.
+        """
+
+        if run_id is None:
+            run_id = self.latest_run()
+        if run_id is None:
+            return {"run": None, "base": None, "items": [], "next_cursor": None}
+        if status is not None and status not in STATUSES:
+            raise ValueError(f"Unknown status: {status}")
+
+        source, other = run_id, None
+        if status is not None:
+            if base_run_id is None:
+                base_run_id = self.previous_run(run_id)
+            other = base_run_id
+            if status == "fixed":
+                source, other = base_run_id, run_id
+
+        where = ["f.run_id = ?", "f.id > ?"]
+        params: List[Any] = [source, cursor]
+        for column, value in zip(FILTERS, (role, rule, severity)):
+            if value is not None:
+                where.append(f"f.{column} = ?")
+                params.append(value)
+        if file is not None:
+            where.append("f.file >= ? AND f.file < ?")
+            params.extend([file, file + "\uffff"])
+        if status is not None:
+            op = "EXISTS" if status == "unchanged" else "NOT EXISTS"
+            where.append(
+                f"{op} (SELECT 1 FROM findings o "
+                "WHERE o.run_id = ? AND o.fingerprint = f.fingerprint)"
+            )
+            params.append(other)
+
+        limit = max(1, min(limit, 1000))
+        rows = self.conn.execute(
+            f"SELECT {', '.join('f.' + c for c in COLUMNS)} FROM findings f "
+            f"WHERE {' AND '.join(where)} ORDER BY f.id LIMIT ?",
+            (*params, limit + 1),
+        ).fetchall()
+        items = [dict(zip(COLUMNS, row)) for row in rows[:limit]]
+        next_cursor = items[-1]["id"] if len(rows) > limit else None
+        return {
+            "run": run_id,
+            "base": base_run_id,
+            "items": items,
+            "next_cursor": next_cursor,
+        }
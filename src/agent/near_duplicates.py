@@ -0,0 +1,198 @@
+"""Find near-duplicate task files and templates across roles.
+
+Each file is reduced to word shingles and a one-permutation MinHash
+signature (one hash per shingle, binned, minimum kept per bin).  Signatures
+are split into LSH bands so only files sharing a band bucket are compared,
+keeping the work sub-quadratic as the number of roles grows.  Signatures
+are cached by the SHA-1 of the file content, namespaced by the parameters
+that shape them so a config change never reuses stale entries.
+
+A pair with similarity ``s`` becomes a candidate with probability
+``1 - (1 - s**rows)**bands``.  The default 16 bands of 4 rows put the
+S-curve midpoint near 0.5, so pairs at a 0.8 threshold are found >99.9% of
+the time; 8 bands of 8 rows would miss about a quarter of them.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import zlib
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from agent.budget import AuditBudget
+
+NUM_BINS = 64
+_BIN_SHIFT = 64 - 6  # top 6 bits select one of 64 bins
+_VALUE_MASK = (1 << _BIN_SHIFT) - 1
+_MIX = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+_EMPTY = _VALUE_MASK + 1
+# Bump when tokenizing or hashing changes so cached signatures are rebuilt.
+SIGNATURE_VERSION = 1
+
+_TOKEN = re.compile(r"[A-Za-z0-9_.\-/]+|[^\sA-Za-z0-9_.\-/]")
+
+
+def shingles(text: str, size: int = 5) -> set[bytes]:
+    """Return the set of ``size``-token shingles of ``text``."""
+
+    tokens = _TOKEN.findall(text)
+    if len(tokens) < size:
+        return {" ".join(tokens).encode("utf-8")} if tokens else set()
+    return {
+        " ".join(tokens[i : i + size]).encode("utf-8")
+        for i in range(len(tokens) - size + 1)
+    }
+
+
+def signature(items: Iterable[bytes]) -> List[int]:
+    """One-permutation MinHash with rotation densification."""
+
+    bins = [_EMPTY] * NUM_BINS
+    for item in items:
+        h = (zlib.crc32(item) * _MIX + len(item)) & _MASK64
+        idx = h >> _BIN_SHIFT
+        value = h & _VALUE_MASK
+        if value < bins[idx]:
+            bins[idx] = value
+    if all(b == _EMPTY for b in bins):
+        return bins
+    # Fill empty bins from the next non-empty bin so every slot is comparable.
+    for i in range(NUM_BINS):
+        j = i
+        while bins[j % NUM_BINS] == _EMPTY:
+            j += 1
+        if j != i:
+            bins[i] = bins[j % NUM_BINS] + (j - i)
+    return bins
+
+
+def similarity(a: Sequence[int], b: Sequence[int]) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+class NearDuplicateFinder:
+    """LSH index over MinHash signatures of role task files and templates."""
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        shingle_size: int = 5,
+        bands: int = 16,
+        min_shingles: int = 20,
+        cache: Optional[Dict[str, List[int]]] = None,
+    ) -> None:
+        if NUM_BINS % bands:
+            raise ValueError("bands must divide the signature length")
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.bands = bands
+        self.rows = NUM_BINS // bands
+        self.min_shingles = min_shingles
+        self.cache = cache if cache is not None else {}
+        self.key_prefix = (
+            f"v{SIGNATURE_VERSION}:{NUM_BINS}:{shingle_size}:{min_shingles}:"
+        )
+        self.paths: List[str] = []
+        self.signatures: List[List[int]] = []
+        self.buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = defaultdict(list)
+
+    def add(self, path: str, content: bytes) -> None:
+        key = self.key_prefix + hashlib.sha1(content).hexdigest()
+        sig = self.cache.get(key)
+        if sig is None:
+            items = shingles(content.decode("utf-8", "replace"), self.shingle_size)
+            # Tiny files are cached as empty so they are skipped next time too.
+            sig = signature(items) if len(items) >= self.min_shingles else []
+            self.cache[key] = sig
+        if sig:
+            self.add_signature(path, sig)
+
+    def add_signature(self, path: str, sig: List[int]) -> None:
+        doc = len(self.paths)
+        self.paths.append(path)
+        self.signatures.append(sig)
+        for band in range(self.bands):
+            start = band * self.rows
+            self.buckets[(band, tuple(sig[start : start + self.rows]))].append(doc)
+
+    def candidate_probability(self, similarity: float) -> float:
+        """Chance that a pair with this similarity shares at least one band."""
+
+        return 1 - (1 - similarity**self.rows) ** self.bands
+
+    def pairs(self) -> List[Tuple[str, str, float]]:
+        """Return candidate pairs whose estimated similarity meets the threshold."""
+
+        seen: set[Tuple[int, int]] = set()
+        results = []
+        for docs in self.buckets.values():
+            if len(docs) < 2:
+                continue
+            for i, a in enumerate(docs):
+                for b in docs[i + 1 :]:
+                    if (a, b) in seen:
+                        continue
+                    seen.add((a, b))
+                    score = similarity(self.signatures[a], self.signatures[b])
+                    if score >= self.threshold:
+                        results.append((self.paths[a], self.paths[b], score))
+        return sorted(results, key=lambda r: (-r[2], r[0], r[1]))
+
+    def groups(self) -> List[Tuple[List[str], float, float]]:
+        """Cluster similar pairs into groups of ``(paths, min_score, max_score)``."""
+
+        parent: Dict[str, str] = {}
+
+        def find(x: str) -> str:
+            parent.setdefault(x, x)
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        scores: Dict[str, List[float]] = defaultdict(list)
+        pairs = self.pairs()
+        for a, b, _ in pairs:
+            parent[find(a)] = find(b)
+        for a, _, score in pairs:
+            scores[find(a)].append(score)
+        members: Dict[str, List[str]] = defaultdict(list)
+        for path in parent:
+            members[find(path)].append(path)
+        return sorted(
+            (
+                (sorted(paths), min(scores[root]), max(scores[root]))
+                for root, paths in members.items()
+            ),
+            key=lambda g: (-len(g[0]), g[0]),
+        )
+
+
+def candidate_files(root_dir: str, budget: Optional[AuditBudget] = None) -> List[str]:
+    """Task files and templates of every role, relative to ``root_dir``.
+
+    ``budget`` is checked for every directory and file walked.
+    """
+
+    checkpoint = budget.checkpoint if budget is not None else lambda: None
+    roles_dir = os.path.join(root_dir, "roles")
+    files: List[str] = []
+    if not os.path.isdir(roles_dir):
+        return files
+    for role in sorted(os.listdir(roles_dir)):
+        for sub, suffixes in (("tasks", (".yml", ".yaml")), ("templates", (".j2",))):
+            base = os.path.join(roles_dir, role, sub)
+            for dirpath, _, names in os.walk(base):
+                checkpoint()
+                for name in sorted(names):
+                    checkpoint()
+                    if name.endswith(suffixes):
+                        full = os.path.join(dirpath, name)
+                        files.append(os.path.relpath(full, root_dir))
+    return files
@@ -0,0 +1,328 @@
+"""Reachability index from playbooks to roles, task files and handlers.
+
+Playbooks are parsed into plays; every play's ``roles`` entries, role
+``meta`` dependencies, ``include_role``/``import_role`` tasks and
+``include_tasks``/``import_tasks`` targets are followed to mark role task and
+handler files as reachable.  Role and task files that no entry playbook can
+reach are dead code.
+
+The index is cached under a signature of the size and mtime of every parsed
+file, so unchanged trees are not re-parsed.
+"""
+
+from __future__ import annotations
+
+import glob
+import hashlib
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import yaml
+
+from agent.budget import AuditBudget
+
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+TASK_INCLUDES = {"include_tasks", "import_tasks", "include"}
+ROLE_INCLUDES = {"include_role", "import_role"}
+PLAYBOOK_INCLUDES = {"import_playbook", "include_playbook"}
+TASK_SECTIONS = ("pre_tasks", "tasks", "post_tasks", "handlers")
+BLOCK_KEYS = ("block", "rescue", "always")
+_JINJA = re.compile(r"{{.*?}}")
+
+
+def _module(task: Dict[str, Any], names: Set[str]) -> Optional[Any]:
+    """Return the argument of the first key in ``task`` naming one of ``names``."""
+
+    for key, value in task.items():
+        if isinstance(key, str) and key.rsplit(".", 1)[-1] in names:
+            return value
+    return None
+
+
+def _target(value: Any, key: str = "file") -> Optional[str]:
+    if isinstance(value, dict):
+        value = value.get(key) or value.get("name")
+    return value if isinstance(value, str) else None
+
+
+def _role_name(entry: Any) -> Optional[str]:
+    if isinstance(entry, dict):
+        entry = entry.get("role") or entry.get("name")
+    return entry if isinstance(entry, str) else None
+
+
+def _yaml_files(directory: str) -> List[str]:
+    files = []
+    for dirpath, _, names in os.walk(directory):
+        files.extend(
+            os.path.join(dirpath, n) for n in names if n.endswith((".yml", ".yaml"))
+        )
+    return sorted(files)
+
+
+class ReachabilityIndex:
+    """Which roles and task files each entry playbook can reach."""
+
+    def __init__(self, root_dir: str, budget: Optional[AuditBudget] = None) -> None:
+        self.root_dir = os.path.abspath(root_dir)
+        self.budget = budget
+        self.playbooks: List[str] = []
+        self.roles: Dict[str, List[str]] = {}
+        self.files: Dict[str, List[str]] = {}
+        self.unresolved: List[str] = []
+
+    # -- building -------------------------------------------------------
+
+    def _rel(self, path: str) -> str:
+        return os.path.relpath(path, self.root_dir)
+
+    def _load(self, path: str) -> Any:
+        if self.budget is not None and os.path.isfile(path):
+            self.budget.charge(path)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return yaml.load(f, Loader=YamlLoader)
+        except (OSError, UnicodeDecodeError, yaml.YAMLError):
+            return None
+
+    def _mark(self, path: str, parent: str) -> bool:
+        """Record ``parent`` -> ``path``; return True the first time ``path`` is seen."""
+
+        rel = self._rel(path)
+        first = rel not in self.files
+        parents = self.files.setdefault(rel, [])
+        if parent not in parents:
+            parents.append(parent)
+        return first
+
+    def _resolve(self, base_dir: str, target: str, parent: str) -> List[str]:
+        pattern = _JINJA.sub("*", target)
+        path = os.path.normpath(os.path.join(base_dir, pattern))
+        matches = sorted(glob.glob(path)) if "*" in pattern else [path]
+        matches = [m for m in matches if os.path.isfile(m)]
+        if not matches:
+            self.unresolved.append(f"{parent}: {target}")
+        return matches
+
+    def _walk_tasks(self, tasks: Any, base_dir: str, parent: str) -> None:
+        if not isinstance(tasks, list):
+            return
+        for task in tasks:
+            if not isinstance(task, dict):
+                continue
+            for key in BLOCK_KEYS:
+                self._walk_tasks(task.get(key), base_dir, parent)
+            target = _target(_module(task, TASK_INCLUDES))
+            if target:
+                for path in self._resolve(base_dir, target, parent):
+                    self._task_file(path, base_dir, parent)
+            role = _module(task, ROLE_INCLUDES)
+            name = _role_name(role)
+            if name:
+                tasks_from = role.get("tasks_from") if isinstance(role, dict) else None
+                self._role(name, parent, tasks_from)
+
+    def _task_file(self, path: str, base_dir: str, parent: str) -> None:
+        if self._mark(path, parent):
+            # Nested includes resolve against the including role's tasks dir.
+            self._walk_tasks(self._load(path), base_dir, self._rel(path))
+
+    def _role(self, name: str, parent: str, tasks_from: Optional[str] = None) -> None:
+        name = _JINJA.sub("*", name).rsplit("/", 1)[-1]
+        if "*" in name:
+            # A templated role name may be any matching role: keep them all live.
+            matches = sorted(
+                os.path.basename(path)
+                for path in glob.glob(os.path.join(self.root_dir, "roles", name))
+                if os.path.isdir(path)
+            )
+            if not matches:
+                self.unresolved.append(f"{parent}: role {name}")
+            for match in matches:
+                self._role(match, parent, tasks_from)
+            return
+        role_dir = os.path.join(self.root_dir, "roles", name)
+        if not os.path.isdir(role_dir):
+            self.unresolved.append(f"{parent}: role {name}")
+            return
+        first = name not in self.roles
+        parents = self.roles.setdefault(name, [])
+        if parent not in parents:
+            parents.append(parent)
+        rel_role = self._rel(role_dir)
+        tasks_dir = os.path.join(role_dir, "tasks")
+        entry = tasks_from or "main"
+        if not entry.endswith((".yml", ".yaml")):
+            entry += ".yml"
+        entry_path = os.path.join(tasks_dir, entry)
+        if os.path.isfile(entry_path):
+            self._task_file(entry_path, tasks_dir, rel_role)
+        if not first:
+            return
+        handlers_dir = os.path.join(role_dir, "handlers")
+        for handlers in ("main.yml", "main.yaml"):
+            path = os.path.join(handlers_dir, handlers)
+            if os.path.isfile(path):
+                self._task_file(path, handlers_dir, rel_role)
+        meta = self._load(os.path.join(role_dir, "meta", "main.yml"))
+        deps = meta.get("dependencies") if isinstance(meta, dict) else None
+        for dep in deps or []:
+            dep_name = _role_name(dep)
+            if dep_name:
+                self._role(dep_name, rel_role)
+
+    def _playbook(self, path: str, parent: str) -> None:
+        if not self._mark(path, parent):
+            return
+        rel = self._rel(path)
+        base_dir = os.path.dirname(path)
+        plays = self._load(path)
+        if not isinstance(plays, list):
+            return
+        for play in plays:
+            if not isinstance(play, dict):
+                continue
+            target = _target(_module(play, PLAYBOOK_INCLUDES))
+            if target:
+                for sub in self._resolve(base_dir, target, rel):
+                    self._playbook(sub, rel)
+                continue
+            for role in play.get("roles") or []:
+                name = _role_name(role)
+                if name:
+                    self._role(name, rel)
+            for section in TASK_SECTIONS:
+                self._walk_tasks(play.get(section), base_dir, rel)
+
+    def build(self, playbooks: Iterable[str]) -> "ReachabilityIndex":
+        for playbook in playbooks:
+            path = os.path.join(self.root_dir, playbook)
+            if os.path.isfile(path):
+                self.playbooks.append(self._rel(path))
+                self._playbook(path, "")
+        return self
+
+    # -- queries --------------------------------------------------------
+
+    def all_roles(self) -> List[str]:
+        roles_dir = os.path.join(self.root_dir, "roles")
+        if not os.path.isdir(roles_dir):
+            return []
+        return sorted(
+            r
+            for r in os.listdir(roles_dir)
+            if os.path.isdir(os.path.join(roles_dir, r))
+        )
+
+    def dead_roles(self) -> List[str]:
+        return [r for r in self.all_roles() if r not in self.roles]
+
+    def dead_task_files(self) -> List[str]:
+        """Task and handler files of reachable roles that nothing includes."""
+
+        dead = []
+        for role in sorted(self.roles):
+            for sub in ("tasks", "handlers"):
+                for path in _yaml_files(
+                    os.path.join(self.root_dir, "roles", role, sub)
+                ):
+                    if self._rel(path) not in self.files:
+                        dead.append(self._rel(path))
+        for path in _yaml_files(os.path.join(self.root_dir, "tasks")):
+            if self._rel(path) not in self.files:
+                dead.append(self._rel(path))
+        return dead
+
+    def is_live(self, path: str) -> bool:
+        """False for files in dead roles and unreachable task/handler files."""
+
+        rel = self._rel(path) if os.path.isabs(path) else os.path.normpath(path)
+        parts = rel.split(os.sep)
+        if parts[0] != "roles" or len(parts) < 2:
+            if parts[0] == "tasks" and rel.endswith((".yml", ".yaml")):
+                return rel in self.files
+            return True
+        if parts[1] not in self.roles:
+            return False
+        if len(parts) > 3 and parts[2] in ("tasks", "handlers"):
+            return rel in self.files
+        return True
+
+    # -- caching --------------------------------------------------------
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "playbooks": self.playbooks,
+            "roles": self.roles,
+            "files": self.files,
+            "unresolved": self.unresolved,
+        }
+
+    @classmethod
+    def from_dict(cls, root_dir: str, data: Dict[str, Any]) -> "ReachabilityIndex":
+        index = cls(root_dir)
+        index.playbooks = data["playbooks"]
+        index.roles = data["roles"]
+        index.files = data["files"]
+        index.unresolved = data["unresolved"]
+        return index
+
+
+def signature(
+    root_dir: str, playbooks: Iterable[str], budget: Optional[AuditBudget] = None
+) -> str:
+    """Hash of the path, size and mtime of every file the index may parse.
+
+    ``budget`` is checked for every path found, so a huge tree cannot
+    outlast the audit deadline here.
+    """
+
+    digest = hashlib.sha1()
+    paths = [os.path.join(root_dir, p) for p in playbooks]
+    patterns = [
+        os.path.join(root_dir, p)
+        for p in ("*.yml", "*.yaml", "playbooks/*.y*ml", "tasks/*.y*ml")
+    ]
+    patterns += [
+        os.path.join(root_dir, "roles", "*", sub, "**", "*.y*ml")
+        for sub in ("tasks", "handlers", "meta")
+    ]
+    patterns.append(os.path.join(root_dir, "roles", "*"))
+    for pattern in patterns:
+        for path in glob.iglob(pattern, recursive=True):
+            if budget is not None:
+                budget.checkpoint()
+            paths.append(path)
+    for path in sorted(set(paths)):
+        if budget is not None:
+            budget.checkpoint()
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        digest.update(f"{path}\0{st.st_size}\0{st.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def build_index(
+    root_dir: str,
+    playbooks: List[str],
+    cache: Optional[Dict[str, Any]] = None,
+    budget: Optional[AuditBudget] = None,
+) -> ReachabilityIndex:
+    """Return the index for ``playbooks``, reusing ``cache`` when unchanged.
+
+    ``cache`` is updated in place with ``signature`` and ``index`` keys.
+    Files parsed while building are charged to ``budget``.
+    """
+
+    key = signature(root_dir, playbooks, budget) + "\0" + "\0".join(playbooks)
+    if cache is not None and cache.get("signature") == key:
+        return ReachabilityIndex.from_dict(root_dir, cache["index"])
+    index = ReachabilityIndex(root_dir, budget).build(playbooks)
+    if cache is not None:
+        cache["signature"] = key
+        cache["index"] = index.to_dict()
+    return index
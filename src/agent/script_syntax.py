@@ -0,0 +1,341 @@
+"""Syntax-check rendered shell and Lua templates.
+
+Script templates are rendered in a sandbox with representative variables
+(role defaults and vars, plus any configured vars files); anything undefined
+renders as its own name.  The rendered text is then checked with ``bash -n`` or ``luac -p``
+on a thread pool.  Results are cached by the SHA-1 of the rendered content so
+only edited templates are re-checked.
+
+To report errors against the ``.j2`` source, every line of literal template
+text is prefixed with a marker carrying its template line number; the markers
+are stripped after rendering and turned into a line map.
+"""
+
+from __future__ import annotations
+
+import fnmatch
+import hashlib
+import re
+import shutil
+import subprocess
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import jinja2
+from jinja2.ext import Extension
+from jinja2.lexer import Token
+from jinja2.sandbox import ImmutableSandboxedEnvironment
+
+from agent.budget import AuditBudget
+
+MARK = "\x00\x01"
+MARK_END = "\x02"
+_MARK_RE = re.compile("\x00\x01(\\d+)\x02")
+
+CHECKERS: Dict[str, Dict[str, Any]] = {
+    "shell": {"command": ["bash", "-n"], "line": re.compile(r"line (\d+):\s*(.*)")},
+    "lua": {"command": ["luac", "-p", "-"], "line": re.compile(r":(\d+):\s*(.*)")},
+}
+
+# How often a running check pool looks at the audit budget, in seconds.
+BUDGET_POLL = 0.05
+
+DEFAULT_PATTERNS = {
+    "shell": ["*.sh.j2"],
+    "lua": ["*.lua.j2", "dnsdist.conf.j2"],
+}
+
+
+class _LineMarkers(Extension):
+    """Tag each run of literal template text with its source line."""
+
+    def filter_stream(self, stream):
+        for token in stream:
+            if token.type != "data":
+                yield token
+                continue
+            lineno = token.lineno
+            parts = token.value.split("\n")
+            value = [f"{MARK}{lineno}{MARK_END}{parts[0]}"]
+            for part in parts[1:]:
+                lineno += 1
+                value.append(f"\n{MARK}{lineno}{MARK_END}{part}" if part else "\n")
+            yield Token(token.lineno, "data", "".join(value))
+
+
+class _Placeholder(jinja2.ChainableUndefined):
+    """Undefined values render as their own name so scripts stay parseable."""
+
+    def __str__(self) -> str:
+        return self._undefined_name or "undefined"
+
+
+def _passthrough(value: Any, *args: Any, **kwargs: Any) -> Any:
+    return value
+
+
+class _AnyName(dict):
+    """Filter/test table that accepts Ansible-only names without failing."""
+
+    def __init__(self, builtins: Dict[str, Callable], fallback: Callable) -> None:
+        super().__init__(builtins)
+        self.fallback = fallback
+
+    def __contains__(self, name: object) -> bool:
+        return True
+
+    def __missing__(self, name: str) -> Callable:
+        return self.fallback
+
+    def get(self, name: str, default: Any = None) -> Callable:
+        return self[name]
+
+
+def environment(markers: bool = True) -> jinja2.Environment:
+    """Sandboxed Jinja environment matching Ansible's template defaults.
+
+    Audited templates are untrusted input, so they cannot reach Python
+    internals, mutate values or build huge ``range`` results.
+    """
+
+    env = ImmutableSandboxedEnvironment(
+        undefined=_Placeholder,
+        trim_blocks=True,
+        keep_trailing_newline=True,
+        extensions=[_LineMarkers] if markers else [],
+    )
+    env.filters = _AnyName(env.filters, _passthrough)
+    env.tests = _AnyName(env.tests, lambda *args, **kwargs: False)
+    env.globals.update(lookup=lambda *args, **kwargs: "", query=lambda *a, **k: [])
+    return env
+
+
+def resolve(
+    env: jinja2.Environment,
+    variables: Dict[str, Any],
+    depth: int = 3,
+    compiled: Optional[Dict[str, jinja2.Template]] = None,
+) -> Dict[str, Any]:
+    """Expand templated string values the way Ansible would on lookup.
+
+    ``env`` must not inject line markers.  Values that fail to render are
+    left as-is; ``depth`` bounds chains of variables referring to variables.
+    ``compiled`` memoises parsed values across calls sharing the same vars.
+    """
+
+    if compiled is None:
+        compiled = {}
+    resolved = dict(variables)
+    for _ in range(depth):
+        changed = False
+        for name, value in resolved.items():
+            if not isinstance(value, str) or ("{{" not in value and "{%" not in value):
+                continue
+            try:
+                if value not in compiled:
+                    compiled[value] = env.from_string(value)
+                new = compiled[value].render(resolved)
+            except Exception:  # noqa: BLE001 - keep the raw value
+                continue
+            if new != value:
+                resolved[name] = new
+                changed = True
+        if not changed:
+            break
+    return resolved
+
+
+def render(
+    env: jinja2.Environment, source: str, variables: Dict[str, Any]
+) -> Tuple[str, List[int]]:
+    """Render ``source`` and return ``(text, line_map)``.
+
+    ``line_map[i]`` is the template line that produced rendered line ``i + 1``.
+    """
+
+    marked = env.from_string(source).render(variables)
+    lines: List[str] = []
+    line_map: List[int] = []
+    current = 1
+    for line in marked.split("\n"):
+        found = _MARK_RE.findall(line)
+        line_map.append(int(found[0]) if found else current)
+        if found:
+            current = int(found[-1])
+        lines.append(_MARK_RE.sub("", line) if found else line)
+    return "\n".join(lines), line_map
+
+
+def kind_of(name: str, patterns: Dict[str, List[str]]) -> Optional[str]:
+    for kind, globs in patterns.items():
+        if any(fnmatch.fnmatch(name, pattern) for pattern in globs):
+            return kind
+    return None
+
+
+def run_checker(
+    kind: str, text: str, timeout: float = 10.0
+) -> Tuple[List[List[Any]], bool]:
+    """Syntax-check ``text``; return ``([[rendered_line, message], ...], final)``.
+
+    ``final`` is false when the checker hung or could not be started; such
+    results must not be cached so the template is checked again next run.
+    """
+
+    checker = CHECKERS[kind]
+    name = checker["command"][0]
+    try:
+        proc = subprocess.run(
+            checker["command"],
+            input=text.encode("utf-8"),
+            capture_output=True,
+            timeout=timeout,
+        )
+    except subprocess.TimeoutExpired:
+        return [[0, f"{name} timed out after {timeout:g}s"]], False
+    except OSError as exc:
+        return [[0, f"{name} unavailable: {exc.strerror or exc}"]], False
+    if proc.returncode == 0:
+        return [], True
+    errors = []
+    for line in proc.stderr.decode("utf-8", "replace").splitlines():
+        match = checker["line"].search(line)
+        # bash echoes the offending line after the message; skip the echo.
+        if match and not match.group(2).startswith("`"):
+            errors.append([int(match.group(1)), match.group(2).strip()])
+    return errors or [[0, f"{name} exited {proc.returncode}"]], True
+
+
+def content_key(kind: str, text: str) -> str:
+    return hashlib.sha1(f"{kind}\0{text}".encode("utf-8")).hexdigest()
+
+
+class ScriptSyntaxChecker:
+    """Render script templates and syntax-check them in parallel."""
+
+    def __init__(
+        self,
+        patterns: Optional[Dict[str, List[str]]] = None,
+        workers: Optional[int] = None,
+        cache: Optional[Dict[str, List[List[Any]]]] = None,
+        timeout: float = 10.0,
+        budget: Optional[AuditBudget] = None,
+    ) -> None:
+        self.patterns = patterns or DEFAULT_PATTERNS
+        self.workers = workers
+        self.cache = cache if cache is not None else {}
+        self.timeout = timeout
+        self.budget = budget
+        self.env = environment()
+        self.plain_env = environment(markers=False)
+        self.compiled: Dict[str, jinja2.Template] = {}
+        self.available = {
+            kind: shutil.which(conf["command"][0]) is not None
+            for kind, conf in CHECKERS.items()
+        }
+        self.checked = 0
+
+    def _checkpoint(self) -> None:
+        if self.budget is not None:
+            self.budget.checkpoint()
+
+    def _run(self, kind: str, text: str) -> Tuple[List[List[Any]], bool]:
+        # A check never outlives the audit deadline.
+        remaining = self.budget.remaining() if self.budget is not None else None
+        timeout = self.timeout if remaining is None else min(self.timeout, remaining)
+        return run_checker(kind, text, timeout=timeout)
+
+    def check(
+        self, templates: Iterable[Tuple[str, str, Dict[str, Any]]]
+    ) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """Check ``(path, source, variables)`` triples.
+
+        Returns ``(errors, skipped)`` where each error has ``file``, ``line``
+        (template line), ``rendered_line`` and ``message``; ``skipped`` holds
+        human-readable reasons for templates that were not checked.
+        Raises :class:`~agent.budget.BudgetExceeded` as soon as the budget
+        runs out; checks still queued are cancelled and finished ones stay
+        in the cache.
+        """
+
+        errors: List[Dict[str, Any]] = []
+        skipped: List[str] = []
+        pending: Dict[str, Tuple[str, str]] = {}
+        jobs: List[Tuple[str, str, List[int]]] = []
+        used: set[str] = set()
+        resolved: Dict[int, Dict[str, Any]] = {}
+        for path, source, variables in templates:
+            self._checkpoint()
+            kind = kind_of(path.rsplit("/", 1)[-1], self.patterns)
+            if kind is None:
+                continue
+            if not self.available[kind]:
+                skipped.append(f"{path}: {CHECKERS[kind]['command'][0]} not found")
+                continue
+            if id(variables) not in resolved:
+                resolved[id(variables)] = resolve(
+                    self.plain_env, variables, compiled=self.compiled
+                )
+            try:
+                text, line_map = render(self.env, source, resolved[id(variables)])
+            except jinja2.TemplateSyntaxError as exc:
+                errors.append(
+                    {
+                        "file": path,
+                        "line": exc.lineno,
+                        "rendered_line": None,
+                        "message": f"template syntax error: {exc.message}",
+                    }
+                )
+                continue
+            except Exception as exc:  # noqa: BLE001 - placeholder values
+                skipped.append(f"{path}: could not render ({exc})")
+                continue
+            key = content_key(kind, text)
+            used.add(key)
+            if key not in self.cache:
+                pending[key] = (kind, text)
+            jobs.append((path, key, line_map))
+
+        results: Dict[str, List[List[Any]]] = {}
+        if pending:
+            pool = ThreadPoolExecutor(max_workers=self.workers)
+            futures = {
+                pool.submit(self._run, kind, text): key
+                for key, (kind, text) in pending.items()
+            }
+            running = set(futures)
+            try:
+                while running:
+                    done, running = wait(
+                        running, timeout=BUDGET_POLL, return_when=FIRST_COMPLETED
+                    )
+                    for future in done:
+                        found, final = future.result()
+                        results[futures[future]] = found
+                        if final:
+                            self.cache[futures[future]] = found
+                    self._checkpoint()
+            finally:
+                # Never wait for checks the budget no longer allows.
+                pool.shutdown(wait=False, cancel_futures=True)
+            self.checked = len(pending)
+
+        for path, key, line_map in jobs:
+            found = results[key] if key in results else self.cache[key]
+            for rendered_line, message in found:
+                line = None
+                if 0 < rendered_line <= len(line_map):
+                    line = line_map[rendered_line - 1]
+                errors.append(
+                    {
+                        "file": path,
+                        "line": line,
+                        "rendered_line": rendered_line or None,
+                        "message": message,
+                    }
+                )
+        # Drop entries for templates that no longer render to the same text.
+        for key in set(self.cache) - used:
+            del self.cache[key]
+        return errors, skipped
@@ -0,0 +1,321 @@
+"""Validate zone data defined in Ansible variables before it reaches MySQL.
+
+Zones and records are interned into integer ids and stored column-wise in
+``array`` buffers: each record costs one 8-byte key plus a few 4-byte side
+column entries, and each distinct owner name or content value is kept once
+as a ``str`` in an interner.  Storage is compact but still O(records), not
+bounded; a million records with distinct names and addresses take a few
+hundred MB.  Conflicts are found with one sort
+over packed ``(owner, type, content)`` keys plus a few hash lookups.
+"""
+
+from __future__ import annotations
+
+import ipaddress
+from array import array
+from bisect import bisect_left
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from agent.budget import AuditBudget
+
+ZONE_VARIABLES = ("zones_config", "reverse_zones_config", "zones_as_code")
+
+# Types allowed to coexist with a CNAME at the same owner name.
+CNAME_COMPANIONS = {"RRSIG", "NSEC", "NSEC3"}
+
+_OWNER_SHIFT = 40
+_TYPE_SHIFT = 32
+_MAX_OWNERS = 1 << (64 - _OWNER_SHIFT)
+_MAX_CONTENTS = 1 << _TYPE_SHIFT
+# Records processed between budget checkpoints in the validation passes.
+_CHECK_EVERY = 4096
+
+
+def _normalize(name: str) -> str:
+    return name.strip().lower().rstrip(".")
+
+
+def _in_zone(name: str, zone: str) -> bool:
+    return name == zone or name.endswith("." + zone)
+
+
+def reverse_name(address: str) -> Optional[str]:
+    """Return the ``in-addr.arpa``/``ip6.arpa`` name for ``address``."""
+
+    if ":" not in address:
+        octets = address.split(".")
+        if len(octets) == 4 and all(o.isdigit() and len(o) <= 3 for o in octets):
+            return ".".join(reversed(octets)) + ".in-addr.arpa"
+        return None
+    try:
+        return ipaddress.IPv6Address(address).reverse_pointer
+    except ValueError:
+        return None
+
+
+def address_from_reverse(name: str) -> Optional[str]:
+    """Return the address encoded by a full reverse name, if any."""
+
+    if name.endswith(".in-addr.arpa"):
+        labels = name[: -len(".in-addr.arpa")].split(".")
+        if len(labels) == 4:
+            return ".".join(reversed(labels))
+    elif name.endswith(".ip6.arpa"):
+        nibbles = name[: -len(".ip6.arpa")].split(".")
+        if len(nibbles) == 32:
+            packed = "".join(reversed(nibbles))
+            groups = [packed[i : i + 4] for i in range(0, 32, 4)]
+            try:
+                return str(ipaddress.IPv6Address(":".join(groups)))
+            except ValueError:
+                return None
+    return None
+
+
+class _Interner:
+    """Map strings to dense integer ids, keeping one copy of each string."""
+
+    def __init__(self) -> None:
+        self.ids: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def add(self, value: str) -> int:
+        idx = self.ids.get(value)
+        if idx is None:
+            idx = len(self.values)
+            self.ids[value] = idx
+            self.values.append(value)
+        return idx
+
+    def get(self, value: str) -> Optional[int]:
+        return self.ids.get(value)
+
+
+class ZoneValidator:
+    """Columnar index over zone records with sort and hash based checks."""
+
+    def __init__(
+        self, max_issues: int = 1000, budget: Optional[AuditBudget] = None
+    ) -> None:
+        self.max_issues = max_issues
+        self.budget = budget
+        self.names = _Interner()
+        self.types = _Interner()
+        self.contents = _Interner()
+        self.zones: Dict[str, str] = {}
+        self.zones_with_records: set[str] = set()
+        self.keys = array("Q")
+        # Side columns for the cross-record passes.
+        self.ns_owner = array("I")
+        self.ns_target = array("I")
+        self.addr_owner = array("I")
+        self.addr_value = array("I")
+        self.ptr_owner = array("I")
+        self.ptr_target = array("I")
+        self.cname_owner = array("I")
+        # Problems found while loading; replayed by every ``validate`` call.
+        self.load_issues: List[str] = []
+        self.issues: List[str] = []
+        self.issue_count = 0
+
+    def _checkpoint(self, done: int) -> None:
+        if self.budget is not None and done % _CHECK_EVERY == 0:
+            self.budget.checkpoint()
+
+    def _issue(self, message: str) -> None:
+        self.issue_count += 1
+        if len(self.issues) < self.max_issues:
+            self.issues.append(message)
+
+    def load_vars(self, data: Dict[str, object], source: str = "") -> None:
+        """Load every known zone variable found in a parsed vars file."""
+
+        for var in ZONE_VARIABLES:
+            zones = data.get(var) if isinstance(data, dict) else None
+            if isinstance(zones, list):
+                for zone in zones:
+                    if isinstance(zone, dict) and zone.get("name"):
+                        self.add_zone(zone, source)
+
+    def add_zone(self, zone: Dict[str, object], source: str = "") -> None:
+        name = _normalize(str(zone["name"]))
+        self.zones.setdefault(name, source)
+        for record in zone.get("records") or []:
+            if not isinstance(record, dict):
+                continue
+            self.zones_with_records.add(name)
+            self.add_record(
+                name,
+                str(record.get("name", "@")),
+                str(record.get("type", "")),
+                str(record.get("content", "")),
+            )
+
+    def add_record(self, zone: str, owner: str, rtype: str, content: str) -> None:
+        """Append one record to the columnar store."""
+
+        owner = owner.strip()
+        if owner in ("@", ""):
+            fqdn = zone
+        elif owner.endswith("."):
+            fqdn = _normalize(owner)
+            if not _in_zone(fqdn, zone):
+                self.load_issues.append(
+                    f"zone {zone}: {fqdn} {rtype} is outside the zone"
+                )
+        else:
+            fqdn = _normalize(owner)
+            if not _in_zone(fqdn, zone):
+                fqdn = f"{fqdn}.{zone}"
+        rtype = rtype.strip().upper()
+        if rtype in ("CNAME", "NS", "PTR", "MX", "SRV"):
+            content = _normalize(content)
+        elif rtype == "AAAA":
+            try:
+                content = str(ipaddress.IPv6Address(content.strip()))
+            except ValueError:
+                content = content.strip()
+        else:
+            content = content.strip()
+
+        owner_id = self.names.add(fqdn)
+        type_id = self.types.add(rtype)
+        content_id = self.contents.add(content)
+        if owner_id >= _MAX_OWNERS or type_id > 0xFF or content_id >= _MAX_CONTENTS:
+            raise ValueError("Zone data exceeds validator capacity")
+        self.keys.append(
+            (owner_id << _OWNER_SHIFT) | (type_id << _TYPE_SHIFT) | content_id
+        )
+
+        if rtype in ("A", "AAAA"):
+            self.addr_owner.append(owner_id)
+            self.addr_value.append(content_id)
+        elif rtype == "NS":
+            self.ns_owner.append(owner_id)
+            self.ns_target.append(self.names.add(content))
+        elif rtype == "PTR":
+            self.ptr_owner.append(owner_id)
+            self.ptr_target.append(self.names.add(content))
+        elif rtype == "CNAME":
+            self.cname_owner.append(owner_id)
+
+    def _covering_zone(self, name: str) -> Optional[str]:
+        while True:
+            if name in self.zones:
+                return name
+            if "." not in name:
+                return None
+            name = name.split(".", 1)[1]
+
+    def _describe(self, key: int) -> str:
+        name = self.names.values[key >> _OWNER_SHIFT]
+        rtype = self.types.values[(key >> _TYPE_SHIFT) & 0xFF]
+        content = self.contents.values[key & (_MAX_CONTENTS - 1)]
+        return f"{name}: duplicate {rtype} record '{content}'"
+
+    def _check_rrsets(self) -> None:
+        ordered = sorted(self.keys)
+        if len(set(ordered)) != len(ordered):
+            for i, (prev, key) in enumerate(zip(ordered, islice(ordered, 1, None))):
+                self._checkpoint(i)
+                if prev == key:
+                    self._issue(self._describe(key))
+
+        # Only owners holding a CNAME need their full type set, so locate
+        # their key ranges in the sorted column instead of grouping everything.
+        cname_id = self.types.get("CNAME")
+        for i, owner in enumerate(sorted(set(self.cname_owner))):
+            self._checkpoint(i)
+            lo = bisect_left(ordered, owner << _OWNER_SHIFT)
+            hi = bisect_left(ordered, (owner + 1) << _OWNER_SHIFT)
+            owner_keys = set(ordered[lo:hi])
+            types = {(key >> _TYPE_SHIFT) & 0xFF for key in owner_keys}
+            name = self.names.values[owner]
+            cnames = sum(
+                1 for key in owner_keys if (key >> _TYPE_SHIFT) & 0xFF == cname_id
+            )
+            if cnames > 1:
+                self._issue(f"{name}: multiple CNAME records")
+            others = sorted(
+                self.types.values[t]
+                for t in types
+                if t != cname_id and self.types.values[t] not in CNAME_COMPANIONS
+            )
+            if others:
+                self._issue(f"{name}: CNAME and other data ({', '.join(others)})")
+
+    def _check_glue(self) -> None:
+        have_address = set(self.addr_owner)
+        for i, (owner_id, target_id) in enumerate(zip(self.ns_owner, self.ns_target)):
+            self._checkpoint(i)
+            # Glue is needed for servers inside the delegated name itself.
+            owner = self.names.values[owner_id]
+            target = self.names.values[target_id]
+            if _in_zone(target, owner) and target_id not in have_address:
+                self._issue(f"zone {owner}: missing glue for NS {target}")
+
+    def _check_reverse(self) -> None:
+        reverse_zones = {z for z in self.zones_with_records if z.endswith(".arpa")}
+        if not reverse_zones and not self.ptr_owner:
+            return
+        addr_pairs = {(o << 32) | v for o, v in zip(self.addr_owner, self.addr_value)}
+        # Join PTRs to addresses on interned ids so matching records never
+        # touch strings; only mismatches are decoded for the report.
+        ptr_pairs = set()
+        names = self.names.values
+        content_ids = self.contents.ids
+        for i, (owner_id, target_id) in enumerate(zip(self.ptr_owner, self.ptr_target)):
+            self._checkpoint(i)
+            address = address_from_reverse(names[owner_id])
+            value_id = content_ids.get(address) if address else None
+            if value_id is not None:
+                ptr_pairs.add((value_id << 32) | target_id)
+                if (target_id << 32) | value_id in addr_pairs:
+                    continue
+            target = self.names.values[target_id]
+            if self._covering_zone(target) in self.zones_with_records:
+                name = self.names.values[owner_id]
+                self._issue(f"{name}: PTR {target} has no matching address record")
+
+        for i, (owner_id, value_id) in enumerate(zip(self.addr_owner, self.addr_value)):
+            self._checkpoint(i)
+            if (value_id << 32) | owner_id in ptr_pairs:
+                continue
+            address = self.contents.values[value_id]
+            rev = reverse_name(address)
+            if rev is None:
+                self._issue(
+                    f"{self.names.values[owner_id]}: invalid address '{address}'"
+                )
+            elif self._covering_zone(rev) in reverse_zones:
+                name = self.names.values[owner_id]
+                self._issue(f"{name}: address {address} has no matching PTR")
+
+    def validate(self) -> List[str]:
+        """Run all checks and return the (possibly truncated) issue list."""
+
+        self.issues = []
+        self.issue_count = 0
+        for message in self.load_issues:
+            self._issue(message)
+        self._checkpoint(0)
+        self._check_rrsets()
+        self._check_glue()
+        self._check_reverse()
+        if self.issue_count > len(self.issues):
+            self.issues.append(
+                f"... {self.issue_count - len(self.issues)} more zone issues omitted"
+            )
+        return self.issues
+
+
+def validate_zone_vars(
+    documents: Iterable[Tuple[str, Dict[str, object]]], max_issues: int = 1000
+) -> List[str]:
+    """Validate zone variables from ``(source, data)`` pairs."""
+
+    validator = ZoneValidator(max_issues=max_issues)
+    for source, data in documents:
+        validator.load_vars(data, source)
+    return validator.validate()
@@ -0,0 +1,366 @@
+"""Load-test the audit API with a scripted asyncio HTTP client.
+
+:func:`run_load` keeps ``concurrency`` requests in flight over one pooled
+``httpx`` client, picking each request from a weighted mix of endpoints,
+until ``requests`` have been sent or ``duration`` seconds have passed.
+:class:`LocalServer` starts ``validate.py serve`` in a scratch directory
+with its own copy of the config and of the audited tree, so worker counts
+and rate-limit settings can be compared without touching the real state
+files or the tree's ``validation_report.md``.  The summary holds
+throughput, latency percentiles, error and 429 rates per endpoint and the
+server's resident memory, and is plain JSON.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import copy
+import os
+import random
+import secrets
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import yaml
+
+VALIDATE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "validate.py",
+)
+
+# ``params`` values are formatted with ``root`` (the audited directory).
+DEFAULT_MIX: Dict[str, Dict[str, Any]] = {
+    "audit": {
+        "method": "POST",
+        "path": "/audit",
+        "params": {"root": "{root}"},
+        "weight": 1,
+    },
+    "report": {"method": "GET", "path": "/report", "weight": 4},
+    "findings": {
+        "method": "GET",
+        "path": "/findings",
+        "params": {"limit": "50"},
+        "weight": 2,
+    },
+}
+
+RSS_INTERVAL = 0.1
+
+# Not copied into the scratch tree: VCS data, local state and build output.
+COPY_IGNORE = shutil.ignore_patterns(
+    ".git", "state", "logs", "__pycache__", ".pytest_cache", "*.pyc"
+)
+
+Sample = Tuple[str, int, float]
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+
+    if not ordered:
+        return 0.0
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+def process_rss(pid: int) -> Optional[int]:
+    """Resident bytes of ``pid`` and all its descendants, from ``/proc``."""
+
+    children: Dict[int, List[int]] = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return None
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                # The command name may contain spaces; fields follow the ')'.
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    total = 0
+    found = False
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status", "r") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        found = True
+                        break
+        except OSError:
+            continue
+        pending.extend(children.get(current, []))
+    return total if found else None
+
+
+def summarize(samples: List[Sample]) -> Dict[str, Any]:
+    """Counts, rates and latency percentiles (ms) for ``(name, status, s)``."""
+
+    latencies = sorted(latency * 1000 for _, _, latency in samples)
+    count = len(samples)
+    statuses: Dict[str, int] = {}
+    for _, status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    # Status 0 marks a transport error (refused, reset, timed out).
+    errors = sum(
+        n for s, n in statuses.items() if s != "429" and (s == "0" or int(s) >= 400)
+    )
+    limited = statuses.get("429", 0)
+    return {
+        "requests": count,
+        "status": statuses,
+        "errors": errors,
+        "error_rate": round(errors / count, 4) if count else 0.0,
+        "rate_limited": limited,
+        "rate_limited_rate": round(limited / count, 4) if count else 0.0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / count, 3) if count else 0.0,
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "max": round(latencies[-1], 3) if latencies else 0.0,
+        },
+    }
+
+
+async def _sample_rss(pid: int, peak: List[int], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        rss = await asyncio.to_thread(process_rss, pid)
+        if rss is not None:
+            peak[0] = max(peak[0], rss)
+        try:
+            await asyncio.wait_for(stop.wait(), RSS_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_load(
+    base_url: str,
+    mix: Optional[Dict[str, Dict[str, Any]]] = None,
+    concurrency: int = 8,
+    requests: Optional[int] = 200,
+    duration: Optional[float] = None,
+    api_key: str = "",
+    root: str = ".",
+    timeout: float = 60.0,
+    seed: int = 0,
+    server_pid: Optional[int] = None,
+    transport: Optional[httpx.AsyncBaseTransport] = None,
+) -> Dict[str, Any]:
+    """Drive the mix against ``base_url`` and return the summary."""
+
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    if not requests and not duration:
+        raise ValueError("either requests or duration is required")
+    mix = mix or DEFAULT_MIX
+    names = [name for name, spec in mix.items() if spec.get("weight", 1) > 0]
+    if not names:
+        raise ValueError("request mix has no endpoint with a positive weight")
+    weights = [mix[name].get("weight", 1) for name in names]
+    prepared = {
+        name: (
+            mix[name].get("method", "GET").upper(),
+            mix[name]["path"],
+            {
+                k: str(v).format(root=root)
+                for k, v in (mix[name].get("params") or {}).items()
+            },
+        )
+        for name in names
+    }
+    samples: List[Sample] = []
+    issued = 0
+    started = time.perf_counter()
+
+    def claim() -> bool:
+        nonlocal issued
+        if requests and issued >= requests:
+            return False
+        if duration and time.perf_counter() - started >= duration:
+            return False
+        issued += 1
+        return True
+
+    async def worker(client: httpx.AsyncClient, rng: random.Random) -> None:
+        while claim():
+            name = rng.choices(names, weights)[0]
+            method, path, params = prepared[name]
+            begin = time.perf_counter()
+            try:
+                response = await client.request(method, path, params=params)
+                await response.aread()
+                status = response.status_code
+            except httpx.HTTPError:
+                status = 0
+            samples.append((name, status, time.perf_counter() - begin))
+
+    rss_start = process_rss(server_pid) if server_pid else None
+    peak = [rss_start or 0]
+    stop = asyncio.Event()
+    sampler = (
+        asyncio.ensure_future(_sample_rss(server_pid, peak, stop))
+        if server_pid
+        else None
+    )
+    async with httpx.AsyncClient(
+        base_url=base_url,
+        headers={"X-API-Key": api_key},
+        timeout=timeout,
+        limits=httpx.Limits(
+            max_connections=concurrency, max_keepalive_connections=concurrency
+        ),
+        transport=transport,
+    ) as client:
+        await asyncio.gather(
+            *(worker(client, random.Random(seed + i)) for i in range(concurrency))
+        )
+    elapsed = time.perf_counter() - started
+    stop.set()
+    if sampler is not None:
+        await sampler
+
+    summary = summarize(samples)
+    summary["elapsed"] = round(elapsed, 3)
+    summary["throughput"] = round(len(samples) / elapsed, 2) if elapsed else 0.0
+    summary["concurrency"] = concurrency
+    summary["endpoints"] = {
+        name: summarize([s for s in samples if s[0] == name]) for name in names
+    }
+    if server_pid:
+        summary["rss"] = {
+            "start": rss_start,
+            "peak": peak[0] or None,
+            "end": process_rss(server_pid),
+        }
+    return summary
+
+
+def _free_port(host: str) -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def _merge(base: Dict[str, Any], overrides: Dict[str, Any]) -> Dict[str, Any]:
+    merged = copy.deepcopy(base)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+class LocalServer:
+    """Run ``validate.py serve`` on a free port in a throwaway directory.
+
+    ``overrides`` are merged into ``config`` before it is written, e.g.
+    ``{"rate_limit": {"max_calls": 1000}}``.  When ``root`` is given it is
+    copied into the scratch directory and :attr:`root` points at the copy,
+    so audits never write into the original tree.
+    """
+
+    def __init__(
+        self,
+        config: Dict[str, Any],
+        workers: int = 1,
+        host: str = "127.0.0.1",
+        port: Optional[int] = None,
+        overrides: Optional[Dict[str, Any]] = None,
+        startup_timeout: float = 30.0,
+        root: Optional[str] = None,
+    ) -> None:
+        self.config = _merge(config, overrides or {})
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.startup_timeout = startup_timeout
+        self.api_key = secrets.token_hex(16)
+        self.process: Optional[subprocess.Popen] = None
+        self.workdir: Optional[str] = None
+        self.source_root = root
+        self.root: Optional[str] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def __enter__(self) -> "LocalServer":
+        self.workdir = tempfile.mkdtemp(prefix="auditagent-loadtest-")
+        os.makedirs(os.path.join(self.workdir, "config"))
+        if self.source_root:
+            self.root = os.path.join(self.workdir, "root")
+            shutil.copytree(
+                self.source_root, self.root, symlinks=True, ignore=COPY_IGNORE
+            )
+        with open(
+            os.path.join(self.workdir, "config", "config.yml"), "w", encoding="utf-8"
+        ) as f:
+            yaml.safe_dump(self.config, f, sort_keys=False)
+        self.port = self.port or _free_port(self.host)
+        env = dict(os.environ)
+        env[self.config.get("api", {}).get("api_key_env", "AGENT_API_KEY")] = (
+            self.api_key
+        )
+        self.process = subprocess.Popen(
+            [
+                sys.executable,
+                VALIDATE,
+                "serve",
+                "--host",
+                self.host,
+                "--port",
+                str(self.port),
+                "--workers",
+                str(self.workers),
+            ],
+            cwd=self.workdir,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            self._wait_ready()
+        except Exception:
+            self.__exit__(None, None, None)
+            raise
+        return self
+
+    def _wait_ready(self) -> None:
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(
+                    f"API server exited with status {self.process.returncode}"
+                )
+            try:
+                httpx.get(f"{self.url}/openapi.json", timeout=1.0)
+                return
+            except httpx.HTTPError:
+                time.sleep(0.1)
+        raise RuntimeError(f"API server not ready after {self.startup_timeout:g}s")
+
+    def __exit__(self, *exc: Any) -> None:
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        if self.workdir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
@@ -2,28 +2,42 @@ import os
 import asyncio
 from contextlib import asynccontextmanager
 
-from fastapi import Depends, FastAPI, HTTPException, Header
-from fastapi.responses import FileResponse
-import yaml
+from fastapi import Depends, FastAPI, HTTPException, Header, Query, Request
+from fastapi.responses import FileResponse, PlainTextResponse
 
 from agent.audit_agent import AuditAgent
+from agent.budget import AuditBudget
+from agent.findings_store import FindingsStore
+from utils.config import load_config as load_cached_config
 from utils.logger import get_logger
-from utils.rate_limiter import TokenBucket
+from utils.rate_limiter import SharedTokenBucket
+from utils.shared_state import STATE_ENV, SharedState
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global config, rate_limiter
+    global config, rate_limiter, state
     config = load_config()
+    shared_path = os.environ.get(STATE_ENV)
+    if shared_path:
+        # Prepared and reset once by the parent before workers were forked.
+        state = SharedState(shared_path)
+    else:
+        state = SharedState(config.get("state", {}).get("path", "state/agent.db"))
+        state.reset()
     rl_conf = config.get("rate_limit", {})
-    rate_limiter = TokenBucket(rl_conf.get("max_calls", 5), rl_conf.get("period", 60))
+    rate_limiter = SharedTokenBucket(
+        state, rl_conf.get("max_calls", 5), rl_conf.get("period", 60)
+    )
     yield
+    state.close()
 
 
 app = FastAPI(title="AuditAgent API", lifespan=lifespan)
 logger = get_logger("api")
 config: dict | None = None
-rate_limiter: TokenBucket | None = None
+rate_limiter: SharedTokenBucket | None = None
+state: SharedState | None = None
 
 
 def get_api_key(x_api_key: str = Header(...)) -> str:
@@ -39,20 +53,118 @@ def check_rate_limit() -> None:
 
 
 def load_config() -> dict:
-    with open("config/config.yml", "r", encoding="utf-8") as f:
-        return yaml.safe_load(f)
+    return load_cached_config("config/config.yml")
+
+
+# How often a running audit checks whether its client went away.
+DISCONNECT_POLL = 0.25
+
+
+def audit_budget(
+    deadline: float | None, max_files: int | None, max_bytes: int | None
+) -> AuditBudget:
+    """Per-request limits; callers may only tighten the configured ones."""
+
+    limits = config.get("api", {}).get("limits", {})
+
+    def clamp(requested, configured):
+        if requested is None or configured is None:
+            return configured if requested is None else requested
+        return min(requested, configured)
+
+    return AuditBudget(
+        deadline=clamp(deadline, limits.get("deadline")),
+        max_files=clamp(max_files, limits.get("max_files")),
+        max_bytes=clamp(max_bytes, limits.get("max_bytes")),
+    )
 
 
 @app.post("/audit", dependencies=[Depends(get_api_key), Depends(check_rate_limit)])
-async def run_audit(root: str = "."):
-    agent = AuditAgent(root, config)
-    report = await asyncio.to_thread(agent.run)
-    return {"report": report}
+async def run_audit(
+    request: Request,
+    root: str = ".",
+    deadline: float | None = Query(None, gt=0),
+    max_files: int | None = Query(None, gt=0),
+    max_bytes: int | None = Query(None, gt=0),
+):
+    budget = audit_budget(deadline, max_files, max_bytes)
+    agent = AuditAgent(root, config, budget=budget)
+
+    def run_and_record() -> tuple[str, int]:
+        report = agent.run()
+        with open(report, "r", encoding="utf-8") as f:
+            content = f.read()
+        return report, state.record_audit(agent.root_dir, report, content)
+
+    task = asyncio.ensure_future(asyncio.to_thread(run_and_record))
+    try:
+        # The worker thread stops at its next checkpoint once cancelled.
+        while not (await asyncio.wait({task}, timeout=DISCONNECT_POLL))[0]:
+            if await request.is_disconnected():
+                budget.cancel("client disconnected")
+    except asyncio.CancelledError:
+        budget.cancel("request cancelled")
+        raise
+    report, audit_id = task.result()
+    return {
+        "report": report,
+        "id": audit_id,
+        "run": agent.run_id,
+        "truncated": agent.truncated is not None,
+        "reason": agent.truncated,
+        "usage": budget.usage(),
+    }
+
+
+@app.get("/findings", dependencies=[Depends(get_api_key), Depends(check_rate_limit)])
+async def get_findings(
+    run: int | None = None,
+    role: str | None = None,
+    rule: str | None = None,
+    severity: str | None = None,
+    file: str | None = None,
+    status: str | None = None,
+    base: int | None = None,
+    cursor: int = 0,
+    limit: int = 100,
+) -> dict:
+    path = config.get("findings", {}).get("path")
+    if not path:
+        raise HTTPException(status_code=404, detail="Findings store not configured")
+
+    def query() -> dict:
+        store = FindingsStore(path)
+        try:
+            return store.query(
+                run, role, rule, severity, file, status, base, cursor, limit
+            )
+        finally:
+            store.close()
+
+    try:
+        return await asyncio.to_thread(query)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@app.get(
+    "/audits/{audit_id}",
+    dependencies=[Depends(get_api_key), Depends(check_rate_limit)],
+)
+async def get_audit(audit_id: int) -> dict:
+    audit = await asyncio.to_thread(state.get_audit, audit_id)
+    if audit is None:
+        raise HTTPException(status_code=404, detail="Audit not found")
+    return audit
 
 
 @app.get("/report", dependencies=[Depends(get_api_key), Depends(check_rate_limit)])
-async def get_report() -> FileResponse:
+async def get_report():
     path = os.path.join(os.getcwd(), "validation_report.md")
-    if not os.path.isfile(path):
+    if os.path.isfile(path):
+        return FileResponse(path)
+    # Any worker can serve the latest report recorded by any other worker.
+    latest = await asyncio.to_thread(state.latest_audit)
+    if latest is None:
         raise HTTPException(status_code=404, detail="Report not found")
-    return FileResponse(path)
+    return PlainTextResponse(latest["report"], media_type="text/markdown")
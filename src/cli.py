@@ -1,47 +1,366 @@
 import argparse
 import os
-import yaml
 
-from agent.audit_agent import AuditAgent
-from utils.logger import get_logger
+# Subcommand handlers import their dependencies lazily so that frequent
+# invocations such as ``validate.py run`` from pre-commit hooks do not pay
+# for FastAPI, uvicorn or httpx.
 
 
 def load_config(path: str) -> dict:
-    with open(path, "r", encoding="utf-8") as f:
-        return yaml.safe_load(f)
+    from utils.config import load_config as load_cached
+
+    return load_cached(path)
+
+
+def cmd_run(args: argparse.Namespace, config: dict, logger) -> None:
+    from agent.audit_agent import AuditAgent
+
+    root = os.path.abspath(os.path.expanduser(args.root))
+    if not os.path.isdir(root):
+        logger.error("Root path not found", extra={"root": root})
+        raise SystemExit(1)
+    agent = AuditAgent(root, config)
+    report = args.report
+    if report:
+        report = os.path.abspath(os.path.expanduser(report))
+    report_path = agent.run(report)
+    logger.info("Audit complete", extra={"report": report_path})
+
+
+def cmd_serve(args: argparse.Namespace, config: dict, logger) -> None:
+    import uvicorn
+
+    from utils.shared_state import STATE_ENV, SharedState
+
+    port = args.port or 8000
+    workers = args.workers or config.get("api", {}).get("workers", 1)
+    # Reset shared state once here; forked workers attach to the same file.
+    state_path = config.get("state", {}).get("path", "state/agent.db")
+    state = SharedState(state_path)
+    state.reset()
+    state.close()
+    os.environ[STATE_ENV] = state.path
+    logger.info(
+        "Starting API server",
+        extra={"host": args.host, "port": port, "workers": workers},
+    )
+    uvicorn.run("api.server:app", host=args.host, port=port, workers=workers)
+
+
+def cmd_sync(args: argparse.Namespace, config: dict, logger) -> None:
+    import asyncio
+
+    import httpx
+
+    from pdns.zone_sync import desired_zones_from_vars, sync_zones
+
+    sync_conf = config.get("sync", {})
+    documents = []
+    for path in args.vars or sync_conf.get("vars_files", []):
+        documents.append(load_config(path))
+    api_key = os.environ.get(sync_conf.get("api_key_env", "PDNS_API_KEY"), "")
+    try:
+        summary = asyncio.run(
+            sync_zones(
+                desired_zones_from_vars(documents, sync_conf.get("default_ttl", 3600)),
+                args.api_url
+                or sync_conf.get("api_url", "http://127.0.0.1:8081/api/v1"),
+                api_key,
+                server_id=sync_conf.get("server_id", "localhost"),
+                concurrency=sync_conf.get("concurrency", 8),
+                batch_size=sync_conf.get("batch_size", 500),
+                prune=args.prune,
+                dry_run=args.dry_run,
+            )
+        )
+    except httpx.HTTPError as exc:
+        logger.error("Sync failed", extra={"error": str(exc)})
+        raise SystemExit(1)
+    if summary["errors"]:
+        logger.error("Sync finished with errors", extra=summary)
+        raise SystemExit(1)
+    logger.info("Sync complete", extra=summary)
+
+
+def cmd_export(args: argparse.Namespace, config: dict, logger) -> None:
+    import asyncio
+
+    from pdns.exporter import run_exporter
+
+    export_conf = config.get("exporter", {})
+    port = args.port or export_conf.get("port", 9121)
+    logger.info("Starting stats exporter", extra={"host": args.host, "port": port})
+    asyncio.run(run_exporter(export_conf, args.host, port))
+
+
+def cmd_query(args: argparse.Namespace, config: dict, logger) -> None:
+    import json
+
+    from agent.findings_store import FindingsStore
+
+    store = FindingsStore(config.get("findings", {}).get("path", "state/findings.db"))
+    try:
+        page = store.query(
+            run_id=args.run,
+            role=args.role,
+            rule=args.rule,
+            severity=args.severity,
+            file=args.file,
+            status=args.status,
+            base_run_id=args.base,
+            cursor=args.cursor,
+            limit=args.limit,
+        )
+    finally:
+        store.close()
+    print(json.dumps(page, indent=2))
+
+
+def cmd_targets(args: argparse.Namespace, config: dict, logger) -> None:
+    from pdns.file_sd import generate, load_inventory
+
+    sd_conf = config.get("file_sd", {})
+    summary = generate(
+        load_inventory(args.inventory or sd_conf.get("inventory", [])),
+        args.out or sd_conf.get("output_dir", "file_sd"),
+        jobs=sd_conf.get("jobs"),
+        shards=args.shards or sd_conf.get("shards", 4),
+        replicas=args.replicas or sd_conf.get("replicas", 1),
+    )
+    logger.info("Targets generated", extra=summary)
+
+
+def cmd_loadtest(args: argparse.Namespace, config: dict, logger) -> None:
+    import asyncio
+    import json
+
+    from api.loadtest import DEFAULT_MIX, LocalServer, run_load
+
+    lt_conf = config.get("loadtest", {})
+    mix = dict(lt_conf.get("mix") or DEFAULT_MIX)
+    for item in args.mix or []:
+        name, _, weight = item.partition("=")
+        if name not in mix:
+            logger.error("Unknown endpoint in mix", extra={"endpoint": name})
+            raise SystemExit(1)
+        mix[name] = {**mix[name], "weight": float(weight or 1)}
+    overrides = dict(lt_conf.get("overrides") or {})
+    if args.rate_limit is not None:
+        overrides["rate_limit"] = {
+            **overrides.get("rate_limit", {}),
+            "max_calls": args.rate_limit,
+        }
+
+    root = os.path.abspath(os.path.expanduser(args.root))
+
+    def load(url: str, api_key: str, root: str, pid=None) -> dict:
+        return asyncio.run(
+            run_load(
+                url,
+                mix,
+                concurrency=args.concurrency or lt_conf.get("concurrency", 8),
+                requests=args.requests or lt_conf.get("requests", 200),
+                duration=args.duration or lt_conf.get("duration"),
+                api_key=api_key,
+                root=root,
+                server_pid=pid,
+            )
+        )
+
+    if args.url:
+        api_key_env = config.get("api", {}).get("api_key_env", "AGENT_API_KEY")
+        result = load(args.url, os.environ.get(api_key_env, ""), root)
+    else:
+        workers = args.workers or config.get("api", {}).get("workers", 1)
+        # The local server audits a scratch copy, never the tree itself.
+        with LocalServer(
+            config, workers=workers, overrides=overrides, root=root
+        ) as server:
+            result = load(server.url, server.api_key, server.root, server.process.pid)
+        result["workers"] = workers
+        result["overrides"] = overrides
+    out = args.out or lt_conf.get("output", "loadtest.json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    logger.info(
+        "Load test complete",
+        extra={
+            "output": out,
+            "throughput": result["throughput"],
+            "p99_ms": result["latency_ms"]["p99"],
+            "rate_limited_rate": result["rate_limited_rate"],
+        },
+    )
+
+
+def cmd_simulate(args: argparse.Namespace, config: dict, logger) -> None:
+    import json
+
+    from pdns.dnsdist_sim import parse_config, read_queries, render_config, simulate
+    from pdns.file_sd import load_inventory
+
+    sim_conf = config.get("dnsdist_sim", {})
+    if not args.queries:
+        logger.error("No query log given", extra={"hint": "--queries log.csv"})
+        raise SystemExit(1)
+    if args.dnsdist_conf:
+        with open(args.dnsdist_conf, "r", encoding="utf-8") as f:
+            text = f.read()
+    else:
+        inventory = load_inventory(
+            args.inventory
+            or sim_conf.get("inventory")
+            or config.get("file_sd", {}).get("inventory", [])
+        )
+        text = render_config(
+            sim_conf.get("template", "roles/dnsdist/templates/dnsdist.conf.j2"),
+            inventory,
+            sim_conf.get("vars"),
+        )
+    dnsdist = parse_config(text)
+    dnsdist.override_limits(args.max_qps_per_ip, args.max_qps_total)
+    result = simulate(
+        dnsdist,
+        read_queries(args.queries),
+        latency_ms=sim_conf.get("latency_ms"),
+        default_latency_ms=sim_conf.get("default_latency_ms", 1.0),
+        top_clients=sim_conf.get("top_clients", 20),
+    )
+    if not args.out:
+        print(json.dumps(result, indent=2))
+        return
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    logger.info(
+        "Simulation complete",
+        extra={
+            "output": args.out,
+            "queries": result["queries"],
+            "dropped": result["dropped"],
+            "no_backend": result["no_backend"],
+        },
+    )
+
+
+COMMANDS = {
+    "run": cmd_run,
+    "serve": cmd_serve,
+    "sync": cmd_sync,
+    "export": cmd_export,
+    "query": cmd_query,
+    "targets": cmd_targets,
+    "loadtest": cmd_loadtest,
+    "simulate": cmd_simulate,
+}
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Audit Ansible Collection")
-    parser.add_argument("command", choices=["run", "serve"], help="Command to execute")
+    parser.add_argument("command", choices=list(COMMANDS), help="Command to execute")
     parser.add_argument("--root", default=".", help="Root directory to scan")
     parser.add_argument("--config", default="config/config.yml", help="Config file")
     parser.add_argument("--host", default="0.0.0.0", help="API host")
-    parser.add_argument("--port", type=int, default=8000, help="API port")
+    parser.add_argument("--port", type=int, default=None, help="API port")
+    parser.add_argument(
+        "--workers", type=int, default=None, help="API worker processes"
+    )
     parser.add_argument(
         "--report", default=None, help="Path to output validation report"
     )
+    parser.add_argument(
+        "--vars",
+        action="append",
+        default=None,
+        help="Vars file with zone definitions (repeatable)",
+    )
+    parser.add_argument("--api-url", default=None, help="PowerDNS API base URL")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Compute the diff without applying it"
+    )
+    parser.add_argument(
+        "--prune", action="store_true", help="Delete RRsets missing from vars"
+    )
+    targets = parser.add_argument_group("targets options")
+    targets.add_argument(
+        "--inventory",
+        action="append",
+        default=None,
+        help="Ansible inventory file (repeatable)",
+    )
+    targets.add_argument(
+        "--out",
+        default=None,
+        help="file_sd directory (targets) or results file (loadtest, simulate)",
+    )
+    targets.add_argument("--shards", type=int, default=None, help="Files per job")
+    targets.add_argument(
+        "--replicas", type=int, default=None, help="Prometheus replicas (hashmod)"
+    )
+    loadtest = parser.add_argument_group("loadtest options")
+    loadtest.add_argument(
+        "--url", default=None, help="Test a running API instead of a local one"
+    )
+    loadtest.add_argument(
+        "--concurrency", type=int, default=None, help="Requests in flight"
+    )
+    loadtest.add_argument(
+        "--requests", type=int, default=None, help="Total requests to send"
+    )
+    loadtest.add_argument(
+        "--duration", type=float, default=None, help="Stop after this many seconds"
+    )
+    loadtest.add_argument(
+        "--mix",
+        action="append",
+        default=None,
+        help="Endpoint weight, e.g. report=4 (repeatable)",
+    )
+    loadtest.add_argument(
+        "--rate-limit",
+        type=int,
+        default=None,
+        help="rate_limit.max_calls for the local server",
+    )
+    simulate = parser.add_argument_group("simulate options")
+    simulate.add_argument(
+        "--queries", default=None, help="Query log to replay (CSV or dnstap)"
+    )
+    simulate.add_argument(
+        "--dnsdist-conf",
+        default=None,
+        help="Rendered dnsdist.conf (default: render the role template)",
+    )
+    simulate.add_argument(
+        "--max-qps-per-ip",
+        type=float,
+        default=None,
+        help="Override MaxQPSIPRule rates",
+    )
+    simulate.add_argument(
+        "--max-qps-total", type=float, default=None, help="Override MaxQPSRule rates"
+    )
+    query = parser.add_argument_group("query options")
+    query.add_argument("--run", type=int, default=None, help="Run id (default: latest)")
+    query.add_argument("--role", default=None, help="Filter by role")
+    query.add_argument("--rule", default=None, help="Filter by rule")
+    query.add_argument("--severity", default=None, help="Filter by severity")
+    query.add_argument("--file", default=None, help="Filter by file path prefix")
+    query.add_argument(
+        "--status",
+        choices=["new", "fixed", "unchanged"],
+        default=None,
+        help="Diff against the base run",
+    )
+    query.add_argument("--base", type=int, default=None, help="Base run for --status")
+    query.add_argument("--cursor", type=int, default=0, help="Pagination cursor")
+    query.add_argument("--limit", type=int, default=100, help="Page size")
     args = parser.parse_args()
 
+    from utils.logger import get_logger
+
     logger = get_logger("CLI")
     config = load_config(args.config)
-
-    if args.command == "run":
-        root = os.path.abspath(os.path.expanduser(args.root))
-        if not os.path.isdir(root):
-            logger.error("Root path not found", extra={"root": root})
-            raise SystemExit(1)
-        agent = AuditAgent(root, config)
-        report = args.report
-        if report:
-            report = os.path.abspath(os.path.expanduser(report))
-        report_path = agent.run(report)
-        logger.info("Audit complete", extra={"report": report_path})
-    elif args.command == "serve":
-        import uvicorn
-
-        logger.info("Starting API server", extra={"host": args.host, "port": args.port})
-        uvicorn.run("api.server:app", host=args.host, port=args.port)
+    COMMANDS[args.command](args, config, logger)
 
 
 if __name__ == "__main__":
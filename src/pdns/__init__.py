@@ -0,0 +1 @@
+"""PowerDNS API tooling used alongside the Ansible roles."""
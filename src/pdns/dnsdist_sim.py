@@ -0,0 +1,876 @@
+"""Replay recorded DNS queries through a rendered dnsdist configuration.
+
+The rendered ``dnsdist.conf`` is scanned for top-level ``newServer``,
+``setServerPolicy``/``setServerPolicyLua``, ``addAction`` and
+``addPoolRule`` calls.  Rules keep dnsdist's semantics: they run in the
+order they were added, ``PoolAction``, ``DropAction`` and other answering
+actions stop processing, and ``MaxQPSIPRule``/``MaxQPSRule`` are token
+buckets refilled at ``qps`` per second up to ``burst``.
+
+Queries come from a CSV log (``time,client,qname``) or a dnstap Frame
+Streams file and are processed in columnar batches.  Static selectors
+(suffix, qname, regex, ``AllRule``) only depend on the query name, so each
+distinct name is compiled once into the short list of rules it can reach;
+per query only the rate limiters and the backend choice are evaluated.
+Backends answer after a fixed latency, which drives ``leastOutstanding``
+and latency-aware Lua policies.
+"""
+
+from __future__ import annotations
+
+import bisect
+import csv
+import ipaddress
+import os
+import random
+import re
+import time
+import zlib
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import jinja2
+import yaml
+
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+BATCH_SIZE = 65536
+# Distinct query names whose compiled rule plan is kept; random-subdomain
+# floods would otherwise grow the table without bound.
+MAX_PLANS = 1_000_000
+
+Batch = Tuple[List[float], List[str], List[str]]
+
+_TOKEN = re.compile(
+    r"""
+    (?P<comment>--[^\n]*)
+    |(?P<string>'(?:\\.|[^'\\\n])*'|"(?:\\.|[^"\\\n])*")
+    |(?P<number>\d+(?:\.\d+)?)
+    |(?P<name>[A-Za-z_]\w*)
+    |(?P<punct>[(){},=])
+    |(?P<other>\S)
+    """,
+    re.X,
+)
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r"}
+_OPENERS = {"function", "if", "do", "repeat"}
+_CLOSERS = {"end", "until"}
+_CALLS = {
+    "newServer",
+    "setServerPolicy",
+    "setServerPolicyLua",
+    "addAction",
+    "addPoolRule",
+}
+
+BUILTIN_POLICIES = {
+    "leastOutstanding",
+    "firstAvailable",
+    "roundrobin",
+    "wrandom",
+    "whashed",
+    "chashed",
+}
+TERMINAL_ACTIONS = {
+    "AllowAction",
+    "RCodeAction",
+    "ERCodeAction",
+    "SpoofAction",
+    "SpoofCNAMEAction",
+    "SpoofRawAction",
+    "TCAction",
+}
+NONTERMINAL_ACTIONS = {
+    "LogAction",
+    "LuaAction",
+    "NoneAction",
+    "DelayAction",
+    "SetTagAction",
+    "DnstapLogAction",
+    "RemoteLogAction",
+}
+DYNAMIC = ("qps_ip", "qps")
+
+
+@dataclass
+class _Call:
+    name: str
+    args: List[Any]
+
+
+@dataclass
+class _Ref:
+    name: str
+
+
+@dataclass
+class Backend:
+    name: str
+    address: str
+    pool: str = ""
+    weight: int = 1
+    order: int = 1
+
+
+@dataclass
+class Rule:
+    index: int
+    line: int
+    source: str
+    kind: str
+    action: str
+    pool: Optional[str] = None
+    stop: bool = True
+    params: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def terminal(self) -> bool:
+        return self.stop and self.action in ("drop", "pool", "answer")
+
+
+@dataclass
+class DnsdistConfig:
+    backends: List[Backend] = field(default_factory=list)
+    rules: List[Rule] = field(default_factory=list)
+    policies: List[str] = field(default_factory=list)
+    functions: Dict[str, str] = field(default_factory=dict)
+    notes: List[str] = field(default_factory=list)
+
+    @property
+    def policy(self) -> str:
+        """The last policy set wins, as in dnsdist."""
+
+        return self.policies[-1] if self.policies else "leastOutstanding"
+
+    def shadowed(self) -> List[int]:
+        """Indexes of rules after an unconditional stopping rule."""
+
+        for rule in self.rules:
+            if rule.kind == "all" and rule.terminal:
+                return [r.index for r in self.rules if r.index > rule.index]
+        return []
+
+    def override_limits(
+        self, per_ip: Optional[float] = None, total: Optional[float] = None
+    ) -> None:
+        """Replace ``MaxQPSIPRule``/``MaxQPSRule`` rates (and their bursts)."""
+
+        for rule in self.rules:
+            qps = per_ip if rule.kind == "qps_ip" else total
+            if rule.kind in DYNAMIC and qps is not None:
+                rule.params["qps"] = rule.params["burst"] = float(qps)
+
+
+# -- Lua parsing ---------------------------------------------------------
+
+
+def _tokenize(text: str) -> List[Tuple[str, str, int]]:
+    tokens = []
+    for match in _TOKEN.finditer(text):
+        kind = match.lastgroup
+        if kind != "comment":
+            tokens.append((kind, match.group(), match.start()))
+    return tokens
+
+
+def _unquote(literal: str) -> str:
+    return re.sub(
+        r"\\(.)", lambda m: _ESCAPES.get(m.group(1), m.group(1)), literal[1:-1]
+    )
+
+
+def _skip(tokens: List[Tuple[str, str, int]], i: int, stops: str) -> int:
+    """Advance past the rest of an expression to ``,`` or a closing bracket."""
+
+    depth = 0
+    while i < len(tokens):
+        kind, value, _ = tokens[i]
+        if kind == "punct":
+            if depth == 0 and value in stops:
+                return i
+            if value in "({":
+                depth += 1
+            elif value in ")}":
+                depth -= 1
+        i += 1
+    return i
+
+
+def _value(tokens: List[Tuple[str, str, int]], i: int) -> Tuple[Any, int]:
+    kind, value, _ = tokens[i]
+    if kind == "string":
+        return _unquote(value), i + 1
+    if kind == "number":
+        return (float(value) if "." in value else int(value)), i + 1
+    if kind == "name":
+        if value in ("true", "false"):
+            return value == "true", i + 1
+        if value == "nil":
+            return None, i + 1
+        if i + 1 < len(tokens) and tokens[i + 1][1] == "(":
+            args, i = _sequence(tokens, i + 2, ")")
+            return _Call(value, args), i
+        return _Ref(value), i + 1
+    if value == "{":
+        items, i = _sequence(tokens, i + 1, "}")
+        keyed = {k: v for k, v in items if k is not None} if items else {}
+        if keyed:
+            return keyed, i
+        return [v for _, v in items], i
+    return None, i + 1
+
+
+def _sequence(
+    tokens: List[Tuple[str, str, int]], i: int, close: str
+) -> Tuple[List[Any], int]:
+    """Parse call arguments (``close == ")"``) or table fields up to ``close``."""
+
+    items: List[Any] = []
+    while i < len(tokens) and tokens[i][1] != close:
+        key = None
+        if (
+            close == "}"
+            and tokens[i][0] == "name"
+            and i + 1 < len(tokens)
+            and tokens[i + 1][1] == "="
+        ):
+            key, i = tokens[i][1], i + 2
+        value, i = _value(tokens, i)
+        items.append((key, value) if close == "}" else value)
+        i = _skip(tokens, i, "," + close)
+        if i < len(tokens) and tokens[i][1] == ",":
+            i += 1
+    return items, i + 1
+
+
+def _selector(value: Any) -> Tuple[str, Dict[str, Any]]:
+    if isinstance(value, str):
+        value = [value]
+    if isinstance(value, list) and all(isinstance(v, str) for v in value):
+        return "suffix", {"names": {v.lower().rstrip(".") for v in value}}
+    if not isinstance(value, _Call):
+        return "unsupported", {}
+    args = value.args
+    if value.name == "AllRule":
+        return "all", {}
+    if value.name == "QNameRule" and args and isinstance(args[0], str):
+        return "qname", {"name": args[0].lower().rstrip(".")}
+    if value.name == "RegexRule" and args and isinstance(args[0], str):
+        return "regex", {"regex": re.compile(args[0], re.I)}
+    if value.name == "MaxQPSIPRule" and args:
+        qps = float(args[0])
+        return "qps_ip", {
+            "qps": qps,
+            "v4": int(args[1]) if len(args) > 1 else 32,
+            "v6": int(args[2]) if len(args) > 2 else 64,
+            "burst": float(args[3]) if len(args) > 3 else qps,
+        }
+    if value.name == "MaxQPSRule" and args:
+        qps = float(args[0])
+        return "qps", {
+            "qps": qps,
+            "burst": float(args[1]) if len(args) > 1 else qps,
+        }
+    return "unsupported", {}
+
+
+def _action(value: Any) -> Tuple[str, Optional[str], bool]:
+    if not isinstance(value, _Call):
+        return "unsupported", None, False
+    if value.name == "DropAction":
+        return "drop", None, True
+    if value.name == "PoolAction" and value.args:
+        stop = value.args[1] if len(value.args) > 1 else True
+        return "pool", str(value.args[0]), bool(stop)
+    if value.name in TERMINAL_ACTIONS:
+        return "answer", None, True
+    if value.name in NONTERMINAL_ACTIONS:
+        return "continue", None, False
+    return "unsupported", None, False
+
+
+def parse_config(text: str) -> DnsdistConfig:
+    """Extract backends, policies and the rule chain from ``dnsdist.conf``."""
+
+    config = DnsdistConfig()
+    tokens = _tokenize(text)
+    newlines = [m.start() for m in re.finditer("\n", text)]
+    depth = 0
+    function: Optional[Tuple[str, int]] = None
+    i = 0
+    while i < len(tokens):
+        kind, value, pos = tokens[i]
+        if kind != "name":
+            i += 1
+            continue
+        if value in _OPENERS:
+            if value == "function" and depth == 0 and tokens[i + 1][0] == "name":
+                function = (tokens[i + 1][1], pos)
+            depth += 1
+        elif value in _CLOSERS:
+            depth -= 1
+            if depth == 0 and function is not None:
+                config.functions[function[0]] = text[function[1] : pos + 3]
+                function = None
+        elif depth == 0 and value in _CALLS and tokens[i + 1][1] == "(":
+            call, end = _value(tokens, i)
+            stop = tokens[end - 1][2] + 1 if end - 1 < len(tokens) else len(text)
+            source = " ".join(text[pos:stop].split())
+            _apply(config, call, bisect.bisect_right(newlines, pos) + 1, source)
+            i = end
+            continue
+        i += 1
+    return config
+
+
+def _apply(config: DnsdistConfig, call: _Call, line: int, source: str) -> None:
+    args = call.args
+    if call.name == "newServer" and args:
+        spec = args[0] if isinstance(args[0], dict) else {"address": args[0]}
+        config.backends.append(
+            Backend(
+                name=str(spec.get("name", f"backend-{len(config.backends) + 1}")),
+                address=str(spec.get("address", "")),
+                pool=str(spec.get("pool", "")),
+                weight=int(spec.get("weight", 1)),
+                order=int(spec.get("order", 1)),
+            )
+        )
+    elif call.name in ("setServerPolicy", "setServerPolicyLua") and args:
+        policy = args[-1]
+        config.policies.append(policy.name if isinstance(policy, _Ref) else policy)
+    elif call.name in ("addAction", "addPoolRule") and len(args) >= 2:
+        kind, params = _selector(args[0])
+        if call.name == "addPoolRule":
+            action, pool, stop = "pool", str(args[1]), True
+        else:
+            action, pool, stop = _action(args[1])
+        if kind == "unsupported" or action == "unsupported":
+            config.notes.append(f"line {line}: not simulated: {source}")
+        config.rules.append(
+            Rule(len(config.rules), line, source, kind, action, pool, stop, params)
+        )
+
+
+def render_config(
+    template: str, inventory: Any, variables: Optional[Dict[str, Any]] = None
+) -> str:
+    """Render ``dnsdist.conf.j2`` with role defaults and inventory groups.
+
+    ``inventory`` is a :class:`pdns.file_sd.Inventory`; each host's
+    ``ansible_default_ipv4.address`` is its ``ansible_host``.
+    """
+
+    role_dir = os.path.dirname(os.path.dirname(os.path.abspath(template)))
+    layers = []
+    for layer in ("defaults", "vars"):
+        path = os.path.join(role_dir, layer, "main.yml")
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as f:
+                layers.append(yaml.load(f, Loader=YamlLoader) or {})
+        else:
+            layers.append({})
+    # Ansible precedence: role defaults < inventory vars < role vars < extra vars.
+    context: Dict[str, Any] = {
+        **layers[0],
+        **inventory.group_vars.get("all", {}),
+        **layers[1],
+        **(variables or {}),
+    }
+    context["groups"] = inventory.groups
+    context["hostvars"] = {
+        host: {
+            **values,
+            "inventory_hostname": host,
+            "ansible_default_ipv4": {"address": values.get("ansible_host", host)},
+        }
+        for host, values in inventory.hostvars.items()
+    }
+    env = jinja2.Environment(
+        loader=jinja2.FileSystemLoader(os.path.dirname(os.path.abspath(template))),
+        undefined=jinja2.ChainableUndefined,
+        trim_blocks=True,
+    )
+    return env.get_template(os.path.basename(template)).render(context)
+
+
+# -- query logs ----------------------------------------------------------
+
+
+def _timestamp(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def read_csv(path: str, batch_size: int = BATCH_SIZE) -> Iterator[Batch]:
+    """Yield ``(times, clients, qnames)`` columns from a CSV query log.
+
+    Columns are ``time,client,qname`` unless a header names them (``time``
+    or ``timestamp``, ``client`` or ``client_ip``, ``qname`` or ``name``).
+    Times are epoch seconds or ISO 8601.
+    """
+
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        first = next(reader, None)
+        if first is None:
+            return
+        columns = (0, 1, 2)
+        pending = [first]
+        try:
+            _timestamp(first[0])
+        except (ValueError, IndexError):
+            header = [h.strip().lower() for h in first]
+
+            def find(*names: str) -> int:
+                for name in names:
+                    if name in header:
+                        return header.index(name)
+                raise ValueError(f"{path}: CSV header has no {names[0]} column")
+
+            columns = (
+                find("time", "timestamp"),
+                find("client", "client_ip"),
+                find("qname", "name"),
+            )
+            pending = []
+        t_col, c_col, q_col = columns
+        times: List[float] = []
+        clients: List[str] = []
+        qnames: List[str] = []
+        for rows in (pending, reader):
+            for row in rows:
+                if len(row) <= max(columns):
+                    continue
+                times.append(_timestamp(row[t_col]))
+                clients.append(row[c_col])
+                qnames.append(row[q_col].lower().rstrip("."))
+                if len(times) >= batch_size:
+                    yield times, clients, qnames
+                    times, clients, qnames = [], [], []
+        if times:
+            yield times, clients, qnames
+
+
+def _varint(buf: bytes, pos: int) -> Tuple[int, int]:
+    result = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _fields(buf: bytes) -> Iterator[Tuple[int, Any]]:
+    """Decode one protobuf message into ``(field, value)`` pairs."""
+
+    pos = 0
+    while pos < len(buf):
+        key, pos = _varint(buf, pos)
+        wire = key & 7
+        if wire == 0:
+            value, pos = _varint(buf, pos)
+        elif wire == 1:
+            value, pos = buf[pos : pos + 8], pos + 8
+        elif wire == 2:
+            length, pos = _varint(buf, pos)
+            value, pos = buf[pos : pos + length], pos + length
+        elif wire == 5:
+            value, pos = buf[pos : pos + 4], pos + 4
+        else:
+            raise ValueError(f"unsupported protobuf wire type {wire}")
+        yield key >> 3, value
+
+
+def _wire_qname(message: bytes) -> Optional[str]:
+    labels = []
+    pos = 12
+    while pos < len(message):
+        length = message[pos]
+        if length == 0:
+            return ".".join(labels).lower()
+        if length & 0xC0:
+            return None
+        labels.append(message[pos + 1 : pos + 1 + length].decode("ascii", "replace"))
+        pos += 1 + length
+    return None
+
+
+def read_dnstap(path: str, batch_size: int = BATCH_SIZE) -> Iterator[Batch]:
+    """Yield query columns from a dnstap Frame Streams file.
+
+    Only query messages (odd ``Message.type``) that carry the query time,
+    client address and wire-format query are used.
+    """
+
+    times: List[float] = []
+    clients: List[str] = []
+    qnames: List[str] = []
+    with open(path, "rb") as f:
+        while True:
+            head = f.read(4)
+            if len(head) < 4:
+                break
+            length = int.from_bytes(head, "big")
+            if length == 0:
+                # Control frame (START/STOP): skip its payload.
+                f.read(int.from_bytes(f.read(4), "big"))
+                continue
+            frame = f.read(length)
+            message = next((v for n, v in _fields(frame) if n == 14), None)
+            if message is None:
+                continue
+            fields = dict(_fields(message))
+            if not fields.get(1, 0) % 2 or 8 not in fields or 10 not in fields:
+                continue
+            qname = _wire_qname(fields[10])
+            if qname is None or 4 not in fields:
+                continue
+            nsec = int.from_bytes(fields.get(9, b"\0\0\0\0"), "little")
+            times.append(fields[8] + nsec / 1e9)
+            clients.append(str(ipaddress.ip_address(fields[4])))
+            qnames.append(qname)
+            if len(times) >= batch_size:
+                yield times, clients, qnames
+                times, clients, qnames = [], [], []
+    if times:
+        yield times, clients, qnames
+
+
+def read_queries(path: str, batch_size: int = BATCH_SIZE) -> Iterator[Batch]:
+    """Pick the reader from the file: Frame Streams start with a zero escape."""
+
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    if magic == b"\0\0\0\0":
+        return read_dnstap(path, batch_size)
+    return read_csv(path, batch_size)
+
+
+# -- simulation ----------------------------------------------------------
+
+
+class Simulator:
+    """Route query batches through a :class:`DnsdistConfig` and tally load."""
+
+    def __init__(
+        self,
+        config: DnsdistConfig,
+        latency_ms: Optional[Dict[str, float]] = None,
+        default_latency_ms: float = 1.0,
+        top_clients: int = 20,
+        seed: int = 0,
+    ) -> None:
+        self.config = config
+        self.top_clients = top_clients
+        self.rng = random.Random(seed)
+        self.notes = list(config.notes)
+        shadowed = config.shadowed()
+        if shadowed:
+            first = config.rules[shadowed[0] - 1]
+            self.notes.append(
+                f"line {first.line}: {first.source} stops every query; "
+                f"the {len(shadowed)} rules after it never run"
+            )
+        latency_ms = latency_ms or {}
+        self.pools: Dict[str, List[int]] = {}
+        self.latency: List[float] = []
+        for i, backend in enumerate(config.backends):
+            self.pools.setdefault(backend.pool, []).append(i)
+            ms = latency_ms.get(backend.name, latency_ms.get(backend.pool))
+            self.latency.append((default_latency_ms if ms is None else ms) / 1000.0)
+        self.policy, self.factor = self._policy(config.policy)
+        self.rules = config.rules
+        self.plans: Dict[str, Tuple[int, ...]] = {}
+        self.buckets: List[Dict[str, List[float]]] = [{} for _ in self.rules]
+        self.masks: List[Dict[str, str]] = [{} for _ in self.rules]
+        self.rule_hits = [0] * len(self.rules)
+        self.rule_drops = [0] * len(self.rules)
+        self.outstanding = [deque() for _ in config.backends]
+        self.backend_queries = [0] * len(config.backends)
+        self.backend_peak_outstanding = [0] * len(config.backends)
+        self.backend_second = [[-1, 0, 0] for _ in config.backends]
+        self.pool_queries: Dict[str, int] = {}
+        self.no_backend: Dict[str, int] = {}
+        self.rr: Dict[str, int] = {}
+        self.clients: Dict[str, List[int]] = {}
+        self.client_rules: Dict[str, Dict[int, int]] = {}
+        self.queries = self.dropped = self.answered = self.out_of_order = 0
+        self.first: Optional[float] = None
+        self.last = float("-inf")
+        self.elapsed = 0.0
+
+    def _policy(self, name: str) -> Tuple[str, float]:
+        if name in BUILTIN_POLICIES:
+            return name, 0.0
+        body = self.config.functions.get(name, "")
+        if "getLatency" in body and "getOutstanding" in body:
+            # e.g. ``score = latency + (outstanding * 10)``
+            match = re.search(r"outstanding\s*\*\s*(\d+(?:\.\d+)?)", body, re.I)
+            return "latencyAware", float(match.group(1)) if match else 1.0
+        self.notes.append(f"policy {name!r} not modelled; using leastOutstanding")
+        return "leastOutstanding", 0.0
+
+    def _plan(self, qname: str) -> Tuple[int, ...]:
+        """Rules a query for ``qname`` can reach, in order."""
+
+        plan = []
+        for rule in self.rules:
+            kind = rule.kind
+            if kind in DYNAMIC:
+                plan.append(rule.index)
+                continue
+            if kind == "all":
+                matched = True
+            elif kind == "suffix":
+                names = rule.params["names"]
+                matched = qname in names or any(qname.endswith("." + n) for n in names)
+            elif kind == "qname":
+                matched = qname == rule.params["name"]
+            elif kind == "regex":
+                matched = rule.params["regex"].search(qname) is not None
+            else:
+                matched = False
+            if matched and rule.action != "unsupported":
+                plan.append(rule.index)
+                if rule.terminal:
+                    break
+        if len(self.plans) >= MAX_PLANS:
+            self.plans.clear()
+        result = self.plans[qname] = tuple(plan)
+        return result
+
+    def _client_key(self, index: int, client: str) -> str:
+        params = self.rules[index].params
+        if params["v4"] == 32 and ":" not in client:
+            return client
+        try:
+            address = ipaddress.ip_address(client)
+        except ValueError:
+            return client
+        bits = params["v4"] if address.version == 4 else params["v6"]
+        network = ipaddress.ip_network(f"{address}/{bits}", strict=False)
+        key = self.masks[index][client] = str(network)
+        return key
+
+    def _limited(self, index: int, key: str, now: float) -> bool:
+        """Token bucket check; ``True`` when the query exceeds the rate."""
+
+        params = self.rules[index].params
+        buckets = self.buckets[index]
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = [params["burst"], now]
+        else:
+            delta = now - bucket[1]
+            if delta > 0:
+                tokens = bucket[0] + params["qps"] * delta
+                bucket[0] = params["burst"] if tokens > params["burst"] else tokens
+                bucket[1] = now
+        if bucket[0] >= 1.0:
+            bucket[0] -= 1.0
+            return False
+        return True
+
+    def _route(self, pool: str, qname: str, now: float) -> None:
+        self.pool_queries[pool] = self.pool_queries.get(pool, 0) + 1
+        members = self.pools.get(pool)
+        if not members:
+            self.no_backend[pool] = self.no_backend.get(pool, 0) + 1
+            return
+        outstanding = self.outstanding
+        for i in members:
+            pending = outstanding[i]
+            while pending and pending[0] <= now:
+                pending.popleft()
+        policy = self.policy
+        backends = self.config.backends
+        if len(members) == 1 or policy == "firstAvailable":
+            chosen = members[0]
+        elif policy == "leastOutstanding":
+            chosen = min(
+                members,
+                key=lambda i: (len(outstanding[i]), backends[i].order, self.latency[i]),
+            )
+        elif policy == "latencyAware":
+            chosen = min(
+                members,
+                key=lambda i: self.latency[i] * 1e6 + len(outstanding[i]) * self.factor,
+            )
+        elif policy == "roundrobin":
+            turn = self.rr.get(pool, 0)
+            self.rr[pool] = turn + 1
+            chosen = members[turn % len(members)]
+        else:
+            weights = [backends[i].weight for i in members]
+            if policy == "wrandom":
+                chosen = self.rng.choices(members, weights)[0]
+            else:
+                point = zlib.crc32(qname.encode("utf-8")) % sum(weights)
+                for chosen, weight in zip(members, weights):
+                    if point < weight:
+                        break
+                    point -= weight
+        pending = outstanding[chosen]
+        pending.append(now + self.latency[chosen])
+        self.backend_queries[chosen] += 1
+        if len(pending) > self.backend_peak_outstanding[chosen]:
+            self.backend_peak_outstanding[chosen] = len(pending)
+        second = self.backend_second[chosen]
+        current = int(now)
+        if second[0] != current:
+            second[0], second[1] = current, 0
+        second[1] += 1
+        if second[1] > second[2]:
+            second[2] = second[1]
+
+    def feed(self, times: List[float], clients: List[str], qnames: List[str]) -> None:
+        """Process one batch of queries, which should be in time order."""
+
+        started = time.perf_counter()
+        plans = self.plans
+        rules = self.rules
+        client_stats = self.clients
+        rule_hits = self.rule_hits
+        last = self.last
+        for now, client, qname in zip(times, clients, qnames):
+            if now < last:
+                self.out_of_order += 1
+            else:
+                last = now
+            stats = client_stats.get(client)
+            if stats is None:
+                stats = client_stats[client] = [0, 0]
+            stats[0] += 1
+            plan = plans.get(qname)
+            if plan is None:
+                plan = self._plan(qname)
+            for index in plan:
+                rule = rules[index]
+                kind = rule.kind
+                if kind == "qps_ip":
+                    key = self.masks[index].get(client) or self._client_key(
+                        index, client
+                    )
+                    if not self._limited(index, key, last):
+                        continue
+                elif kind == "qps" and not self._limited(index, "", last):
+                    continue
+                rule_hits[index] += 1
+                action = rule.action
+                if action == "drop":
+                    self.rule_drops[index] += 1
+                    self.dropped += 1
+                    stats[1] += 1
+                    per_rule = self.client_rules.setdefault(client, {})
+                    per_rule[index] = per_rule.get(index, 0) + 1
+                    break
+                if action == "pool":
+                    self._route(rule.pool, qname, last)
+                    if rule.stop:
+                        break
+                elif action == "answer":
+                    self.answered += 1
+                    break
+            else:
+                # No stopping rule matched: dnsdist uses the default pool.
+                self._route("", qname, last)
+        if times:
+            self.queries += len(times)
+            if self.first is None:
+                self.first = times[0]
+        self.last = last
+        self.elapsed += time.perf_counter() - started
+
+    def result(self) -> Dict[str, Any]:
+        config = self.config
+        span = self.last - self.first if self.first is not None else 0.0
+        routed = sum(self.backend_queries)
+        shadowed = set(config.shadowed())
+        throttled = sorted(
+            (c for c, s in self.clients.items() if s[1]),
+            key=lambda c: (-self.clients[c][1], c),
+        )
+        return {
+            "queries": self.queries,
+            "duration": round(span, 3),
+            "offered_qps": round(self.queries / span, 2) if span > 0 else None,
+            "simulated_per_second": (
+                round(self.queries / self.elapsed) if self.elapsed else None
+            ),
+            "policy": config.policy,
+            "model": self.policy,
+            "routed": routed,
+            "dropped": self.dropped,
+            "answered": self.answered,
+            "no_backend": sum(self.no_backend.values()),
+            "out_of_order": self.out_of_order,
+            "backends": {
+                b.name: {
+                    "pool": b.pool,
+                    "address": b.address,
+                    "queries": self.backend_queries[i],
+                    "share": (
+                        round(self.backend_queries[i] / routed, 4) if routed else 0.0
+                    ),
+                    "peak_qps": self.backend_second[i][2],
+                    "peak_outstanding": self.backend_peak_outstanding[i],
+                }
+                for i, b in enumerate(config.backends)
+            },
+            "pools": {
+                pool: {"queries": count, "no_backend": self.no_backend.get(pool, 0)}
+                for pool, count in sorted(self.pool_queries.items())
+            },
+            "rules": [
+                {
+                    "index": rule.index,
+                    "line": rule.line,
+                    "rule": rule.source,
+                    "hits": self.rule_hits[rule.index],
+                    "drops": self.rule_drops[rule.index],
+                    "shadowed": rule.index in shadowed,
+                    **(
+                        {"qps": rule.params["qps"], "burst": rule.params["burst"]}
+                        if rule.kind in DYNAMIC
+                        else {}
+                    ),
+                }
+                for rule in config.rules
+            ],
+            "clients": {
+                "total": len(self.clients),
+                "throttled": len(throttled),
+                "top": [
+                    {
+                        "client": client,
+                        "queries": self.clients[client][0],
+                        "dropped": self.clients[client][1],
+                        "drop_rate": round(
+                            self.clients[client][1] / self.clients[client][0], 4
+                        ),
+                        "rules": {
+                            config.rules[i].source: n
+                            for i, n in sorted(self.client_rules[client].items())
+                        },
+                    }
+                    for client in throttled[: self.top_clients]
+                ],
+            },
+            "notes": self.notes,
+        }
+
+
+def simulate(
+    config: DnsdistConfig, batches: Iterable[Batch], **kwargs: Any
+) -> Dict[str, Any]:
+    simulator = Simulator(config, **kwargs)
+    for times, clients, qnames in batches:
+        simulator.feed(times, clients, qnames)
+    return simulator.result()
@@ -0,0 +1,260 @@
+"""Prometheus exporter for PowerDNS Authoritative, Recursor and dnsdist.
+
+All configured statistics endpoints are polled concurrently over one pooled
+keep-alive client per scrape.  Metric family metadata (sanitised name,
+``HELP`` and ``TYPE`` lines) is derived once per statistic and cached, and a
+rendered scrape is reused for ``min_interval`` seconds so overlapping
+Prometheus replicas do not multiply upstream load.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from utils.logger import get_logger
+
+STATS_PATHS = {
+    "auth": "/api/v1/servers/localhost/statistics",
+    "recursor": "/api/v1/servers/localhost/statistics",
+    "dnsdist": "/jsonstat?command=stats",
+}
+
+PREFIXES = {
+    "auth": "powerdns_auth_",
+    "recursor": "powerdns_recursor_",
+    "dnsdist": "dnsdist_",
+}
+
+# Statistics that go up and down; everything else is exported as a counter.
+GAUGE_PATTERN = re.compile(
+    r"(uptime|latency|usage|size|entries|concurrent|open-tcp|security-status|"
+    r"fd-|memory|load|threads|-count$|^cache-|^packetcache-size)"
+)
+_INVALID = re.compile(r"[^a-zA-Z0-9_]")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@dataclass
+class Target:
+    name: str
+    kind: str
+    url: str
+    api_key: str = ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format(value: float) -> str:
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def parse_stats(kind: str, payload: Any) -> List[Tuple[str, Optional[str], float]]:
+    """Flatten an API statistics payload into ``(stat, label, value)`` tuples."""
+
+    samples: List[Tuple[str, Optional[str], float]] = []
+    if kind == "dnsdist":
+        for name, value in (payload or {}).items():
+            if isinstance(value, (int, float)):
+                samples.append((name, None, float(value)))
+        return samples
+    for item in payload or []:
+        name = item.get("name")
+        value = item.get("value")
+        if item.get("type") == "StatisticItem":
+            try:
+                samples.append((name, None, float(value)))
+            except (TypeError, ValueError):
+                continue
+        elif item.get("type") == "MapStatisticItem":
+            for entry in value or []:
+                try:
+                    samples.append((name, entry["name"], float(entry["value"])))
+                except (KeyError, TypeError, ValueError):
+                    continue
+    return samples
+
+
+class StatsExporter:
+    """Poll statistics endpoints and render Prometheus text format."""
+
+    def __init__(
+        self,
+        targets: List[Target],
+        timeout: float = 2.0,
+        min_interval: float = 1.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ) -> None:
+        self.targets = targets
+        self.min_interval = min_interval
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max(1, len(targets)),
+                max_keepalive_connections=max(1, len(targets)),
+            ),
+            transport=transport,
+        )
+        self.logger = get_logger(self.__class__.__name__)
+        self._families: Dict[Tuple[str, str], Tuple[str, str]] = {}
+        self._body = b""
+        self._rendered_at = 0.0
+        self._inflight: Optional[asyncio.Task] = None
+        self.upstream_requests = 0
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+    def _family(self, kind: str, stat: str) -> Tuple[str, str]:
+        family = self._families.get((kind, stat))
+        if family is None:
+            name = PREFIXES[kind] + _INVALID.sub("_", stat)
+            mtype = "gauge" if GAUGE_PATTERN.search(stat) else "counter"
+            header = f"# HELP {name} {kind} statistic {stat}\n# TYPE {name} {mtype}\n"
+            family = (name, header)
+            self._families[(kind, stat)] = family
+        return family
+
+    async def _fetch(self, target: Target) -> Any:
+        self.upstream_requests += 1
+        resp = await self.client.get(
+            target.url.rstrip("/") + STATS_PATHS[target.kind],
+            headers={"X-API-Key": target.api_key},
+        )
+        resp.raise_for_status()
+        return resp.json()
+
+    async def _collect(self) -> bytes:
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *(self._fetch(t) for t in self.targets), return_exceptions=True
+        )
+        families: Dict[str, List[str]] = {}
+        headers: Dict[str, str] = {}
+        up_lines = []
+        for target, result in zip(self.targets, results):
+            instance = _escape(target.name)
+            if isinstance(result, Exception):
+                self.logger.warning(
+                    "Scrape failed",
+                    extra={"target": target.name, "error": str(result)},
+                )
+                up_lines.append(f'pdns_exporter_up{{instance="{instance}"}} 0\n')
+                continue
+            up_lines.append(f'pdns_exporter_up{{instance="{instance}"}} 1\n')
+            for stat, label, value in parse_stats(target.kind, result):
+                name, header = self._family(target.kind, stat)
+                headers[name] = header
+                if label is None:
+                    line = f'{name}{{instance="{instance}"}} {_format(value)}\n'
+                else:
+                    line = (
+                        f'{name}{{instance="{instance}",key="{_escape(label)}"}} '
+                        f"{_format(value)}\n"
+                    )
+                families.setdefault(name, []).append(line)
+
+        parts = [
+            "# HELP pdns_exporter_up Whether the last poll of a target succeeded.\n",
+            "# TYPE pdns_exporter_up gauge\n",
+            *up_lines,
+        ]
+        for name in sorted(families):
+            parts.append(headers[name])
+            parts.extend(families[name])
+        parts.append(
+            "# HELP pdns_exporter_scrape_duration_seconds Time spent polling targets.\n"
+            "# TYPE pdns_exporter_scrape_duration_seconds gauge\n"
+            f"pdns_exporter_scrape_duration_seconds {time.perf_counter() - started:.6f}\n"
+        )
+        return "".join(parts).encode("utf-8")
+
+    async def metrics(self) -> bytes:
+        """Return the rendered metrics, polling upstream at most once per interval."""
+
+        if time.monotonic() - self._rendered_at < self.min_interval and self._body:
+            return self._body
+        # Concurrent scrapes share a single in-flight poll.
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._collect())
+        body = await asyncio.shield(self._inflight)
+        self._body = body
+        self._rendered_at = time.monotonic()
+        return body
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                keep_alive = True
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    if header.lower().startswith(b"connection:"):
+                        keep_alive = b"close" not in header.lower()
+                parts = request_line.split()
+                path = parts[1].split(b"?")[0] if len(parts) > 1 else b""
+                if parts and parts[0] == b"GET" and path == b"/metrics":
+                    status, ctype, body = "200 OK", CONTENT_TYPE, await self.metrics()
+                else:
+                    status, ctype, body = "404 Not Found", "text/plain", b"Not Found\n"
+                writer.write(
+                    (
+                        f"HTTP/1.1 {status}\r\nContent-Type: {ctype}\r\n"
+                        f"Content-Length: {len(body)}\r\n"
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                    ).encode("ascii")
+                    + body
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "0.0.0.0", port: int = 9121) -> asyncio.Server:
+        """Start the HTTP listener and return the server object."""
+
+        server = await asyncio.start_server(self._handle, host, port)
+        self.logger.info("Exporter listening", extra={"host": host, "port": port})
+        return server
+
+
+def targets_from_config(conf: Dict[str, Any]) -> List[Target]:
+    """Build targets from the ``exporter`` section of ``config.yml``."""
+
+    targets = []
+    for item in conf.get("targets", []):
+        api_key = os.environ.get(item.get("api_key_env", ""), "")
+        targets.append(Target(item["name"], item["kind"], item["url"], api_key=api_key))
+    return targets
+
+
+async def run_exporter(conf: Dict[str, Any], host: str, port: int) -> None:
+    exporter = StatsExporter(
+        targets_from_config(conf),
+        timeout=conf.get("timeout", 2.0),
+        min_interval=conf.get("min_interval", 1.0),
+    )
+    server = await exporter.serve(host, port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await exporter.close()
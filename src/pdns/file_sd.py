@@ -0,0 +1,230 @@
+"""Generate sharded Prometheus ``file_sd`` target files from the inventory.
+
+Instead of rendering every target into ``prometheus.yml`` (which forces a
+full reload on each fleet change), each scrape job gets ``shards`` JSON files
+under ``<output_dir>/<job>/``.  A target always lands in the same shard
+(CRC32 of its address), so adding or removing a host rewrites one small
+file, and only files whose content hash changed are written.  Prometheus
+picks them up through its file watcher without a reload.
+
+With ``replicas > 1`` each replica gets its own ``replica-<n>/`` tree
+holding only the targets Prometheus' ``hashmod`` relabel action would assign
+to it, so a pair of HA Prometheus servers can split the fleet.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import yaml
+
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+MANIFEST = ".manifest.json"
+
+# Mirrors the scrape jobs of roles/prometheus/templates/prometheus.yml.j2.
+DEFAULT_JOBS: Dict[str, Dict[str, Any]] = {
+    "powerdns-auth": {
+        "groups": ["powerdns_primary", "powerdns_secondary"],
+        "port": 9120,
+        "port_var": "powerdns_exporter_port",
+    },
+    "powerdns-recursor": {
+        "groups": ["powerdns_recursor"],
+        "port": 9199,
+        "port_var": "recursor_exporter_port",
+    },
+    "mysql": {
+        "groups": ["powerdns_primary", "powerdns_secondary"],
+        "port": 9104,
+        "port_var": "mysql_exporter_port",
+    },
+    "haproxy": {
+        "groups": ["haproxy_servers"],
+        "port": 9101,
+        "port_var": "haproxy_exporter_port",
+    },
+    "node-exporter": {
+        "groups": ["all"],
+        "port": 9100,
+        "port_var": "node_exporter_port",
+    },
+    "keepalived": {
+        "groups": ["powerdns_primary", "powerdns_secondary"],
+        "port": 9165,
+        "port_var": "keepalived_exporter_port",
+    },
+    "powerdns-custom": {
+        "groups": ["powerdns_primary", "powerdns_secondary"],
+        "port": 9121,
+        "port_var": "custom_metrics_port",
+    },
+}
+
+
+def hashmod(value: str, modulus: int) -> int:
+    """Prometheus' ``hashmod`` relabel action: low 64 bits of MD5, mod ``modulus``."""
+
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[8:], "big") % (
+        modulus
+    )
+
+
+class Inventory:
+    """Hosts, groups and merged host variables from Ansible YAML inventories."""
+
+    def __init__(self) -> None:
+        self.hostvars: Dict[str, Dict[str, Any]] = {}
+        self.groups: Dict[str, List[str]] = {"all": []}
+        self.group_vars: Dict[str, Dict[str, Any]] = {}
+
+    def _add_group(
+        self, name: str, data: Any, inherited: Dict[str, Any], parents: List[str]
+    ) -> None:
+        data = data if isinstance(data, dict) else {}
+        group_vars = {**inherited, **(data.get("vars") or {})}
+        self.group_vars.setdefault(name, {}).update(data.get("vars") or {})
+        members = self.groups.setdefault(name, [])
+        for host, host_vars in (data.get("hosts") or {}).items():
+            merged = self.hostvars.setdefault(host, {})
+            # Child group and host vars override parent group vars.
+            for key, value in {**group_vars, **(host_vars or {})}.items():
+                merged[key] = value
+            for group in [*parents, name]:
+                if host not in self.groups.setdefault(group, []):
+                    self.groups[group].append(host)
+            if host not in members:
+                members.append(host)
+        for child, child_data in (data.get("children") or {}).items():
+            self._add_group(child, child_data, group_vars, [*parents, name])
+
+    def load(self, path: str) -> "Inventory":
+        with open(path, "r", encoding="utf-8") as f:
+            data = yaml.load(f, Loader=YamlLoader) or {}
+        for name, group in data.items():
+            self._add_group(name, group, {}, [] if name == "all" else ["all"])
+        return self
+
+
+def load_inventory(paths: Iterable[str]) -> Inventory:
+    inventory = Inventory()
+    for path in paths:
+        inventory.load(path)
+    return inventory
+
+
+def build_jobs(
+    inventory: Inventory, jobs: Dict[str, Dict[str, Any]]
+) -> Dict[str, List[Tuple[str, Dict[str, str]]]]:
+    """Return ``{job: [(address, labels), ...]}`` sorted by address."""
+
+    result: Dict[str, List[Tuple[str, Dict[str, str]]]] = {}
+    for job, spec in jobs.items():
+        seen: Dict[str, Dict[str, str]] = {}
+        for group in spec.get("groups", []):
+            for host in inventory.groups.get(group, []):
+                hostvars = inventory.hostvars.get(host, {})
+                address = hostvars.get("ansible_host", host)
+                port = hostvars.get(spec.get("port_var", ""), spec["port"])
+                target = f"{address}:{port}"
+                # A host listed under several of the job's groups is scraped once.
+                seen.setdefault(target, {"host": host, "group": group})
+        result[job] = sorted(seen.items())
+    return result
+
+
+def render_shards(
+    targets: List[Tuple[str, Dict[str, str]]], shards: int
+) -> List[bytes]:
+    """Split targets into ``shards`` file_sd documents by CRC32 of the address."""
+
+    buckets: List[List[Tuple[str, Dict[str, str]]]] = [[] for _ in range(shards)]
+    for address, labels in targets:
+        buckets[zlib.crc32(address.encode("utf-8")) % shards].append((address, labels))
+    documents = []
+    for bucket in buckets:
+        # One target group per line keeps large files compact yet diffable.
+        lines = [
+            json.dumps({"targets": [address], "labels": labels}, sort_keys=True)
+            for address, labels in bucket
+        ]
+        text = "[\n" + ",\n".join(lines) + "\n]\n" if lines else "[]\n"
+        documents.append(text.encode("utf-8"))
+    return documents
+
+
+class FileSDWriter:
+    """Write shard files whose content changed; remove ones no longer produced."""
+
+    def __init__(self, output_dir: str) -> None:
+        self.output_dir = output_dir
+        self.manifest_path = os.path.join(output_dir, MANIFEST)
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self.manifest: Dict[str, str] = json.load(f)
+        except (OSError, ValueError):
+            self.manifest = {}
+
+    def write(self, files: Dict[str, bytes]) -> Dict[str, int]:
+        summary = {"written": 0, "unchanged": 0, "removed": 0}
+        manifest: Dict[str, str] = {}
+        for rel, content in sorted(files.items()):
+            digest = hashlib.sha256(content).hexdigest()
+            manifest[rel] = digest
+            path = os.path.join(self.output_dir, rel)
+            if self.manifest.get(rel) == digest and os.path.isfile(path):
+                summary["unchanged"] += 1
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(content)
+            # Prometheus must never see a half-written target file.
+            os.replace(tmp, path)
+            summary["written"] += 1
+        for rel in set(self.manifest) - set(manifest):
+            try:
+                os.remove(os.path.join(self.output_dir, rel))
+                summary["removed"] += 1
+            except FileNotFoundError:
+                pass
+        if manifest != self.manifest:
+            os.makedirs(self.output_dir, exist_ok=True)
+            tmp = f"{self.manifest_path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.manifest_path)
+            self.manifest = manifest
+        return summary
+
+
+def generate(
+    inventory: Inventory,
+    output_dir: str,
+    jobs: Optional[Dict[str, Dict[str, Any]]] = None,
+    shards: int = 4,
+    replicas: int = 1,
+) -> Dict[str, Any]:
+    """Write ``<output_dir>[/replica-<n>]/<job>/<shard>.json`` and summarise."""
+
+    if shards < 1 or replicas < 1:
+        raise ValueError("shards and replicas must be at least 1")
+    files: Dict[str, bytes] = {}
+    counts: Dict[str, int] = {}
+    for job, targets in build_jobs(inventory, jobs or DEFAULT_JOBS).items():
+        counts[job] = len(targets)
+        for replica in range(replicas):
+            subset = targets
+            prefix = ""
+            if replicas > 1:
+                subset = [t for t in targets if hashmod(t[0], replicas) == replica]
+                prefix = f"replica-{replica}/"
+            for shard, content in enumerate(render_shards(subset, shards)):
+                files[f"{prefix}{job}/{shard:03d}.json"] = content
+    summary = FileSDWriter(output_dir).write(files)
+    summary["targets"] = counts
+    return summary
@@ -0,0 +1,315 @@
+"""Synchronise zones from Ansible variables to the PowerDNS HTTP API.
+
+Current zones are fetched over one pooled keep-alive client, compared with
+the desired state RRset by RRset, and only the differences are sent back as
+batched ``PATCH`` requests.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import ipaddress
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+from utils.logger import get_logger
+
+ZONE_VARIABLES = ("zones_config", "reverse_zones_config", "zones_as_code")
+
+# Record types whose content is a domain name and must be fully qualified.
+NAME_CONTENT_TYPES = {"CNAME", "NS", "PTR", "DNAME"}
+PRIORITY_TYPES = {"MX", "SRV"}
+
+ZONE_KINDS = {"native": "Native", "master": "Master", "slave": "Slave"}
+
+RRsetKey = Tuple[str, str]
+
+
+def _fqdn(name: str) -> str:
+    name = name.strip().lower()
+    return name if name.endswith(".") else name + "."
+
+
+def _qualify(owner: str, zone: str) -> str:
+    owner = owner.strip().lower()
+    if owner in ("@", ""):
+        return zone
+    if owner.endswith("."):
+        return owner
+    if (owner + ".").endswith("." + zone) or owner + "." == zone:
+        return owner + "."
+    return f"{owner}.{zone}"
+
+
+def _content(rtype: str, record: Dict[str, Any]) -> str:
+    content = str(record.get("content", "")).strip()
+    if rtype in NAME_CONTENT_TYPES:
+        return _fqdn(content)
+    if rtype in PRIORITY_TYPES:
+        parts = content.split()
+        if "priority" in record:
+            parts.insert(0, str(record["priority"]))
+        if parts:
+            parts[-1] = _fqdn(parts[-1])
+        return " ".join(parts)
+    if rtype in ("A", "AAAA"):
+        # PowerDNS returns canonical addresses (2001:db8::1, not 2001:DB8:0::1).
+        try:
+            return str(ipaddress.ip_address(content))
+        except ValueError:
+            return content
+    if rtype == "TXT" and not content.startswith('"'):
+        return '"' + content.replace('"', '\\"') + '"'
+    return content
+
+
+@dataclass
+class DesiredZone:
+    name: str
+    kind: str = "Native"
+    masters: List[str] = field(default_factory=list)
+    rrsets: Dict[RRsetKey, Tuple[int, Tuple[str, ...]]] = field(default_factory=dict)
+
+
+def desired_zones_from_vars(
+    documents: Iterable[Dict[str, Any]], default_ttl: int = 3600
+) -> Dict[str, DesiredZone]:
+    """Build the desired zone state from parsed vars files."""
+
+    zones: Dict[str, DesiredZone] = {}
+    for data in documents:
+        for var in ZONE_VARIABLES:
+            for zone in (data or {}).get(var) or []:
+                if not isinstance(zone, dict) or not zone.get("name"):
+                    continue
+                name = _fqdn(str(zone["name"]))
+                kind = ZONE_KINDS.get(str(zone.get("type", "native")).lower(), "Native")
+                desired = zones.setdefault(
+                    name, DesiredZone(name, kind, list(zone.get("masters") or []))
+                )
+                grouped: Dict[RRsetKey, Tuple[int, set]] = {}
+                for record in zone.get("records") or []:
+                    rtype = str(record.get("type", "")).upper()
+                    key = (_qualify(str(record.get("name", "@")), name), rtype)
+                    ttl = int(record.get("ttl", default_ttl))
+                    prev_ttl, contents = grouped.setdefault(key, (ttl, set()))
+                    contents.add(_content(rtype, record))
+                    grouped[key] = (min(prev_ttl, ttl), contents)
+                for key, (ttl, contents) in grouped.items():
+                    desired.rrsets[key] = (ttl, tuple(sorted(contents)))
+    return zones
+
+
+def _current_rrsets(
+    zone: Dict[str, Any],
+) -> Dict[RRsetKey, Tuple[int, Tuple[str, ...]]]:
+    rrsets = {}
+    for rrset in zone.get("rrsets", []):
+        contents = tuple(
+            sorted(
+                r["content"] for r in rrset.get("records", []) if not r.get("disabled")
+            )
+        )
+        rrsets[(rrset["name"].lower(), rrset["type"])] = (rrset.get("ttl", 0), contents)
+    return rrsets
+
+
+def diff_rrsets(
+    desired: Dict[RRsetKey, Tuple[int, Tuple[str, ...]]],
+    current: Dict[RRsetKey, Tuple[int, Tuple[str, ...]]],
+    prune: bool = False,
+    zone: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Return the minimal list of RRset changes turning ``current`` into ``desired``.
+
+    Pruning never deletes the SOA, nor the apex NS set of ``zone`` unless
+    it is declared in ``desired``.
+    """
+
+    changes: List[Dict[str, Any]] = []
+    for (name, rtype), (ttl, contents) in sorted(desired.items()):
+        if current.get((name, rtype)) == (ttl, contents):
+            continue
+        changes.append(
+            {
+                "name": name,
+                "type": rtype,
+                "ttl": ttl,
+                "changetype": "REPLACE",
+                "records": [{"content": c, "disabled": False} for c in contents],
+            }
+        )
+    if prune:
+        for name, rtype in sorted(set(current) - set(desired)):
+            if rtype == "SOA" or (rtype == "NS" and name == zone):
+                continue
+            changes.append({"name": name, "type": rtype, "changetype": "DELETE"})
+    return changes
+
+
+class PowerDNSClient:
+    """Thin async wrapper over the PowerDNS API with a pooled connection."""
+
+    def __init__(
+        self,
+        api_url: str,
+        api_key: str,
+        server_id: str = "localhost",
+        concurrency: int = 8,
+        timeout: float = 30.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ) -> None:
+        self.server_id = server_id
+        self.client = httpx.AsyncClient(
+            base_url=api_url.rstrip("/"),
+            headers={"X-API-Key": api_key},
+            limits=httpx.Limits(
+                max_connections=concurrency, max_keepalive_connections=concurrency
+            ),
+            timeout=timeout,
+            transport=transport,
+        )
+
+    async def __aenter__(self) -> "PowerDNSClient":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.client.aclose()
+
+    def _zones_path(self) -> str:
+        return f"/servers/{self.server_id}/zones"
+
+    async def list_zones(self) -> List[Dict[str, Any]]:
+        resp = await self.client.get(self._zones_path())
+        resp.raise_for_status()
+        return resp.json()
+
+    async def get_zone(self, zone_id: str) -> Dict[str, Any]:
+        resp = await self.client.get(f"{self._zones_path()}/{zone_id}")
+        resp.raise_for_status()
+        return resp.json()
+
+    async def create_zone(self, body: Dict[str, Any]) -> None:
+        resp = await self.client.post(self._zones_path(), json=body)
+        resp.raise_for_status()
+
+    async def patch_zone(self, zone_id: str, rrsets: List[Dict[str, Any]]) -> None:
+        resp = await self.client.patch(
+            f"{self._zones_path()}/{zone_id}", json={"rrsets": rrsets}
+        )
+        resp.raise_for_status()
+
+
+class ZoneSync:
+    """Apply desired zones to a PowerDNS server with bounded concurrency."""
+
+    def __init__(
+        self,
+        client: PowerDNSClient,
+        batch_size: int = 500,
+        concurrency: int = 8,
+        prune: bool = False,
+        dry_run: bool = False,
+    ) -> None:
+        self.client = client
+        self.batch_size = max(1, batch_size)
+        self.semaphore = asyncio.Semaphore(max(1, concurrency))
+        self.prune = prune
+        self.dry_run = dry_run
+        self.logger = get_logger(self.__class__.__name__)
+        self.summary: Dict[str, Any] = {
+            "zones_created": 0,
+            "zones_patched": 0,
+            "rrsets_replaced": 0,
+            "rrsets_deleted": 0,
+            "requests": 0,
+            "errors": {},
+        }
+
+    async def _call(self, coro_fn, *args) -> Any:
+        async with self.semaphore:
+            self.summary["requests"] += 1
+            return await coro_fn(*args)
+
+    async def _sync_zone(self, desired: DesiredZone, existing: Optional[Dict]) -> None:
+        if existing is None:
+            self.summary["zones_created"] += 1
+            body: Dict[str, Any] = {"name": desired.name, "kind": desired.kind}
+            if desired.kind == "Slave":
+                body["masters"] = desired.masters
+            else:
+                body["nameservers"] = []
+                body["rrsets"] = diff_rrsets(desired.rrsets, {})
+                self.summary["rrsets_replaced"] += len(body["rrsets"])
+            if not self.dry_run:
+                await self._call(self.client.create_zone, body)
+            return
+        if desired.kind == "Slave" or not desired.rrsets:
+            return
+
+        zone = await self._call(self.client.get_zone, existing["id"])
+        changes = diff_rrsets(
+            desired.rrsets, _current_rrsets(zone), self.prune, desired.name
+        )
+        if not changes:
+            return
+        self.summary["zones_patched"] += 1
+        for change in changes:
+            key = (
+                "rrsets_deleted"
+                if change["changetype"] == "DELETE"
+                else "rrsets_replaced"
+            )
+            self.summary[key] += 1
+        if self.dry_run:
+            return
+        # Batches for one zone go out in order; zones run concurrently.
+        for start in range(0, len(changes), self.batch_size):
+            batch = changes[start : start + self.batch_size]
+            await self._call(self.client.patch_zone, existing["id"], batch)
+
+    async def run(self, desired: Dict[str, DesiredZone]) -> Dict[str, Any]:
+        existing = {
+            zone["name"].lower(): zone
+            for zone in await self._call(self.client.list_zones)
+        }
+        # One failing zone must not abort the others mid-flight.
+        results = await asyncio.gather(
+            *(
+                self._sync_zone(zone, existing.get(name))
+                for name, zone in desired.items()
+            ),
+            return_exceptions=True,
+        )
+        for name, result in zip(desired, results):
+            if isinstance(result, httpx.HTTPError):
+                self.summary["errors"][name] = str(result)
+            elif isinstance(result, BaseException):
+                raise result
+        if self.summary["errors"]:
+            self.logger.error("Zone sync failed", extra=self.summary)
+        else:
+            self.logger.info("Zone sync complete", extra=self.summary)
+        return self.summary
+
+
+async def sync_zones(
+    desired: Dict[str, DesiredZone],
+    api_url: str,
+    api_key: str,
+    server_id: str = "localhost",
+    concurrency: int = 8,
+    batch_size: int = 500,
+    prune: bool = False,
+    dry_run: bool = False,
+    transport: Optional[httpx.AsyncBaseTransport] = None,
+) -> Dict[str, Any]:
+    """Fetch, diff and patch ``desired`` against the API in one session."""
+
+    async with PowerDNSClient(
+        api_url, api_key, server_id, concurrency, transport=transport
+    ) as client:
+        sync = ZoneSync(client, batch_size, concurrency, prune, dry_run)
+        return await sync.run(desired)
@@ -1,7 +1 @@
 """Utility package for AuditAgent."""
-
-from .logger import get_logger
-from .cache import JsonFileCache
-from .rate_limiter import TokenBucket
-
-__all__ = ["get_logger", "JsonFileCache", "TokenBucket"]
@@ -1,21 +1,290 @@
+"""Sharded on-disk cache shared safely between processes.
+
+Entries are spread over ``shards`` segment files by a CRC32 of the key.  Each
+segment is a ``marshal``-encoded ``{key: (stored_at, value)}`` dict, so values
+must be built-in types (``None``, numbers, strings, bytes, lists, tuples and
+dicts of those).  Writers take an exclusive ``flock`` on the segment's lock
+file, re-read it, apply their changes and atomically replace it; readers
+never see a partial segment.  Recently used segments are kept in an
+in-memory LRU and revalidated against the file's inode, mtime and size, so another
+process's writes are picked up without re-reading unchanged segments.
+
+Entries older than ``ttl`` seconds read as misses and are dropped on the
+next write; segments over their share of ``max_bytes`` evict their oldest
+entries.  :attr:`ShardedCache.stats` counts hits, misses, expirations,
+evictions and segment writes for this process.
+"""
+
 import json
+import marshal
 import os
-from typing import Any, Dict
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+_MISSING = object()
 
 
-class JsonFileCache:
-    """Simple JSON file cache."""
+class ShardedCache:
+    """Process-safe key/value cache over sharded binary segments."""
 
-    def __init__(self, path: str = "cache.json") -> None:
+    def __init__(
+        self,
+        path: str,
+        shards: int = 16,
+        ttl: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        memory_shards: int = 16,
+    ) -> None:
         self.path = path
-        if not os.path.exists(self.path):
-            with open(self.path, "w", encoding="utf-8") as f:
-                json.dump({}, f)
+        self.shards = shards
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.memory_shards = memory_shards
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "evictions": 0,
+            "writes": 0,
+        }
+        self._memory: (
+            "OrderedDict[int, Tuple[Tuple[int, int, int], Dict[str, Any]]]"
+        ) = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+
+    # -- segments -------------------------------------------------------
+
+    def shard_of(self, key: str) -> int:
+        return zlib.crc32(key.encode("utf-8")) % self.shards
+
+    def _segment(self, shard: int) -> str:
+        return os.path.join(self.path, f"{shard:03d}.seg")
+
+    @contextmanager
+    def _locked(self, shard: int) -> Iterator[None]:
+        with open(os.path.join(self.path, f"{shard:03d}.lock"), "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _load(self, shard: int) -> Dict[str, Any]:
+        """Return the segment's entries, reusing the in-memory copy if current."""
+
+        path = self._segment(shard)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return {}
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._memory.get(shard)
+            if cached is not None and cached[0] == stamp:
+                self._memory.move_to_end(shard)
+                return cached[1]
+        try:
+            with open(path, "rb") as f:
+                entries = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            # A corrupt segment is treated as empty and rewritten on next store.
+            entries = {}
+        if not isinstance(entries, dict):
+            entries = {}
+        self._remember(shard, stamp, entries)
+        return entries
+
+    def _remember(
+        self, shard: int, stamp: Tuple[int, int, int], entries: Dict[str, Any]
+    ) -> None:
+        with self._lock:
+            self._memory[shard] = (stamp, entries)
+            self._memory.move_to_end(shard)
+            while len(self._memory) > self.memory_shards:
+                self._memory.popitem(last=False)
+
+    def _expired(self, stored_at: float, now: float) -> bool:
+        return self.ttl is not None and now - stored_at > self.ttl
+
+    def _store(self, shard: int, changes: Dict[str, Any]) -> None:
+        """Apply ``changes`` (``_MISSING`` deletes) to one segment atomically."""
+
+        with self._locked(shard):
+            now = time.time()
+            entries = {
+                k: v
+                for k, v in self._load(shard).items()
+                if not self._expired(v[0], now)
+            }
+            for key, value in changes.items():
+                if value is _MISSING:
+                    entries.pop(key, None)
+                else:
+                    entries[key] = (now, value)
+            data = marshal.dumps(entries)
+            if self.max_bytes is not None:
+                limit = self.max_bytes // self.shards
+                if len(data) > limit:
+                    oldest = sorted(entries, key=lambda k: entries[k][0])
+                    # Drop the oldest entries in proportion to the overshoot.
+                    while entries and len(data) > limit:
+                        drop = max(1, len(entries) * (len(data) - limit) // len(data))
+                        for key in oldest[:drop]:
+                            del entries[key]
+                        oldest = oldest[drop:]
+                        self.stats["evictions"] += drop
+                        data = marshal.dumps(entries)
+            path = self._segment(shard)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            st = os.stat(path)
+            self._remember(shard, (st.st_ino, st.st_mtime_ns, st.st_size), entries)
+            self.stats["writes"] += 1
+
+    # -- key/value API --------------------------------------------------
+
+    def get(self, key: str, default: Any = None) -> Any:
+        entry = self._load(self.shard_of(key)).get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return default
+        if self._expired(entry[0], time.time()):
+            self.stats["expired"] += 1
+            self.stats["misses"] += 1
+            return default
+        self.stats["hits"] += 1
+        return entry[1]
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def set(self, key: str, value: Any) -> None:
+        self.update({key: value})
+
+    def delete(self, key: str) -> None:
+        self._store(self.shard_of(key), {key: _MISSING})
+
+    def update(self, mapping: Dict[str, Any], delete: Tuple[str, ...] = ()) -> None:
+        """Store many entries with one locked rewrite per touched segment."""
+
+        grouped: Dict[int, Dict[str, Any]] = {}
+        for key, value in mapping.items():
+            grouped.setdefault(self.shard_of(key), {})[key] = value
+        for key in delete:
+            grouped.setdefault(self.shard_of(key), {})[key] = _MISSING
+        for shard, changes in grouped.items():
+            self._store(shard, changes)
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        now = time.time()
+        for shard in range(self.shards):
+            for key, (stored_at, value) in self._load(shard).items():
+                if not self._expired(stored_at, now):
+                    yield key, value
+
+    def clear(self) -> None:
+        for shard in range(self.shards):
+            with self._locked(shard):
+                try:
+                    os.remove(self._segment(shard))
+                except FileNotFoundError:
+                    pass
+        with self._lock:
+            self._memory.clear()
+
+
+class CacheView(MutableMapping):
+    """Dict-like view that loads entries of a :class:`ShardedCache` per key.
+
+    Lookups only touch the segment holding the key, so callers that need a
+    few entries never load the whole cache.  Writes and deletes are buffered
+    until :meth:`flush`, which applies them with :meth:`ShardedCache.update`;
+    keys other processes stored meanwhile are kept.  Iteration covers only
+    the entries written through this view.
+    """
+
+    def __init__(self, cache: ShardedCache) -> None:
+        self.cache = cache
+        self.changes: Dict[str, Any] = {}
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.changes.get(key, _MISSING)
+        if value is _MISSING and key not in self.changes:
+            value = self.cache.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self.changes[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        self[key]
+        self.changes[key] = _MISSING
+
+    def __iter__(self) -> Iterator[str]:
+        return (k for k, v in self.changes.items() if v is not _MISSING)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def flush(self) -> None:
+        """Write buffered changes back with one rewrite per touched segment."""
+
+        self.cache.update(
+            {k: v for k, v in self.changes.items() if v is not _MISSING},
+            delete=tuple(k for k, v in self.changes.items() if v is _MISSING),
+        )
+        self.changes.clear()
+
+
+class JsonFileCache(ShardedCache):
+    """Whole-dict ``read``/``write`` interface over :class:`ShardedCache`.
+
+    Kept for existing callers.  ``write`` replaces the whole cache, so it
+    also drops keys another process added since ``read``; concurrent writers
+    should use :meth:`update`, which never deletes.  Only segments whose
+    entries changed are rewritten.  A legacy JSON file at ``path`` is
+    imported once and renamed to ``path + ".migrated"``; the segments live
+    in ``path + ".d"``.
+    """
+
+    def __init__(self, path: str = "cache.json", **kwargs: Any) -> None:
+        super().__init__(path + ".d", **kwargs)
+        self.legacy_path = path
+        if os.path.isfile(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    legacy = json.load(f)
+            except (OSError, ValueError):
+                legacy = None
+            if isinstance(legacy, dict) and legacy:
+                self.update(legacy)
+            try:
+                os.replace(path, path + ".migrated")
+            except FileNotFoundError:
+                pass  # another process migrated it first
 
     def read(self) -> Dict[str, Any]:
-        with open(self.path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return dict(self.items())
 
     def write(self, data: Dict[str, Any]) -> None:
-        with open(self.path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2)
+        current = self.read()
+        changed = {k: v for k, v in data.items() if current.get(k, _MISSING) != v}
+        removed = tuple(k for k in current if k not in data)
+        self.update(changed, delete=removed)
@@ -0,0 +1,58 @@
+import marshal
+import os
+import zlib
+from typing import Any, Tuple
+
+
+def _cache_dir() -> str:
+    base = os.environ.get("AGENT_CACHE_DIR")
+    if base:
+        return base
+    xdg = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+    return os.path.join(xdg, "auditagent")
+
+
+def _cache_file(path: str) -> str:
+    full = os.path.abspath(path)
+    key = zlib.crc32(full.encode("utf-8"))
+    return os.path.join(_cache_dir(), f"{os.path.basename(full)}.{key:08x}.marshal")
+
+
+def _stamp(path: str) -> Tuple[int, int]:
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def load_config(path: str) -> Any:
+    """Load a YAML file, reusing a marshalled copy while the file is unchanged.
+
+    A cache hit avoids importing and running the YAML parser entirely.
+    """
+
+    stamp = _stamp(path)
+    cache = _cache_file(path)
+    try:
+        with open(cache, "rb") as f:
+            cached_stamp, data = marshal.load(f)
+        if tuple(cached_stamp) == stamp:
+            return data
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+
+    import yaml
+
+    with open(path, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f)
+    tmp = f"{cache}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cache), exist_ok=True)
+        with open(tmp, "wb") as f:
+            marshal.dump((stamp, data), f)
+        os.replace(tmp, cache)
+    except (OSError, ValueError):
+        # Unwritable cache dir or values marshal cannot encode (e.g. dates).
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+    return data
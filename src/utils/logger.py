@@ -19,6 +19,17 @@ class JsonFormatter(logging.Formatter):
         return json.dumps(log_record)
 
 
+class LazyFileHandler(logging.FileHandler):
+    """File handler that creates its directory and file on first write."""
+
+    def __init__(self, filename: str) -> None:
+        super().__init__(filename, delay=True)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
 def get_logger(name: str) -> logging.Logger:
     """Return a logger with JSON formatter and file handler."""
     logger = logging.getLogger(name)
@@ -32,8 +43,7 @@ def get_logger(name: str) -> logging.Logger:
     logger.addHandler(stream_handler)
 
     log_dir = os.environ.get("LOG_DIR", "logs")
-    os.makedirs(log_dir, exist_ok=True)
-    file_handler = logging.FileHandler(os.path.join(log_dir, f"{name}.log"))
+    file_handler = LazyFileHandler(os.path.join(log_dir, f"{name}.log"))
     file_handler.setFormatter(formatter)
     logger.addHandler(file_handler)
 
@@ -21,3 +21,29 @@ class TokenBucket:
                 self.tokens -= tokens
                 return True
             return False
+
+
+class SharedTokenBucket:
+    """TokenBucket whose state lives in SharedState, so every worker
+    process draws from the same bucket."""
+
+    def __init__(
+        self, state, max_tokens: int, refill_period: int, key: str = "global"
+    ) -> None:
+        self.state = state
+        self.key = key
+        self.max_tokens = max_tokens
+        self.refill_period = refill_period
+
+    @property
+    def tokens(self) -> float:
+        return self.state.get_tokens(self.key, self.max_tokens)
+
+    @tokens.setter
+    def tokens(self, value: float) -> None:
+        self.state.set_tokens(self.key, value)
+
+    def consume(self, tokens: int = 1) -> bool:
+        return self.state.consume_tokens(
+            self.key, self.max_tokens, self.refill_period, tokens
+        )
@@ -0,0 +1,145 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# Set by ``cli.py serve`` so forked API workers attach to one state file.
+STATE_ENV = "AGENT_STATE_DB"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_limits (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    last_refill REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS audits (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    root TEXT NOT NULL,
+    report_path TEXT NOT NULL,
+    report TEXT NOT NULL,
+    created REAL NOT NULL
+);
+"""
+
+
+class SharedState:
+    """SQLite (WAL mode) store shared by all API worker processes.
+
+    Each thread gets its own connection; writers serialise through
+    ``BEGIN IMMEDIATE`` so token buckets stay exact across processes.
+    :meth:`close` closes the connections opened by every thread.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = os.path.abspath(path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conns: list[sqlite3.Connection] = []
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Only the creating thread uses it, but close() may run elsewhere.
+            conn = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None, check_same_thread=False
+            )
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+            with self._lock:
+                self._conns.append(conn)
+        return conn
+
+    def close(self) -> None:
+        """Close every thread's connection, e.g. those of ``to_thread`` workers."""
+
+        with self._lock:
+            conns, self._conns = self._conns, []
+            # Threads that still hold a closed connection reconnect on next use.
+            self._local = threading.local()
+        for conn in conns:
+            conn.close()
+
+    def reset(self) -> None:
+        """Clear all shared state; called once by the process that owns it."""
+
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM rate_limits")
+        conn.execute("DELETE FROM audits")
+        conn.execute("COMMIT")
+
+    def consume_tokens(
+        self, key: str, max_tokens: int, refill_period: int, tokens: int = 1
+    ) -> bool:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute(
+                "SELECT tokens, last_refill FROM rate_limits WHERE key = ?", (key,)
+            ).fetchone()
+            available, last_refill = row if row else (max_tokens, now)
+            if now - last_refill > refill_period:
+                available, last_refill = max_tokens, now
+            allowed = available >= tokens
+            if allowed:
+                available -= tokens
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limits (key, tokens, last_refill) "
+                "VALUES (?, ?, ?)",
+                (key, available, last_refill),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed
+
+    def get_tokens(self, key: str, default: float) -> float:
+        row = (
+            self._conn()
+            .execute("SELECT tokens FROM rate_limits WHERE key = ?", (key,))
+            .fetchone()
+        )
+        return row[0] if row else default
+
+    def set_tokens(self, key: str, tokens: float) -> None:
+        self._conn().execute(
+            "INSERT OR REPLACE INTO rate_limits (key, tokens, last_refill) "
+            "VALUES (?, ?, ?)",
+            (key, tokens, time.time()),
+        )
+
+    def record_audit(self, root: str, report_path: str, report: str) -> int:
+        cur = self._conn().execute(
+            "INSERT INTO audits (root, report_path, report, created) "
+            "VALUES (?, ?, ?, ?)",
+            (root, report_path, report, time.time()),
+        )
+        return cur.lastrowid
+
+    def _audit(self, where: str, params: tuple) -> Optional[Dict[str, Any]]:
+        row = (
+            self._conn()
+            .execute(
+                "SELECT id, root, report_path, report, created FROM audits " + where,
+                params,
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        keys = ("id", "root", "report_path", "report", "created")
+        return dict(zip(keys, row))
+
+    def get_audit(self, audit_id: int) -> Optional[Dict[str, Any]]:
+        return self._audit("WHERE id = ?", (audit_id,))
+
+    def latest_audit(self) -> Optional[Dict[str, Any]]:
+        return self._audit("ORDER BY id DESC LIMIT 1", ())
@@ -18,9 +18,21 @@ def create_role(tmpdir: Path):
     return tmpdir
 
 
+def isolated_config(tmp_path: Path) -> dict:
+    """The repo config with state, findings and caches moved under ``tmp_path``."""
+
+    config = yaml.safe_load(Path("config/config.yml").read_text())
+    state = tmp_path / "state"
+    config["state"] = {"path": str(state / "agent.db")}
+    config["findings"] = {"path": str(state / "findings.db")}
+    for check in ("near_duplicates", "script_syntax", "reachability"):
+        config["audit"][check]["cache"] = str(state / f"{check}.json")
+    return config
+
+
 def test_agent_generates_report(tmp_path):
     tmpdir = create_role(tmp_path)
-    config = yaml.safe_load(Path("config/config.yml").read_text())
+    config = isolated_config(tmp_path)
     agent = AuditAgent(str(tmpdir), config)
     report_file = tmpdir / "out.md"
     report = agent.run(str(report_file))
@@ -41,7 +53,7 @@ def test_agent_lists_playbooks(tmp_path):
     - sample
 """
     )
-    config = yaml.safe_load(Path("config/config.yml").read_text())
+    config = isolated_config(tmp_path)
     agent = AuditAgent(str(tmpdir), config)
     report_file = tmpdir / "out.md"
     report = agent.run(str(report_file))
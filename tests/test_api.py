@@ -1,14 +1,29 @@
-import os
+import shutil
+import sys
 from pathlib import Path
 
+import pytest
 import yaml
 from fastapi.testclient import TestClient
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
 import api.server as server
+from utils.shared_state import STATE_ENV
 
+REPO = Path(__file__).resolve().parent.parent
 
-def setup_module(module):
-    os.environ["AGENT_API_KEY"] = "test"
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path, monkeypatch):
+    """Run the app from a scratch directory so its state stays out of the checkout."""
+
+    workdir = tmp_path / "cwd"
+    (workdir / "config").mkdir(parents=True)
+    shutil.copy(REPO / "config" / "config.yml", workdir / "config" / "config.yml")
+    monkeypatch.setenv("AGENT_API_KEY", "test")
+    monkeypatch.delenv(STATE_ENV, raising=False)
+    monkeypatch.chdir(workdir)
+    return workdir
 
 
 def setup_function(function):
@@ -53,3 +68,71 @@ def test_rate_limit(tmp_path):
             "/audit", params={"root": str(tmp_path)}, headers={"x-api-key": "test"}
         )
         assert r.status_code == 429
+
+
+def test_audit_quota_returns_truncated_result(tmp_path):
+    for i in range(5):
+        (tmp_path / "roles" / f"r{i}" / "tasks").mkdir(parents=True)
+        (tmp_path / "roles" / f"r{i}" / "tasks" / "main.yml").write_text("- ping:\n")
+
+    with TestClient(server.app) as client:
+        headers = {"x-api-key": "test"}
+        resp = client.post("/audit", params={"root": str(tmp_path)}, headers=headers)
+        assert resp.json()["truncated"] is False
+        resp = client.post(
+            "/audit",
+            params={"root": str(tmp_path), "max_files": 2},
+            headers=headers,
+        )
+        body = resp.json()
+        assert resp.status_code == 200
+        assert body["truncated"] is True
+        assert body["reason"] == "file limit of 2 reached"
+        assert body["usage"]["files"] == 2
+        assert "## ⏱ Truncated" in Path(body["report"]).read_text()
+        resp = client.post(
+            "/audit", params={"root": str(tmp_path), "deadline": 0}, headers=headers
+        )
+        assert resp.status_code == 422
+
+
+def test_audit_results_are_shared(tmp_path):
+    (tmp_path / "roles").mkdir()
+
+    with TestClient(server.app) as client:
+        resp = client.post(
+            "/audit", params={"root": str(tmp_path)}, headers={"x-api-key": "test"}
+        )
+        audit_id = resp.json()["id"]
+        # A second worker would read the same row from the shared state file.
+        assert Path(server.state.path).resolve().is_relative_to(tmp_path)
+        other = server.SharedState(server.state.path)
+        assert other.get_audit(audit_id)["root"] == str(tmp_path)
+        resp = client.get(f"/audits/{audit_id}", headers={"x-api-key": "test"})
+        assert resp.status_code == 200
+        assert "## ✅ Valid Items" in resp.json()["report"]
+        other.close()
+
+
+def test_findings_endpoint(tmp_path):
+    role = tmp_path / "roles" / "demo"
+    (role / "tasks").mkdir(parents=True)
+    (role / "tasks" / "main.yml").write_text("- debug:\n    msg: '{{ nope }}'\n")
+
+    with TestClient(server.app) as client:
+        run = client.post(
+            "/audit", params={"root": str(tmp_path)}, headers={"x-api-key": "test"}
+        ).json()["run"]
+        resp = client.get(
+            "/findings",
+            params={"run": run, "rule": "undefined_variable", "role": "demo"},
+            headers={"x-api-key": "test"},
+        )
+        assert resp.status_code == 200
+        assert [i["message"] for i in resp.json()["items"]] == [
+            "undefined variable 'nope'"
+        ]
+        bad = client.get(
+            "/findings", params={"status": "bogus"}, headers={"x-api-key": "test"}
+        )
+        assert bad.status_code == 400
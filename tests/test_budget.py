@@ -0,0 +1,103 @@
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+import yaml
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from agent.audit_agent import AuditAgent
+from agent.budget import AuditBudget, BudgetExceeded
+from agent.near_duplicates import candidate_files
+from agent.reachability import build_index
+
+
+def create_roles(root: Path, count: int) -> None:
+    for i in range(count):
+        tasks = root / "roles" / f"role{i:02}" / "tasks"
+        tasks.mkdir(parents=True)
+        (tasks / "main.yml").write_text("- debug:\n    msg: '{{ missing }}'\n")
+
+
+def test_budget_limits(tmp_path):
+    path = tmp_path / "f.yml"
+    path.write_text("x" * 100)
+    budget = AuditBudget(max_files=1, max_bytes=150)
+    budget.charge(str(path))
+    budget.charge(str(path))  # charged once however often it is read
+    assert budget.usage()["files"] == 1
+    with pytest.raises(BudgetExceeded, match="file limit of 1"):
+        budget.charge(str(tmp_path / "other.yml"))
+
+    budget = AuditBudget(deadline=0)
+    with pytest.raises(BudgetExceeded, match="deadline"):
+        budget.checkpoint()
+
+
+def test_cancel_from_another_thread():
+    budget = AuditBudget()
+    thread = threading.Thread(target=budget.cancel, args=("client disconnected",))
+    thread.start()
+    thread.join()
+    with pytest.raises(BudgetExceeded) as exc:
+        budget.checkpoint()
+    assert exc.value.reason == "client disconnected"
+
+
+def test_agent_writes_truncated_partial_report(tmp_path):
+    create_roles(tmp_path, 10)
+    config = yaml.safe_load(Path("config/config.yml").read_text())
+    config["findings"] = {"path": str(tmp_path / "findings.db")}
+    agent = AuditAgent(str(tmp_path), config, budget=AuditBudget(max_files=3))
+    report = Path(agent.run(str(tmp_path / "out.md"))).read_text()
+
+    assert agent.truncated == "file limit of 3 reached"
+    assert report.startswith("## ⏱ Truncated\n- Stopped early: file limit of 3")
+    assert "roles/role00" in report
+    assert "roles/role09" not in report
+    # Partial runs are not stored, so they never show up as fixed findings.
+    assert agent.run_id is None
+
+
+class ExpiringBudget(AuditBudget):
+    """Deadline that passes after a fixed number of checkpoints."""
+
+    def __init__(self, checkpoints: int) -> None:
+        super().__init__(deadline=60)
+        self.remaining = checkpoints
+
+    def checkpoint(self) -> None:
+        self.remaining -= 1
+        if self.remaining == 0:
+            self.started -= 120
+        super().checkpoint()
+
+
+def test_deadline_expires_while_walking_unmatched_files(tmp_path):
+    files = tmp_path / "roles" / "blobs" / "files"
+    files.mkdir(parents=True)
+    for i in range(2000):
+        (files / f"{i}.bin").write_bytes(b"")
+    config = yaml.safe_load(Path("config/config.yml").read_text())
+    config["findings"] = {"path": str(tmp_path / "findings.db")}
+    budget = ExpiringBudget(500)
+    agent = AuditAgent(str(tmp_path), config, budget=budget)
+    report = Path(agent.run(str(tmp_path / "out.md"))).read_text()
+
+    # Nothing is charged, yet the deadline still stops the walk.
+    assert budget.files == 0
+    assert agent.truncated == "deadline of 60s exceeded"
+    assert report.startswith("## ⏱ Truncated")
+    assert agent.run_id is None
+
+
+def test_index_and_candidate_walks_check_the_budget(tmp_path):
+    create_roles(tmp_path, 2)
+    (tmp_path / "site.yml").write_text("- hosts: all\n  roles: [role00]\n")
+    with pytest.raises(BudgetExceeded):
+        build_index(str(tmp_path), ["site.yml"], {}, AuditBudget(deadline=0))
+    with pytest.raises(BudgetExceeded):
+        candidate_files(str(tmp_path), AuditBudget(deadline=0))
+    budget = AuditBudget()
+    build_index(str(tmp_path), ["site.yml"], {}, budget)
+    assert budget.files == 2
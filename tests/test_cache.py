@@ -0,0 +1,129 @@
+import json
+import multiprocessing
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+import utils.cache as cache_module
+from utils.cache import CacheView, JsonFileCache, ShardedCache
+
+
+def _fill(path, worker, count):
+    cache = ShardedCache(path, shards=2)
+    for i in range(count):
+        cache.set(f"w{worker}-{i}", [worker, i])
+
+
+def test_concurrent_writers_lose_nothing(tmp_path):
+    path = str(tmp_path / "cache")
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_fill, args=(path, w, 50)) for w in range(4)]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join(timeout=60)
+        assert proc.exitcode == 0
+    entries = dict(ShardedCache(path, shards=2).items())
+    assert len(entries) == 200
+    assert entries["w3-49"] == [3, 49]
+    assert not list(Path(path).glob("*.tmp"))
+
+
+def test_counters_and_cross_instance_visibility(tmp_path):
+    a = ShardedCache(str(tmp_path / "c"))
+    b = ShardedCache(str(tmp_path / "c"))
+    assert a.get("k") is None
+    a.set("k", {"v": 1})
+    assert b.get("k") == {"v": 1}
+    a.set("k", {"v": 2})
+    assert b.get("k") == {"v": 2}
+    assert "k" in b and "other" not in b
+    assert b.stats["hits"] == 3 and b.stats["misses"] == 1
+    assert a.stats["misses"] == 1 and a.stats["writes"] == 2
+
+
+def test_ttl_expiry(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+    cache = ShardedCache(str(tmp_path / "c"), ttl=60)
+    cache.set("old", 1)
+    now[0] += 61
+    assert cache.get("old") is None
+    assert cache.stats["expired"] == 1
+    cache.set("new", 2)
+    assert dict(cache.items()) == {"new": 2}
+
+
+def test_size_eviction_drops_oldest(tmp_path, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+    cache = ShardedCache(str(tmp_path / "c"), shards=1, max_bytes=2000)
+    for i in range(40):
+        now[0] += 1
+        cache.set(f"key{i}", f"{i:03d}" + "x" * 100)
+    assert cache.stats["evictions"] > 0
+    assert (tmp_path / "c" / "000.seg").stat().st_size <= 2000
+    assert cache.get("key39") is not None
+    assert cache.get("key0") is None
+
+
+def test_json_file_cache_api_and_migration(tmp_path):
+    legacy = tmp_path / "cache.json"
+    legacy.write_text(json.dumps({"a": [1, 2]}, indent=2))
+    cache = JsonFileCache(str(legacy))
+    assert not legacy.exists()
+    # The original file is kept, and not imported again.
+    migrated = tmp_path / "cache.json.migrated"
+    assert json.loads(migrated.read_text()) == {"a": [1, 2]}
+    assert cache.read() == {"a": [1, 2]}
+
+    writes = cache.stats["writes"]
+    cache.write({"a": [1, 2], "b": "x"})
+    # Only the segment holding the new key is rewritten.
+    assert cache.stats["writes"] == writes + 1
+    cache.write({"b": "x"})
+    assert JsonFileCache(str(legacy)).read() == {"b": "x"}
+    assert not legacy.exists()
+
+    # update() never deletes keys another writer added after our read.
+    snapshot = cache.read()
+    JsonFileCache(str(legacy)).set("other", 1)
+    snapshot["c"] = 2
+    cache.update({k: v for k, v in snapshot.items() if k != "b"})
+    assert cache.read() == {"b": "x", "c": 2, "other": 1}
+
+
+def test_concurrent_migration_is_tolerated(tmp_path, monkeypatch):
+    # Another process renamed the legacy file between our check and rename.
+    monkeypatch.setattr(cache_module.os.path, "isfile", lambda path: True)
+    cache = JsonFileCache(str(tmp_path / "gone.json"))
+    assert cache.read() == {}
+
+
+def test_cache_view_loads_only_touched_segments(tmp_path):
+    path = str(tmp_path / "c")
+    ShardedCache(path, shards=16).update({f"k{i}": i for i in range(200)})
+    cache = ShardedCache(path, shards=16)
+    view = CacheView(cache)
+    assert view["k7"] == 7 and "missing" not in view
+    assert view.get("k8") == 8
+    assert len(cache._memory) <= 3
+
+    view["new"] = 1
+    del view["k7"]
+    assert "k7" not in view and list(view) == ["new"]
+    ShardedCache(path, shards=16).set("other", 2)
+    view.flush()
+    entries = dict(ShardedCache(path, shards=16).items())
+    assert entries["new"] == 1 and entries["other"] == 2
+    assert "k7" not in entries and len(entries) == 201
+
+
+def test_corrupt_segment_reads_empty(tmp_path):
+    cache = ShardedCache(str(tmp_path / "c"), shards=1)
+    cache.set("a", 1)
+    (tmp_path / "c" / "000.seg").write_bytes(b"\x00garbage")
+    fresh = ShardedCache(str(tmp_path / "c"), shards=1)
+    assert fresh.get("a") is None
+    fresh.set("b", 2)
+    assert dict(fresh.items()) == {"b": 2}
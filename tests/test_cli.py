@@ -1,13 +1,24 @@
+import json
+import os
+import subprocess
 import sys
 from pathlib import Path
 
+import yaml
+
 import src.cli as cli
-from tests.test_agent import create_role
+from tests.test_agent import create_role, isolated_config
+
+
+def write_config(tmp_path: Path) -> Path:
+    path = tmp_path / "config.yml"
+    path.write_text(yaml.safe_dump(isolated_config(tmp_path)))
+    return path
 
 
 def test_cli_run(tmp_path, monkeypatch):
     tmpdir = create_role(tmp_path)
-    config = Path("config/config.yml")
+    config = write_config(tmp_path)
     monkeypatch.setattr(
         sys,
         "argv",
@@ -20,7 +31,7 @@ def test_cli_run(tmp_path, monkeypatch):
 def test_cli_run_custom_report(tmp_path, monkeypatch):
     tmpdir = create_role(tmp_path)
     report = tmpdir / "custom.md"
-    config = Path("config/config.yml")
+    config = write_config(tmp_path)
     monkeypatch.setattr(
         sys,
         "argv",
@@ -39,18 +50,106 @@ def test_cli_run_custom_report(tmp_path, monkeypatch):
     assert report.is_file()
 
 
-def test_cli_serve(monkeypatch):
+def test_cli_serve(tmp_path, monkeypatch):
+    config = Path("config/config.yml").resolve()
+    # setenv records an undo, so the path cmd_serve exports does not leak.
+    monkeypatch.setenv("AGENT_STATE_DB", "")
+    monkeypatch.chdir(tmp_path)
     monkeypatch.setattr(
         sys,
         "argv",
-        ["cli.py", "serve", "--host", "127.0.0.1", "--port", "9999"],
+        [
+            "cli.py",
+            "serve",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            "9999",
+            "--config",
+            str(config),
+        ],
     )
     called = {}
 
-    def fake_run(app, host="", port=0):
+    def fake_run(app, host="", port=0, workers=1):
         called["host"] = host
         called["port"] = port
+        called["workers"] = workers
 
     monkeypatch.setattr("uvicorn.run", fake_run)
     cli.main()
-    assert called == {"host": "127.0.0.1", "port": 9999}
+    assert called == {"host": "127.0.0.1", "port": 9999, "workers": 1}
+    assert os.environ["AGENT_STATE_DB"] == str(tmp_path / "state" / "agent.db")
+
+
+HEAVY_MODULES = {"fastapi", "starlette", "uvicorn", "httpx", "pydantic"}
+
+
+def _import_times(stderr: str):
+    """Return ``(cumulative_us, name)`` for top-level imports after startup."""
+
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        rows.append((int(cumulative), name[1:]))
+    start = max(i for i, (_, name) in enumerate(rows) if name == "site") + 1
+    return rows, [(us, name) for us, name in rows[start:] if not name.startswith(" ")]
+
+
+def test_cli_run_import_budget(tmp_path):
+    tmpdir = create_role(tmp_path)
+    env = dict(os.environ, LOG_DIR=str(tmp_path / "logs"))
+    env["AGENT_CACHE_DIR"] = str(tmp_path / "cache")
+    cmd = [
+        sys.executable,
+        "-X",
+        "importtime",
+        "validate.py",
+        "run",
+        "--root",
+        str(tmpdir),
+        "--report",
+        str(tmpdir / "report.md"),
+        "--config",
+        str(write_config(tmp_path)),
+    ]
+    # First call fills the config cache; the budget applies to warm runs.
+    subprocess.run(cmd, env=env, check=True, capture_output=True, text=True)
+    result = subprocess.run(cmd, env=env, check=True, capture_output=True, text=True)
+
+    rows, top_level = _import_times(result.stderr)
+    imported = {name.strip().split(".")[0] for _, name in rows}
+    assert not imported & HEAVY_MODULES
+    budget_ms = float(os.environ.get("CLI_IMPORT_BUDGET_MS", "150"))
+    assert sum(us for us, _ in top_level) / 1000 < budget_ms
+
+
+def test_pdns_modules_import_httpx_lazily():
+    code = (
+        "import sys; import pdns.file_sd, pdns.dnsdist_sim; "
+        "print(sorted(m for m in {'httpx', 'fastapi'} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd="src",
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    assert result.stdout.strip() == "[]"
+
+
+def test_cli_query(tmp_path, monkeypatch, capsys):
+    tmpdir = create_role(tmp_path)
+    config_path = write_config(tmp_path)
+    for command in (["run", "--root", str(tmpdir)], ["query", "--rule", "missing_dir"]):
+        capsys.readouterr()
+        monkeypatch.setattr(
+            sys, "argv", ["cli.py", *command, "--config", str(config_path)]
+        )
+        cli.main()
+    page = json.loads(capsys.readouterr().out)
+    assert page["items"]
+    assert {item["rule"] for item in page["items"]} == {"missing_dir"}
@@ -0,0 +1,203 @@
+import ipaddress
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+import src.cli as cli
+from pdns.dnsdist_sim import parse_config, read_queries, render_config, simulate
+from pdns.file_sd import load_inventory
+
+CONF = r"""
+-- comment: addAction(AllRule(), DropAction())
+newServer({address='10.0.0.1:53', name='a1', pool='auth', weight=10})
+newServer({address='10.0.0.2:53', name='a2', pool='auth', weight=5})
+newServer({address='10.0.1.1:53', name='r1', pool='rec'})
+setServerPolicy(roundrobin)
+
+function limitPolicy(servers, dq)
+    if dq then
+        addAction(AllRule(), DropAction())
+    end
+    return servers[1]
+end
+
+addAction(MaxQPSIPRule(5), DropAction())
+addAction(MaxQPSRule(100, 200), DropAction())
+addAction(RegexRule('.*\\.onion$'), DropAction())
+addPoolRule({'example.com', 'lab.local.'}, 'auth')
+addAction(AllRule(), LogAction('/tmp/q.log'))
+addAction(AllRule(), PoolAction('rec'))
+addAction(QNameRule('never.example'), DropAction())
+"""
+
+
+def batch(rows):
+    return [
+        ([r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows]),
+    ]
+
+
+def test_parse_config():
+    config = parse_config(CONF)
+    assert [b.name for b in config.backends] == ["a1", "a2", "r1"]
+    assert config.backends[1].weight == 5
+    assert config.policy == "roundrobin"
+    assert "limitPolicy" in config.functions
+    kinds = [(r.kind, r.action) for r in config.rules]
+    assert kinds == [
+        ("qps_ip", "drop"),
+        ("qps", "drop"),
+        ("regex", "drop"),
+        ("suffix", "pool"),
+        ("all", "continue"),
+        ("all", "pool"),
+        ("qname", "drop"),
+    ]
+    assert config.rules[1].params == {"qps": 100.0, "burst": 200.0}
+    assert config.rules[2].params["regex"].pattern == r".*\.onion$"
+    assert config.rules[3].params["names"] == {"example.com", "lab.local"}
+    assert config.rules[0].line == 15
+    assert config.shadowed() == [6]
+
+
+def test_rate_limits_and_routing():
+    config = parse_config(CONF)
+    rows = [(1000.0 + i * 0.01, "192.0.2.1", "www.example.com") for i in range(20)]
+    rows += [(1000.2, "192.0.2.2", "x.onion"), (1000.3, "192.0.2.3", "google.com")]
+    rows += [(1001.5, "192.0.2.1", "lab.local")]
+    result = simulate(config, batch(sorted(rows)))
+
+    # Burst of 5, then refilled at 5 qps: 1.5s later 5 more tokens.
+    drops = {r["rule"]: r["drops"] for r in result["rules"]}
+    assert drops["addAction(MaxQPSIPRule(5), DropAction())"] == 15
+    assert drops["addAction(RegexRule('.*\\\\.onion$'), DropAction())"] == 1
+    assert result["dropped"] == 16
+    assert result["pools"] == {
+        "auth": {"queries": 6, "no_backend": 0},
+        "rec": {"queries": 1, "no_backend": 0},
+    }
+    assert result["backends"]["a1"]["queries"] == 3
+    assert result["backends"]["a2"]["queries"] == 3
+    top = result["clients"]["top"][0]
+    assert top["client"] == "192.0.2.1" and top["dropped"] == 15
+    assert result["clients"]["throttled"] == 2
+
+    config.override_limits(per_ip=100)
+    assert simulate(config, batch(sorted(rows)))["dropped"] == 1
+
+
+def test_least_outstanding_and_default_pool():
+    config = parse_config(
+        "newServer({address='10.0.0.1', name='slow', pool='p'})\n"
+        "newServer({address='10.0.0.2', name='fast', pool='p'})\n"
+        "addAction('example.com', PoolAction('p'))\n"
+    )
+    rows = [(i * 0.001, "198.51.100.1", "example.com") for i in range(1000)]
+    rows.append((2.0, "198.51.100.1", "other.org"))
+    result = simulate(config, batch(rows), latency_ms={"slow": 10.0, "fast": 1.0})
+    assert result["model"] == "leastOutstanding"
+    assert result["backends"]["fast"]["queries"] > result["backends"]["slow"]["queries"]
+    assert result["backends"]["slow"]["peak_outstanding"] <= 10
+    # Nothing matched other.org, so it went to the empty default pool.
+    assert result["no_backend"] == 1
+
+
+def test_repo_template_rules_are_shadowed():
+    text = render_config(
+        "roles/dnsdist/templates/dnsdist.conf.j2",
+        load_inventory(["inventory/hosts.yml"]),
+    )
+    config = parse_config(text)
+    assert len(config.backends) == 4
+    assert config.policy == "latencyAwarePolicy"
+    rules = {r.kind: r for r in config.rules}
+    assert rules["qps_ip"].params["qps"] == 50.0
+    assert rules["qps_ip"].index in config.shadowed()
+    result = simulate(config, batch([(0.0, "192.0.2.1", "www.example.com")]))
+    assert result["model"] == "latencyAware"
+    assert any("never run" in note for note in result["notes"])
+
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        out.append(byte | (0x80 if value else 0))
+        if not value:
+            return bytes(out)
+
+
+def _field(number, wire, payload):
+    key = _varint(number << 3 | wire)
+    if wire == 0:
+        return key + _varint(payload)
+    if wire == 2:
+        return key + _varint(len(payload)) + payload
+    return key + payload
+
+
+def _dnstap_query(sec, client, qname, kind=5):
+    wire = b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00"
+    for label in qname.split("."):
+        wire += bytes([len(label)]) + label.encode()
+    wire += b"\x00\x00\x01\x00\x01"
+    message = (
+        _field(1, 0, kind)
+        + _field(4, 2, ipaddress.ip_address(client).packed)
+        + _field(8, 0, sec)
+        + _field(9, 5, (500_000_000).to_bytes(4, "little"))
+        + _field(10, 2, wire)
+    )
+    frame = _field(15, 0, 1) + _field(14, 2, message)
+    return len(frame).to_bytes(4, "big") + frame
+
+
+def test_dnstap_reader(tmp_path):
+    # Frame Streams START control frame.
+    control = (2).to_bytes(4, "big")
+    stream = b"\x00\x00\x00\x00" + (4).to_bytes(4, "big") + control
+    stream += _dnstap_query(1700000000, "192.0.2.7", "WWW.Example.com")
+    stream += _dnstap_query(1700000001, "2001:db8::1", "a.b", kind=6)
+    stream += _dnstap_query(1700000002, "2001:db8::1", "lab.local")
+    path = tmp_path / "queries.fstrm"
+    path.write_bytes(stream)
+    [(times, clients, qnames)] = list(read_queries(str(path)))
+    assert times == [1700000000.5, 1700000002.5]
+    assert clients == ["192.0.2.7", "2001:db8::1"]
+    assert qnames == ["www.example.com", "lab.local"]
+
+
+def test_cli_simulate(tmp_path, monkeypatch):
+    conf = tmp_path / "dnsdist.conf"
+    conf.write_text(CONF)
+    log = tmp_path / "queries.csv"
+    log.write_text(
+        "qname,client,timestamp\n"
+        + "".join("example.com.,192.0.2.1,2024-01-01T00:00:00Z\n" for _ in range(8))
+    )
+    out = tmp_path / "sim.json"
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "cli.py",
+            "simulate",
+            "--config",
+            "config/config.yml",
+            "--dnsdist-conf",
+            str(conf),
+            "--queries",
+            str(log),
+            "--max-qps-per-ip",
+            "2",
+            "--out",
+            str(out),
+        ],
+    )
+    cli.main()
+    result = json.loads(out.read_text())
+    assert result["queries"] == 8
+    assert result["dropped"] == 6
+    assert result["rules"][0]["qps"] == 2.0
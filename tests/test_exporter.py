@@ -0,0 +1,110 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from pdns.exporter import StatsExporter, Target, parse_stats
+
+AUTH_STATS = [
+    {"name": "udp-queries", "type": "StatisticItem", "value": "1234"},
+    {"name": "uptime", "type": "StatisticItem", "value": "60"},
+    {
+        "name": "response-by-qtype",
+        "type": "MapStatisticItem",
+        "value": [{"name": "A", "value": "10"}, {"name": "AAAA", "value": "2"}],
+    },
+    {"name": "remotes", "type": "RingStatisticItem", "value": []},
+]
+DNSDIST_STATS = {
+    "queries": 99,
+    "latency-avg100": 0.5,
+    "server-policy": "leastOutstanding",
+}
+
+
+def stub_transport(calls):
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.host)
+        if request.url.host == "down.test":
+            return httpx.Response(500)
+        if request.url.path == "/jsonstat":
+            return httpx.Response(200, json=DNSDIST_STATS)
+        return httpx.Response(200, json=AUTH_STATS)
+
+    return httpx.MockTransport(handler)
+
+
+def make_exporter(calls, min_interval=60.0):
+    return StatsExporter(
+        [
+            Target("auth1", "auth", "http://auth.test"),
+            Target("dd1", "dnsdist", "http://dnsdist.test"),
+            Target("rec1", "recursor", "http://down.test"),
+        ],
+        min_interval=min_interval,
+        transport=stub_transport(calls),
+    )
+
+
+def test_parse_stats_flattens_maps():
+    samples = parse_stats("auth", AUTH_STATS)
+    assert ("udp-queries", None, 1234.0) in samples
+    assert ("response-by-qtype", "AAAA", 2.0) in samples
+    assert len(samples) == 4
+    assert parse_stats("dnsdist", DNSDIST_STATS) == [
+        ("queries", None, 99.0),
+        ("latency-avg100", None, 0.5),
+    ]
+
+
+def test_metrics_render_and_cache():
+    calls = []
+
+    async def scenario():
+        exporter = make_exporter(calls)
+        try:
+            first, second = await asyncio.gather(exporter.metrics(), exporter.metrics())
+            third = await exporter.metrics()
+        finally:
+            await exporter.close()
+        return first, second, third
+
+    first, second, third = asyncio.run(scenario())
+    text = first.decode()
+    assert first == second == third
+    assert sorted(calls) == ["auth.test", "dnsdist.test", "down.test"]
+    assert "# TYPE powerdns_auth_udp_queries counter" in text
+    assert "# TYPE powerdns_auth_uptime gauge" in text
+    assert 'powerdns_auth_udp_queries{instance="auth1"} 1234' in text
+    assert 'powerdns_auth_response_by_qtype{instance="auth1",key="A"} 10' in text
+    assert 'dnsdist_latency_avg100{instance="dd1"} 0.5' in text
+    assert 'pdns_exporter_up{instance="rec1"} 0' in text
+    assert text.count("# TYPE powerdns_auth_udp_queries") == 1
+
+
+def test_http_endpoint_keeps_connection_alive():
+    calls = []
+
+    async def scenario():
+        exporter = make_exporter(calls, min_interval=0)
+        server = await exporter.serve("127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+                ok = await client.get("/metrics")
+                again = await client.get("/metrics")
+                missing = await client.get("/nope")
+        finally:
+            server.close()
+            await server.wait_closed()
+            await exporter.close()
+        return ok, again, missing
+
+    ok, again, missing = asyncio.run(scenario())
+    assert ok.status_code == 200
+    assert ok.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "powerdns_auth_udp_queries" in again.text
+    assert missing.status_code == 404
+    assert len(calls) == 6
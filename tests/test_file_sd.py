@@ -0,0 +1,130 @@
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+import src.cli as cli
+from pdns.file_sd import generate, hashmod, load_inventory
+
+INVENTORY = """
+all:
+  vars:
+    node_exporter_port: 9100
+  children:
+    powerdns_primary:
+      hosts:
+        ns1:
+          ansible_host: 10.0.0.1
+    powerdns_secondary:
+      vars:
+        powerdns_exporter_port: 9200
+      hosts:
+        ns2:
+          ansible_host: 10.0.0.2
+        ns3:
+          ansible_host: 10.0.0.3
+    powerdns_recursor:
+      hosts:
+        rec1:
+          ansible_host: 10.0.1.1
+"""
+
+JOBS = {
+    "auth": {
+        "groups": ["powerdns_primary", "powerdns_secondary"],
+        "port": 9120,
+        "port_var": "powerdns_exporter_port",
+    },
+    "node": {"groups": ["all"], "port": 9000, "port_var": "node_exporter_port"},
+}
+
+
+def targets(root: Path, job: str) -> dict:
+    found = {}
+    for shard in sorted(root.glob(f"{job}/*.json")):
+        for group in json.loads(shard.read_text()):
+            found[group["targets"][0]] = group["labels"]
+    return found
+
+
+def test_inventory_and_shards(tmp_path):
+    (tmp_path / "hosts.yml").write_text(INVENTORY)
+    inventory = load_inventory([str(tmp_path / "hosts.yml")])
+    assert sorted(inventory.groups["all"]) == ["ns1", "ns2", "ns3", "rec1"]
+
+    out = tmp_path / "sd"
+    summary = generate(inventory, str(out), JOBS, shards=3)
+    assert summary["targets"] == {"auth": 3, "node": 4}
+    assert summary["written"] == 6
+    assert len(list((out / "auth").glob("*.json"))) == 3
+    auth = targets(out, "auth")
+    assert auth["10.0.0.1:9120"] == {"host": "ns1", "group": "powerdns_primary"}
+    assert "10.0.0.2:9200" in auth
+    assert set(targets(out, "node")) == {
+        "10.0.0.1:9100",
+        "10.0.0.2:9100",
+        "10.0.0.3:9100",
+        "10.0.1.1:9100",
+    }
+
+
+def test_only_changed_shards_rewritten(tmp_path):
+    (tmp_path / "hosts.yml").write_text(INVENTORY)
+    out = tmp_path / "sd"
+    generate(load_inventory([str(tmp_path / "hosts.yml")]), str(out), JOBS, shards=4)
+    again = generate(
+        load_inventory([str(tmp_path / "hosts.yml")]), str(out), JOBS, shards=4
+    )
+    assert again["written"] == 0 and again["unchanged"] == 8
+
+    (tmp_path / "hosts.yml").write_text(INVENTORY.replace("10.0.1.1", "10.0.1.9"))
+    changed = generate(
+        load_inventory([str(tmp_path / "hosts.yml")]), str(out), JOBS, shards=4
+    )
+    # Moving one node-exporter target touches at most two of its shards.
+    assert 1 <= changed["written"] <= 2
+    assert "10.0.1.9:9100" in targets(out, "node")
+
+    fewer = generate(
+        load_inventory([str(tmp_path / "hosts.yml")]), str(out), JOBS, shards=2
+    )
+    assert fewer["removed"] == 4
+    assert not (out / "auth" / "003.json").exists()
+
+
+def test_replicas_split_targets_with_hashmod(tmp_path):
+    # Low 64 bits of MD5, big-endian, as in Prometheus' relabel hashmod.
+    assert hashmod("10.0.0.1:9100", 10**19) == 5548061184049187645
+    (tmp_path / "hosts.yml").write_text(INVENTORY)
+    out = tmp_path / "sd"
+    generate(load_inventory([str(tmp_path / "hosts.yml")]), str(out), JOBS, replicas=2)
+    first = targets(out / "replica-0", "node")
+    second = targets(out / "replica-1", "node")
+    assert not set(first) & set(second)
+    assert len(first) + len(second) == 4
+    for address in first:
+        assert hashmod(address, 2) == 0
+
+
+def test_cli_targets(tmp_path, monkeypatch):
+    (tmp_path / "hosts.yml").write_text(INVENTORY)
+    out = tmp_path / "sd"
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "cli.py",
+            "targets",
+            "--config",
+            "config/config.yml",
+            "--inventory",
+            str(tmp_path / "hosts.yml"),
+            "--out",
+            str(out),
+            "--shards",
+            "2",
+        ],
+    )
+    cli.main()
+    assert len(list((out / "powerdns-auth").glob("*.json"))) == 2
+    assert (out / ".manifest.json").is_file()
@@ -0,0 +1,82 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from agent.audit_agent import AuditAgent
+from agent.findings_store import FindingsStore
+from tests.test_agent import isolated_config
+
+
+def finding(rule, file, message, role="web", severity="error"):
+    return {
+        "role": role,
+        "rule": rule,
+        "severity": severity,
+        "file": file,
+        "message": message,
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = FindingsStore(str(tmp_path / "findings.db"))
+    yield store
+    store.close()
+
+
+def test_filters_and_pagination(store):
+    findings = [
+        finding("placeholder", f"roles/web/templates/t{i}.j2", "contains 'TODO'")
+        for i in range(5)
+    ]
+    findings.append(finding("undefined_variable", "roles/db/tasks", "x", role="db"))
+    run = store.record_run("/repo", findings)
+
+    page = store.query(rule="placeholder", limit=2)
+    assert page["run"] == run
+    assert len(page["items"]) == 2
+    seen = [item["file"] for item in page["items"]]
+    while page["next_cursor"] is not None:
+        page = store.query(rule="placeholder", limit=2, cursor=page["next_cursor"])
+        seen.extend(item["file"] for item in page["items"])
+    assert len(seen) == 5
+
+    assert [i["role"] for i in store.query(role="db")["items"]] == ["db"]
+    assert len(store.query(file="roles/web/templates/")["items"]) == 5
+    assert store.query(file="roles/web/tasks")["items"] == []
+
+
+def test_run_to_run_diff(store):
+    kept = finding("placeholder", "roles/web/a.j2", "contains 'TODO'")
+    gone = finding("undefined_variable", "roles/web/tasks", "undefined variable 'x'")
+    added = finding("missing_dir", "roles/web/files", "Missing directory")
+    first = store.record_run("/repo", [kept, gone])
+    store.record_run("/other", [added])
+    second = store.record_run("/repo", [kept, added])
+
+    def rules(status):
+        return [i["rule"] for i in store.query(second, status=status)["items"]]
+
+    assert store.query(second, status="new")["base"] == first
+    assert rules("new") == ["missing_dir"]
+    assert rules("fixed") == ["undefined_variable"]
+    assert rules("unchanged") == ["placeholder"]
+    with pytest.raises(ValueError):
+        store.query(second, status="bogus")
+
+
+def test_agent_records_findings(tmp_path):
+    role = tmp_path / "roles" / "web"
+    (role / "tasks").mkdir(parents=True)
+    (role / "tasks" / "main.yml").write_text("- debug:\n    msg: '{{ missing }}'\n")
+    config = isolated_config(tmp_path)
+    agent = AuditAgent(str(tmp_path), config)
+    agent.run(str(tmp_path / "out.md"))
+
+    store = FindingsStore(config["findings"]["path"])
+    page = store.query(agent.run_id, role="web", rule="undefined_variable")
+    store.close()
+    assert [i["message"] for i in page["items"]] == ["undefined variable 'missing'"]
+    assert page["items"][0]["file"] == "roles/web/tasks"
@@ -0,0 +1,101 @@
+import asyncio
+import json
+import os
+import sys
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+import src.cli as cli
+from api.loadtest import percentile, process_rss, run_load, summarize
+from tests.test_agent import create_role
+
+
+def test_percentiles_and_rates():
+    ordered = [float(i) for i in range(1, 101)]
+    assert percentile(ordered, 50) == 50.0
+    assert percentile(ordered, 99) == 99.0
+    assert percentile([], 95) == 0.0
+
+    summary = summarize(
+        [("a", 200, 0.01), ("a", 429, 0.002), ("b", 500, 0.03), ("b", 0, 1.0)]
+    )
+    assert summary["errors"] == 2 and summary["rate_limited"] == 1
+    assert summary["rate_limited_rate"] == 0.25
+    assert summary["latency_ms"]["max"] == 1000.0
+
+
+def test_run_load_mix_and_concurrency():
+    seen = []
+    in_flight = [0, 0]
+
+    async def handler(request):
+        in_flight[0] += 1
+        in_flight[1] = max(in_flight[1], in_flight[0])
+        await asyncio.sleep(0.001)
+        in_flight[0] -= 1
+        seen.append((request.method, request.url.path, dict(request.url.params)))
+        assert request.headers["x-api-key"] == "k"
+        return httpx.Response(429 if len(seen) % 4 == 0 else 200)
+
+    mix = {
+        "audit": {"method": "post", "path": "/audit", "params": {"root": "{root}"}},
+        "report": {"path": "/report", "weight": 3},
+        "unused": {"path": "/nothing", "weight": 0},
+    }
+    summary = asyncio.run(
+        run_load(
+            "http://api",
+            mix,
+            concurrency=4,
+            requests=40,
+            api_key="k",
+            root="/srv",
+            transport=httpx.MockTransport(handler),
+        )
+    )
+    assert summary["requests"] == 40 and len(seen) == 40
+    assert summary["rate_limited"] == 10 and summary["errors"] == 0
+    assert set(summary["endpoints"]) == {"audit", "report"}
+    assert ("POST", "/audit", {"root": "/srv"}) in seen
+    assert summary["endpoints"]["report"]["requests"] > 20
+    assert in_flight[1] == 4
+
+
+def test_process_rss():
+    assert process_rss(os.getpid()) > 0
+
+
+def test_cli_loadtest_local_server(tmp_path, monkeypatch):
+    tmpdir = create_role(tmp_path)
+    out = tmp_path / "result.json"
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "cli.py",
+            "loadtest",
+            "--root",
+            str(tmpdir),
+            "--config",
+            "config/config.yml",
+            "--requests",
+            "20",
+            "--concurrency",
+            "4",
+            "--rate-limit",
+            "3",
+            "--out",
+            str(out),
+        ],
+    )
+    cli.main()
+    result = json.loads(out.read_text())
+    assert result["requests"] == 20
+    # Three tokens, then every request is throttled.
+    assert result["rate_limited"] == 17
+    assert result["overrides"] == {"rate_limit": {"max_calls": 3}}
+    assert result["rss"]["peak"] > 0
+    # The server audited a scratch copy; the tree itself is untouched.
+    assert not (tmpdir / "validation_report.md").exists()
@@ -0,0 +1,144 @@
+import sys
+from pathlib import Path
+
+import yaml
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+import agent.audit_agent as audit_agent
+from agent.audit_agent import AuditAgent
+from agent.near_duplicates import (
+    NearDuplicateFinder,
+    candidate_files,
+    shingles,
+    signature,
+    similarity,
+)
+from utils.cache import JsonFileCache
+
+
+def tasks(name: str, count: int = 12, extra: str = "") -> str:
+    lines = []
+    for i in range(count):
+        lines.append(
+            f"- name: Configure {name} step {i}\n"
+            f"  template:\n    src: {name}_{i}.conf.j2\n"
+            f"    dest: /etc/{name}/{i}.conf\n    mode: '0644'\n"
+        )
+    return "".join(lines) + extra
+
+
+def test_similarity_estimate():
+    base = tasks("pdns")
+    near = tasks("pdns", extra="- name: One more\n  debug:\n    msg: done\n")
+    other = tasks("haproxy").replace("template", "copy").replace("mode", "owner")
+    sig = signature(shingles(base))
+    assert similarity(sig, sig) == 1.0
+    assert similarity(sig, signature(shingles(near))) >= 0.8
+    assert similarity(sig, signature(shingles(other))) < 0.5
+
+
+def test_pair_just_above_threshold_is_found():
+    base = list(range(64))
+    # 12 of 64 bins differ (similarity 0.8125): every 8-row band has a
+    # difference, but four of the 4-row bands (36-39, 44-47, ...) match.
+    near = [
+        v + 1000 if i % 8 == 0 or i % 8 == 4 and i < 32 else v
+        for i, v in enumerate(base)
+    ]
+    assert similarity(base, near) == 0.8125
+
+    wide = NearDuplicateFinder(bands=8)
+    narrow = NearDuplicateFinder()
+    for finder in (wide, narrow):
+        finder.add_signature("a.yml", base)
+        finder.add_signature("b.yml", near)
+    assert wide.pairs() == []
+    assert narrow.pairs() == [("a.yml", "b.yml", 0.8125)]
+    assert narrow.candidate_probability(0.8) > 0.999
+    assert wide.candidate_probability(0.8) < 0.8
+
+
+def test_groups_and_cache(tmp_path):
+    cache = {}
+    finder = NearDuplicateFinder(cache=cache)
+    finder.add("roles/a/tasks/main.yml", tasks("pdns").encode())
+    finder.add("roles/b/tasks/main.yml", tasks("pdns").encode())
+    finder.add("roles/c/tasks/main.yml", tasks("pdns", extra="- meta: noop\n").encode())
+    finder.add("roles/d/tasks/main.yml", tasks("mysql", count=3).encode())
+    finder.add("roles/e/tasks/main.yml", b"- debug: {}\n")
+
+    groups = finder.groups()
+    assert len(groups) == 1
+    paths, low, high = groups[0]
+    assert paths == [f"roles/{r}/tasks/main.yml" for r in "abc"]
+    assert 0.8 <= low <= high == 1.0
+    # Identical content shares one cache entry; tiny files are cached as empty.
+    assert len(cache) == 4
+    assert [] in cache.values()
+
+    reused = NearDuplicateFinder(cache=cache)
+    for path in ("roles/a/tasks/main.yml", "roles/b/tasks/main.yml"):
+        reused.add(path, tasks("pdns").encode())
+    assert len(cache) == 4
+    assert reused.pairs() == [("roles/a/tasks/main.yml", "roles/b/tasks/main.yml", 1.0)]
+
+
+def test_cache_is_keyed_by_signature_parameters():
+    cache = {}
+    content = tasks("pdns", count=2).encode()
+    strict = NearDuplicateFinder(min_shingles=1000, cache=cache)
+    strict.add("a.yml", content)
+    assert strict.signatures == [] and list(cache.values()) == [[]]
+
+    relaxed = NearDuplicateFinder(min_shingles=5, cache=cache)
+    relaxed.add("a.yml", content)
+    assert len(relaxed.signatures) == 1
+    NearDuplicateFinder(shingle_size=3, min_shingles=5, cache=cache).add(
+        "a.yml", content
+    )
+    assert len(cache) == 3
+
+
+def test_agent_reports_near_duplicates(tmp_path):
+    for role in ("web", "web_copy"):
+        (tmp_path / "roles" / role / "tasks").mkdir(parents=True)
+        (tmp_path / "roles" / role / "tasks" / "main.yml").write_text(tasks("web"))
+    assert candidate_files(str(tmp_path)) == [
+        "roles/web/tasks/main.yml",
+        "roles/web_copy/tasks/main.yml",
+    ]
+    config = yaml.safe_load(Path("config/config.yml").read_text())
+    config["audit"]["near_duplicates"]["cache"] = str(tmp_path / "state" / "mh.json")
+    config["findings"] = {}
+    agent = AuditAgent(str(tmp_path), config)
+    report = Path(agent.run(str(tmp_path / "out.md"))).read_text()
+
+    assert "## ♻️ Near-Duplicate Files" in report
+    assert "roles/web/tasks/main.yml, roles/web_copy/tasks/main.yml" in report
+    assert list((tmp_path / "state" / "mh.json.d").glob("*.seg"))
+    rules = {f["rule"]: f for f in agent.findings}
+    assert rules["near_duplicate"]["role"] == "web"
+
+
+def test_agent_keeps_cache_entries_added_during_the_run(tmp_path, monkeypatch):
+    for role in ("web", "web_copy"):
+        (tmp_path / "roles" / role / "tasks").mkdir(parents=True)
+        (tmp_path / "roles" / role / "tasks" / "main.yml").write_text(tasks("web"))
+    path = str(tmp_path / "mh.json")
+
+    def racing_candidates(*args):
+        # Another audit stores a signature between our read and write.
+        JsonFileCache(path).set("other", [1, 2, 3])
+        return candidate_files(*args)
+
+    monkeypatch.setattr(audit_agent, "candidate_files", racing_candidates)
+    # Entries are looked up per key; the whole cache is never loaded.
+    monkeypatch.setattr(JsonFileCache, "read", None)
+    config = yaml.safe_load(Path("config/config.yml").read_text())
+    config["audit"]["near_duplicates"]["cache"] = path
+    config["findings"] = {}
+    AuditAgent(str(tmp_path), config).run(str(tmp_path / "out.md"))
+
+    entries = dict(JsonFileCache(path).items())
+    assert entries["other"] == [1, 2, 3]
+    assert len(entries) == 2
@@ -0,0 +1,133 @@
+import sys
+from pathlib import Path
+
+import yaml
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from agent.audit_agent import AuditAgent
+from agent.reachability import ReachabilityIndex, build_index
+from tests.test_agent import isolated_config
+
+
+def write(path: Path, data) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(yaml.safe_dump(data))
+
+
+def create_tree(root: Path) -> None:
+    write(
+        root / "site-playbook.yml",
+        [
+            {"import_playbook": "db.yml"},
+            {
+                "hosts": "all",
+                "roles": ["web", {"role": "app"}],
+                "post_tasks": [{"ansible.builtin.include_tasks": "tasks/check.yml"}],
+            },
+        ],
+    )
+    write(root / "db.yml", [{"hosts": "db", "roles": [{"role": "db"}]}])
+    write(root / "tasks" / "check.yml", [{"debug": {"msg": "ok"}}])
+    write(root / "tasks" / "unused.yml", [{"debug": {"msg": "unused"}}])
+    write(
+        root / "roles" / "web" / "tasks" / "main.yml",
+        [
+            {"block": [{"import_tasks": "install.yml"}]},
+            {"include_tasks": "os_{{ ansible_os_family }}.yml"},
+            {"include_role": {"name": "shared", "tasks_from": "setup"}},
+        ],
+    )
+    write(root / "roles" / "web" / "tasks" / "install.yml", [{"debug": {}}])
+    write(root / "roles" / "web" / "tasks" / "os_Debian.yml", [{"debug": {}}])
+    write(root / "roles" / "web" / "tasks" / "stale.yml", [{"debug": {}}])
+    write(root / "roles" / "web" / "handlers" / "main.yml", [{"name": "restart"}])
+    write(root / "roles" / "app" / "tasks" / "main.yml", [{"debug": {}}])
+    write(root / "roles" / "app" / "meta" / "main.yml", {"dependencies": ["lib"]})
+    write(root / "roles" / "lib" / "tasks" / "main.yml", [{"debug": {}}])
+    write(root / "roles" / "db" / "tasks" / "main.yml", [{"debug": {}}])
+    write(root / "roles" / "shared" / "tasks" / "setup.yml", [{"debug": {}}])
+    write(root / "roles" / "shared" / "tasks" / "main.yml", [{"debug": {}}])
+    write(root / "roles" / "legacy" / "tasks" / "main.yml", [{"debug": {}}])
+
+
+def test_index_follows_plays_roles_and_includes(tmp_path):
+    create_tree(tmp_path)
+    index = ReachabilityIndex(str(tmp_path)).build(["site-playbook.yml"])
+
+    assert index.playbooks == ["site-playbook.yml"]
+    assert sorted(index.roles) == ["app", "db", "lib", "shared", "web"]
+    assert index.roles["lib"] == ["roles/app"]
+    assert index.dead_roles() == ["legacy"]
+    assert index.dead_task_files() == [
+        "roles/shared/tasks/main.yml",
+        "roles/web/tasks/stale.yml",
+        "tasks/unused.yml",
+    ]
+    assert index.files["roles/web/handlers/main.yml"] == ["roles/web"]
+    assert index.is_live("roles/web/templates/x.j2")
+    assert not index.is_live(str(tmp_path / "roles" / "legacy" / "tasks" / "main.yml"))
+    assert not index.is_live("roles/web/tasks/stale.yml")
+
+
+def test_index_cache_reused_until_files_change(tmp_path):
+    create_tree(tmp_path)
+    cache = {}
+    first = build_index(str(tmp_path), ["site-playbook.yml"], cache)
+    signature = cache["signature"]
+    cached = build_index(str(tmp_path), ["site-playbook.yml"], cache)
+    assert cached.to_dict() == first.to_dict()
+    assert cache["signature"] == signature
+
+    write(tmp_path / "roles" / "legacy" / "meta" / "main.yml", {"dependencies": []})
+    write(tmp_path / "db.yml", [{"hosts": "db", "roles": ["db", "legacy"]}])
+    rebuilt = build_index(str(tmp_path), ["site-playbook.yml"], cache)
+    assert cache["signature"] != signature
+    assert rebuilt.dead_roles() == []
+
+
+def test_agent_reports_and_skips_dead_code(tmp_path):
+    create_tree(tmp_path)
+    stale = tmp_path / "roles" / "web" / "tasks" / "stale.yml"
+    stale.write_text("- debug:\n    msg: '{{ nowhere }}'\n")
+    config = isolated_config(tmp_path)
+    config["audit"]["reachability"] = {
+        "enabled": True,
+        "playbooks": ["site-playbook.yml"],
+    }
+    config["findings"] = {}
+    agent = AuditAgent(str(tmp_path), config)
+    report = Path(agent.run(str(tmp_path / "out.md"))).read_text()
+
+    assert "## 💤 Unreachable Roles and Tasks" in report
+    assert "- roles/legacy — not used by any playbook" in report
+    assert "- roles/web/tasks/stale.yml — never included" in report
+    assert "undefined variable 'nowhere'" in report
+
+    config["audit"]["reachability"]["skip_dead"] = True
+    agent = AuditAgent(str(tmp_path), config)
+    report = Path(agent.run(str(tmp_path / "out.md"))).read_text()
+    assert "- roles/legacy — not used by any playbook" in report
+    assert "undefined variable 'nowhere'" not in report
+    assert "roles/legacy/" not in report
+
+
+def test_templated_role_name_keeps_matching_roles_live(tmp_path):
+    write(
+        tmp_path / "site.yml",
+        [
+            {
+                "hosts": "all",
+                "tasks": [
+                    {"include_role": {"name": "db_{{ engine }}"}},
+                    {"import_role": {"name": "{{ item }}"}, "loop": ["a"]},
+                ],
+            }
+        ],
+    )
+    for role in ("db_mysql", "db_pgsql", "web"):
+        write(tmp_path / "roles" / role / "tasks" / "main.yml", [{"debug": {}}])
+    index = ReachabilityIndex(str(tmp_path)).build(["site.yml"])
+
+    assert sorted(index.roles) == ["db_mysql", "db_pgsql", "web"]
+    assert index.dead_roles() == []
+    assert "*" not in index.roles
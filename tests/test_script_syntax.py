@@ -0,0 +1,153 @@
+import shutil
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("jinja2")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+import agent.script_syntax as script_syntax
+from agent.audit_agent import AuditAgent
+from agent.budget import AuditBudget, BudgetExceeded
+from agent.script_syntax import ScriptSyntaxChecker, environment, render, resolve
+from tests.test_agent import isolated_config
+
+BROKEN = """#!/bin/bash
+{% if pdns_enabled %}
+echo "{{ pdns_port }}"
+{% endif %}
+{% for host in pdns_hosts %}
+ping -c1 {{ host }}
+{% endfor %}
+if [ -f "{{ pdns_config }}" ]; then
+    echo ok
+"""
+
+
+def test_render_maps_lines_to_template():
+    text, line_map = render(
+        environment(), BROKEN, {"pdns_enabled": True, "pdns_hosts": ["a", "b"]}
+    )
+    lines = text.split("\n")
+    assert lines[1] == 'echo "pdns_port"'
+    assert line_map[1] == 3
+    assert [line_map[i] for i, l in enumerate(lines) if l.startswith("ping")] == [6, 6]
+    assert line_map[lines.index("    echo ok")] == 9
+
+
+def test_resolve_expands_nested_variables():
+    variables = {"a": "{{ b }}-x", "b": "{{ c | default('y') }}", "n": 1}
+    assert resolve(environment(markers=False), variables)["a"] == "y-x"
+
+
+@pytest.mark.skipif(shutil.which("bash") is None, reason="bash not installed")
+def test_bash_errors_map_back_and_are_cached():
+    cache = {}
+    checker = ScriptSyntaxChecker(cache=cache)
+    templates = [("roles/pdns/templates/broken.sh.j2", BROKEN, {"pdns_hosts": []})]
+    errors, _ = checker.check(templates)
+    assert checker.checked == 1
+    assert errors and errors[0]["file"] == "roles/pdns/templates/broken.sh.j2"
+    # bash reports the unterminated ``if`` at the last template line.
+    assert errors[0]["line"] == 9
+
+    again = ScriptSyntaxChecker(cache=cache)
+    assert again.check(templates)[0] == errors
+    assert again.checked == 0
+
+    fixed = [(templates[0][0], BROKEN + "fi\n", {"pdns_hosts": []})]
+    assert again.check(fixed)[0] == []
+    assert again.checked == 1
+    assert len(cache) == 1
+
+
+def test_template_errors_and_missing_checker():
+    checker = ScriptSyntaxChecker()
+    checker.available["lua"] = False
+    errors, skipped = checker.check(
+        [
+            ("roles/x/templates/a.sh.j2", "echo ${#arr[@]}\n", {}),
+            ("roles/x/templates/b.lua.j2", "setLocal('{{ x }}')\n", {}),
+            ("roles/x/templates/c.conf.j2", "ignored\n", {}),
+        ]
+    )
+    assert errors[0]["line"] == 1
+    assert errors[0]["message"].startswith("template syntax error")
+    assert skipped == ["roles/x/templates/b.lua.j2: luac not found"]
+
+
+def test_templates_render_in_a_sandbox(tmp_path):
+    marker = tmp_path / "pwned"
+    escape = (
+        "{{ cycler.__init__.__globals__.os.system('touch %s') }}\n" % marker
+        + "{{ range(10 ** 9) | length }}\n"
+    )
+    checker = ScriptSyntaxChecker()
+    checker.available["shell"] = True
+    errors, skipped = checker.check([("roles/x/templates/a.sh.j2", escape, {})])
+    assert not marker.exists()
+    assert errors == []
+    assert skipped[0].startswith("roles/x/templates/a.sh.j2: could not render")
+    with pytest.raises(OverflowError):
+        render(environment(), "{{ range(10 ** 9) | length }}", {})
+
+
+@pytest.mark.skipif(shutil.which("sleep") is None, reason="sleep not installed")
+def test_hung_or_missing_checker_is_reported_not_cached(monkeypatch):
+    cache = {}
+    templates = [("roles/x/templates/a.sh.j2", "echo hi\n", {})]
+    line = script_syntax.CHECKERS["shell"]["line"]
+    monkeypatch.setitem(
+        script_syntax.CHECKERS, "shell", {"command": ["sleep", "5"], "line": line}
+    )
+    checker = ScriptSyntaxChecker(cache=cache, timeout=0.2)
+    errors, _ = checker.check(templates)
+    assert errors[0]["message"] == "sleep timed out after 0.2s"
+    assert cache == {}
+
+    monkeypatch.setitem(
+        script_syntax.CHECKERS,
+        "shell",
+        {"command": ["/nonexistent/bash"], "line": line},
+    )
+    checker = ScriptSyntaxChecker(cache=cache)
+    checker.available["shell"] = True
+    errors, _ = checker.check(templates)
+    assert errors[0]["message"].startswith("/nonexistent/bash unavailable")
+    assert cache == {} and checker.checked == 1
+
+
+@pytest.mark.skipif(shutil.which("sleep") is None, reason="sleep not installed")
+def test_budget_stops_running_checks(monkeypatch):
+    line = script_syntax.CHECKERS["shell"]["line"]
+    monkeypatch.setitem(
+        script_syntax.CHECKERS, "shell", {"command": ["sleep", "3"], "line": line}
+    )
+    cache = {}
+    checker = ScriptSyntaxChecker(
+        workers=1, cache=cache, budget=AuditBudget(deadline=1)
+    )
+    templates = [(f"roles/x/templates/{i}.sh.j2", f"echo {i}\n", {}) for i in range(4)]
+    started = time.monotonic()
+    with pytest.raises(BudgetExceeded, match="deadline of 1s"):
+        checker.check(templates)
+    assert time.monotonic() - started < 2
+    assert cache == {}
+
+
+@pytest.mark.skipif(shutil.which("bash") is None, reason="bash not installed")
+def test_agent_reports_script_errors(tmp_path):
+    templates = tmp_path / "roles" / "pdns" / "templates"
+    templates.mkdir(parents=True)
+    (templates / "maint.sh.j2").write_text(BROKEN)
+    config = isolated_config(tmp_path)
+    config["audit"]["script_syntax"]["cache"] = str(tmp_path / "state" / "sx.json")
+    config["findings"] = {}
+    agent = AuditAgent(str(tmp_path), config)
+    report = Path(agent.run(str(tmp_path / "out.md"))).read_text()
+
+    assert "roles/pdns/templates/maint.sh.j2:9 — Syntax error" in report
+    finding = [f for f in agent.findings if f["rule"] == "script_syntax"][0]
+    assert finding["role"] == "pdns"
+    assert finding["message"].startswith("line 9: ")
@@ -0,0 +1,71 @@
+import multiprocessing
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from utils.rate_limiter import SharedTokenBucket
+from utils.shared_state import SharedState
+
+
+def _drain(path, attempts, results):
+    bucket = SharedTokenBucket(SharedState(path), max_tokens=50, refill_period=600)
+    results.put(sum(bucket.consume() for _ in range(attempts)))
+
+
+def test_bucket_is_exact_across_processes(tmp_path):
+    path = str(tmp_path / "state.db")
+    SharedState(path).reset()
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_drain, args=(path, 30, results)) for _ in range(4)]
+    for proc in procs:
+        proc.start()
+    granted = sum(results.get(timeout=60) for _ in procs)
+    for proc in procs:
+        proc.join()
+    assert granted == 50
+
+
+def test_bucket_tokens_property_and_refill(tmp_path):
+    state = SharedState(str(tmp_path / "state.db"))
+    bucket = SharedTokenBucket(state, max_tokens=2, refill_period=0)
+    assert bucket.tokens == 2
+    assert bucket.consume()
+    bucket.tokens = 0
+    assert bucket.tokens == 0
+    # A zero refill period refills on the next call.
+    assert bucket.consume()
+
+
+def test_reset_clears_state(tmp_path):
+    state = SharedState(str(tmp_path / "state.db"))
+    audit_id = state.record_audit("/srv", "/srv/report.md", "# report")
+    assert state.latest_audit()["id"] == audit_id
+    state.reset()
+    assert state.get_audit(audit_id) is None
+
+
+def test_close_closes_every_thread_connection(tmp_path):
+    state = SharedState(str(tmp_path / "state.db"))
+    conns = []
+
+    def worker():
+        state.record_audit("/r", "/r/report.md", "ok")
+        conns.append(state._conn())
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    state.close()
+    for conn in conns:
+        try:
+            conn.execute("SELECT 1")
+        except sqlite3.ProgrammingError:
+            continue
+        raise AssertionError("connection left open")
+    # The state stays usable after close.
+    assert state.latest_audit()["report"] == "ok"
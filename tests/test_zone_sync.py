@@ -0,0 +1,180 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from pdns.zone_sync import desired_zones_from_vars, diff_rrsets, sync_zones
+
+
+class StubPowerDNS:
+    """In-memory stand-in for the PowerDNS zones API."""
+
+    def __init__(self, zones=None, fail=()):
+        self.zones = zones or {}
+        self.fail = set(fail)
+        self.calls = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        assert request.headers["X-API-Key"] == "secret"
+        path = request.url.path
+        self.calls.append((request.method, path))
+        prefix = "/api/v1/servers/localhost/zones"
+        if request.method == "GET" and path == prefix:
+            return httpx.Response(
+                200,
+                json=[{"id": z, "name": z, "kind": "Native"} for z in self.zones],
+            )
+        zone_id = path[len(prefix) + 1 :]
+        if request.method == "GET":
+            rrsets = [
+                {
+                    "name": name,
+                    "type": rtype,
+                    "ttl": ttl,
+                    "records": [{"content": c, "disabled": False} for c in contents],
+                }
+                for (name, rtype), (ttl, contents) in self.zones[zone_id].items()
+            ]
+            return httpx.Response(200, json={"id": zone_id, "rrsets": rrsets})
+        if request.method == "PATCH" and zone_id in self.fail:
+            return httpx.Response(500, json={"error": "backend failure"})
+        body = json.loads(request.content)
+        if request.method == "POST":
+            self.zones[body["name"]] = {}
+            zone_id = body["name"]
+        for rrset in body.get("rrsets", []):
+            key = (rrset["name"], rrset["type"])
+            if rrset["changetype"] == "DELETE":
+                self.zones[zone_id].pop(key, None)
+            else:
+                contents = [r["content"] for r in rrset["records"]]
+                self.zones[zone_id][key] = (rrset["ttl"], contents)
+        return httpx.Response(201 if request.method == "POST" else 204)
+
+
+VARS = {
+    "zones_config": [
+        {
+            "name": "home.lan",
+            "type": "native",
+            "records": [
+                {"name": "ns1", "type": "A", "content": "192.168.1.97"},
+                {"name": "@", "type": "NS", "content": "ns1.home.lan"},
+                {"name": "@", "type": "NS", "content": "ns2.home.lan"},
+                {"name": "www", "type": "CNAME", "content": "ns1.home.lan"},
+            ],
+        }
+    ]
+}
+
+
+def run_sync(stub, desired, **kwargs):
+    return asyncio.run(
+        sync_zones(
+            desired,
+            "http://pdns.test/api/v1",
+            "secret",
+            transport=httpx.MockTransport(stub.handler),
+            **kwargs,
+        )
+    )
+
+
+def test_desired_zones_are_fully_qualified():
+    zones = desired_zones_from_vars([VARS])
+    rrsets = zones["home.lan."].rrsets
+    assert rrsets[("home.lan.", "NS")] == (3600, ("ns1.home.lan.", "ns2.home.lan."))
+    assert rrsets[("www.home.lan.", "CNAME")] == (3600, ("ns1.home.lan.",))
+
+
+def test_diff_is_minimal():
+    desired = desired_zones_from_vars([VARS])["home.lan."].rrsets
+    current = dict(desired)
+    current[("ns1.home.lan.", "A")] = (3600, ("192.168.1.1",))
+    current[("old.home.lan.", "A")] = (3600, ("192.168.1.2",))
+    assert [c["name"] for c in diff_rrsets(desired, current)] == ["ns1.home.lan."]
+    pruned = diff_rrsets(desired, current, prune=True)
+    assert pruned[-1] == {"name": "old.home.lan.", "type": "A", "changetype": "DELETE"}
+
+
+def test_sync_creates_then_is_idempotent():
+    stub = StubPowerDNS()
+    desired = desired_zones_from_vars([VARS])
+    summary = run_sync(stub, desired)
+    assert summary["zones_created"] == 1
+    assert ("www.home.lan.", "CNAME") in stub.zones["home.lan."]
+
+    stub.calls.clear()
+    summary = run_sync(stub, desired)
+    assert summary["zones_patched"] == 0
+    assert [m for m, _ in stub.calls] == ["GET", "GET"]
+
+
+def test_sync_batches_patches():
+    records = [
+        {"name": f"h{i}", "type": "A", "content": f"10.0.0.{i}"} for i in range(25)
+    ]
+    stub = StubPowerDNS({"big.lan.": {}})
+    desired = desired_zones_from_vars(
+        [{"zones_config": [{"name": "big.lan", "records": records}]}]
+    )
+    summary = run_sync(stub, desired, batch_size=10, concurrency=2)
+    assert summary["rrsets_replaced"] == 25
+    assert [m for m, _ in stub.calls].count("PATCH") == 3
+    assert len(stub.zones["big.lan."]) == 25
+
+
+def test_dry_run_does_not_write():
+    stub = StubPowerDNS({"home.lan.": {}})
+    summary = run_sync(stub, desired_zones_from_vars([VARS]), dry_run=True)
+    assert summary["zones_patched"] == 1
+    assert "PATCH" not in [m for m, _ in stub.calls]
+
+
+def test_failing_zone_does_not_abort_others():
+    stub = StubPowerDNS({"home.lan.": {}, "bad.lan.": {}}, fail={"bad.lan."})
+    desired = desired_zones_from_vars(
+        [
+            VARS,
+            {
+                "zones_config": [
+                    {
+                        "name": "bad.lan",
+                        "records": [{"name": "a", "type": "A", "content": "10.0.0.1"}],
+                    }
+                ]
+            },
+        ]
+    )
+    summary = run_sync(stub, desired)
+    assert list(summary["errors"]) == ["bad.lan."]
+    assert "500" in summary["errors"]["bad.lan."]
+    assert ("www.home.lan.", "CNAME") in stub.zones["home.lan."]
+
+
+def test_aaaa_is_canonical_and_prune_keeps_apex_ns():
+    stub = StubPowerDNS(
+        {
+            "home.lan.": {
+                ("home.lan.", "SOA"): (3600, ["ns1.home.lan. admin 1 2 3 4 5"]),
+                ("home.lan.", "NS"): (3600, ["ns1.home.lan."]),
+                ("sub.home.lan.", "NS"): (3600, ["ns.sub.home.lan."]),
+                ("v6.home.lan.", "AAAA"): (3600, ["2001:db8::1"]),
+            }
+        }
+    )
+    records = [{"name": "v6", "type": "AAAA", "content": "2001:DB8:0::1"}]
+    desired = desired_zones_from_vars(
+        [{"zones_config": [{"name": "home.lan", "records": records}]}]
+    )
+    summary = run_sync(stub, desired, prune=True)
+    assert summary["rrsets_replaced"] == 0
+    assert summary["rrsets_deleted"] == 1
+    assert set(stub.zones["home.lan."]) == {
+        ("home.lan.", "SOA"),
+        ("home.lan.", "NS"),
+        ("v6.home.lan.", "AAAA"),
+    }
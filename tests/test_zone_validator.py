@@ -0,0 +1,157 @@
+import sys
+from pathlib import Path
+
+import pytest
+import yaml
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from agent.audit_agent import AuditAgent
+from agent.budget import AuditBudget, BudgetExceeded
+from agent.zone_validator import ZoneValidator, address_from_reverse, reverse_name
+from tests.test_agent import isolated_config
+
+
+def test_reverse_name_roundtrip():
+    assert reverse_name("192.168.1.97") == "97.1.168.192.in-addr.arpa"
+    assert address_from_reverse("97.1.168.192.in-addr.arpa") == "192.168.1.97"
+    rev = reverse_name("2001:db8::1")
+    assert address_from_reverse(rev) == "2001:db8::1"
+    assert reverse_name("not-an-ip") is None
+
+
+def test_clean_zone_has_no_issues():
+    validator = ZoneValidator()
+    validator.load_vars(
+        {
+            "zones_config": [
+                {
+                    "name": "home.lan",
+                    "records": [
+                        {"name": "ns1", "type": "A", "content": "192.168.1.97"},
+                        {"name": "@", "type": "NS", "content": "ns1.home.lan"},
+                        {"name": "www", "type": "CNAME", "content": "ns1.home.lan"},
+                    ],
+                }
+            ],
+            "reverse_zones_config": [
+                {"name": "1.168.192.in-addr.arpa", "type": "slave"},
+            ],
+        }
+    )
+    assert validator.validate() == []
+
+
+def test_detects_conflicts():
+    validator = ZoneValidator()
+    validator.add_zone(
+        {
+            "name": "home.lan",
+            "records": [
+                {"name": "www", "type": "CNAME", "content": "web.home.lan"},
+                {"name": "www", "type": "TXT", "content": "hello"},
+                {"name": "mail", "type": "A", "content": "10.0.0.5"},
+                {"name": "mail", "type": "A", "content": "10.0.0.5"},
+                {"name": "@", "type": "NS", "content": "ns1.home.lan"},
+                {"name": "host.other.lan.", "type": "A", "content": "10.0.0.6"},
+            ],
+        }
+    )
+    validator.add_zone(
+        {
+            "name": "0.0.10.in-addr.arpa",
+            "records": [
+                {"name": "7", "type": "PTR", "content": "ghost.home.lan"},
+            ],
+        }
+    )
+    issues = validator.validate()
+    assert "www.home.lan: CNAME and other data (TXT)" in issues
+    assert "mail.home.lan: duplicate A record '10.0.0.5'" in issues
+    assert "zone home.lan: missing glue for NS ns1.home.lan" in issues
+    assert "zone home.lan: host.other.lan A is outside the zone" in issues
+    assert "mail.home.lan: address 10.0.0.5 has no matching PTR" in issues
+    assert (
+        "7.0.0.10.in-addr.arpa: PTR ghost.home.lan has no matching address record"
+        in issues
+    )
+
+
+def test_issue_list_is_bounded():
+    validator = ZoneValidator(max_issues=5)
+    for i in range(50):
+        validator.add_record("big.lan", "dup", "A", "10.0.0.1")
+    issues = validator.validate()
+    assert len(issues) == 6
+    assert issues[-1] == "... 44 more zone issues omitted"
+
+
+def test_validate_is_repeatable_and_glue_uses_delegation_point():
+    validator = ZoneValidator(max_issues=1)
+    validator.add_zone(
+        {
+            "name": "home.lan",
+            "records": [
+                {"name": "@", "type": "NS", "content": "ns1.home.lan"},
+                {"name": "ns1", "type": "A", "content": "10.0.0.1"},
+                # Served by a host in the parent zone: no glue required.
+                {"name": "lab", "type": "NS", "content": "ns1.home.lan"},
+                {"name": "sub", "type": "NS", "content": "ns.sub.home.lan"},
+                {"name": "x.other.lan.", "type": "A", "content": "10.0.0.2"},
+            ],
+        }
+    )
+    first = validator.validate()
+    assert first == [
+        "zone home.lan: x.other.lan A is outside the zone",
+        "... 1 more zone issues omitted",
+    ]
+    assert validator.validate() == first
+    validator.max_issues = 10
+    issues = validator.validate()
+    assert "zone sub.home.lan: missing glue for NS ns.sub.home.lan" in issues
+    assert not any("lab.home.lan" in issue for issue in issues)
+
+
+def test_large_zone_is_indexed_compactly():
+    validator = ZoneValidator()
+    for i in range(50000):
+        validator.add_record("big.lan", f"h{i}", "A", f"10.0.{i >> 8 & 255}.{i & 255}")
+        validator.add_record(
+            "10.in-addr.arpa", f"{i & 255}.{i >> 8 & 255}.0", "PTR", f"h{i}.big.lan"
+        )
+    validator.zones.update({"big.lan": "", "10.in-addr.arpa": ""})
+    validator.zones_with_records.update(validator.zones)
+    assert validator.validate() == []
+    assert validator.keys.itemsize == 8
+
+
+def test_validation_passes_check_the_budget():
+    validator = ZoneValidator(budget=AuditBudget(deadline=0))
+    validator.add_record("home.lan", "www", "A", "10.0.0.1")
+    with pytest.raises(BudgetExceeded, match="deadline"):
+        validator.validate()
+    validator.budget = AuditBudget()
+    assert validator.validate() == []
+
+
+def test_agent_reports_zone_issues(tmp_path):
+    (tmp_path / "roles").mkdir()
+    (tmp_path / "vars").mkdir()
+    (tmp_path / "vars" / "zones.yml").write_text(
+        yaml.safe_dump(
+            {
+                "zones_config": [
+                    {
+                        "name": "home.lan",
+                        "records": [
+                            {"name": "@", "type": "NS", "content": "ns1.home.lan"}
+                        ],
+                    }
+                ]
+            }
+        )
+    )
+    agent = AuditAgent(str(tmp_path), isolated_config(tmp_path))
+    report = agent.run(str(tmp_path / "out.md"))
+    content = Path(report).read_text()
+    assert "Zone data: zone home.lan: missing glue for NS ns1.home.lan" in content